@@ -1,13 +1,58 @@
 import os
+import re
 import json
 import time
+_IMPORT_STARTED = time.perf_counter()
 import random
-import requests
-from flask import Flask, request, jsonify, send_file, render_template
-import yt_dlp
+import copy
+import uuid
+import threading
+import subprocess
+import sys
+import tempfile
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse, parse_qs, quote
+import mimetypes
+import importlib
+import io
+from flask import Flask, Response, request, jsonify, send_file, render_template, g
 from datetime import datetime, timedelta
 import hashlib
-import pickle
+import atexit
+import sqlite3
+import socket
+import zipfile
+import bisect
+import math
+from contextlib import contextmanager
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+        self.import_seconds = None
+
+    def load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    started = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    self.import_seconds = round(time.perf_counter() - started, 3)
+                    print(f"[Startup] Imported {self._name} in {self.import_seconds}s")
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+# yt-dlp takes a noticeable share of cold-start time; load it when the first request needs it
+yt_dlp = LazyModule('yt_dlp')
+requests = LazyModule('requests')
 
 app = Flask(__name__)
 
@@ -16,68 +61,554 @@ UPLOAD_FOLDER = 'downloads'
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
-# Session storage for persistent cookies and user agents
-SESSIONS_FILE = 'youtube_sessions.pkl'
-USER_AGENTS_FILE = 'user_agents.pkl'
+# Thumbnail proxy: originals fetched once, resized variants kept on disk up to THUMB_CACHE_BYTES
+THUMB_FOLDER = os.environ.get('THUMB_FOLDER', 'thumbnails')
+THUMB_CACHE_BYTES = int(os.environ.get('THUMB_CACHE_BYTES', 64 * 1024 * 1024))
+THUMB_WIDTHS = (320, 480, 720)  # requested widths snap to the nearest of these
+THUMB_MAX_AGE = int(os.environ.get('THUMB_MAX_AGE', 7 * 24 * 3600))  # seconds clients and proxies may cache
 
-# Load or create persistent sessions
-def load_sessions():
-    """Load persistent YouTube sessions to simulate local browser behavior"""
-    try:
-        if os.path.exists(SESSIONS_FILE):
-            with open(SESSIONS_FILE, 'rb') as f:
-                return pickle.load(f)
-    except Exception as e:
-        print(f"Error loading sessions: {e}")
-    
-    # Create new session with realistic browser data
-    return {
-        'cookies': {},
-        'user_agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'last_request': None,
-        'request_count': 0,
-        'session_id': hashlib.md5(str(time.time()).encode()).hexdigest()[:8]
-    }
+# Metadata cache settings (seconds / entries / bytes)
+METADATA_CACHE_TTL = int(os.environ.get('METADATA_CACHE_TTL', 1800))
+METADATA_CACHE_MAX_ENTRIES = int(os.environ.get('METADATA_CACHE_MAX_ENTRIES', 256))
+METADATA_CACHE_MAX_BYTES = int(os.environ.get('METADATA_CACHE_MAX_BYTES', 64 * 1024 * 1024))
 
-def save_sessions(sessions):
-    """Save persistent YouTube sessions"""
-    try:
-        with open(SESSIONS_FILE, 'wb') as f:
-            pickle.dump(sessions, f)
-    except Exception as e:
-        print(f"Error saving sessions: {e}")
+# Download job pool settings
+DOWNLOAD_WORKERS = int(os.environ.get('DOWNLOAD_WORKERS', 4))
+# ffmpeg merge/remux/transcode work runs on its own pool, one worker per core by default
+POSTPROCESS_WORKERS = int(os.environ.get('POSTPROCESS_WORKERS', os.cpu_count() or 2))
+JOB_RETENTION = int(os.environ.get('JOB_RETENTION', 3600))  # seconds finished jobs stay queryable
+PROGRESS_MIN_INTERVAL = float(os.environ.get('PROGRESS_MIN_INTERVAL', 0.5))  # seconds between progress events
+# Download jobs are persisted in the state backend and resumed from their partial files by
+# another (or the restarted) worker once the owner stops renewing its RESUME_LEASE
+RESUME_LEASE = float(os.environ.get('RESUME_LEASE', 30))  # seconds
+RESUME_MAX_ATTEMPTS = int(os.environ.get('RESUME_MAX_ATTEMPTS', 3))
 
-def load_user_agents():
-    """Load realistic user agents that work locally"""
-    try:
-        if os.path.exists(USER_AGENTS_FILE):
-            with open(USER_AGENTS_FILE, 'rb') as f:
-                return pickle.load(f)
-    except Exception as e:
-        print(f"Error loading user agents: {e}")
-    
-    # Realistic user agents that work locally
-    return [
-        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
-        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Safari/605.1.15',
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36'
-    ]
+# Batches: how many URLs one request may carry and how many of its items download at once
+BATCH_MAX_URLS = int(os.environ.get('BATCH_MAX_URLS', 200))
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', 2))
+BATCH_MAX_OPEN = int(os.environ.get('BATCH_MAX_OPEN', 2))  # unfinished batches per client (0 = no limit)
 
-def save_user_agents(user_agents):
-    """Save user agents"""
-    try:
-        with open(USER_AGENTS_FILE, 'wb') as f:
-            pickle.dump(user_agents, f)
-    except Exception as e:
-        print(f"Error saving user agents: {e}")
+# Admission control for the heavy endpoints. ADMISSION_LIMITS caps each endpoint's work in progress
+# (for job endpoints: their jobs queued or running); up to ADMISSION_QUEUE more requests wait at most
+# ADMISSION_MAX_WAIT seconds for a slot, and every client also has a token bucket refilled at
+# CLIENT_RATE requests/second up to CLIENT_BURST. Anything else gets a 429 with Retry-After.
+# Clients are told apart by client_address(), so per-client limits (CLIENT_RATE, BATCH_MAX_OPEN) only
+# work once TRUSTED_PROXIES matches the proxies in front of the app; with the default of 0 behind a
+# load balancer every user looks like the balancer and shares one bucket. Hence CLIENT_RATE is off by default.
+ADMISSION_LIMITS = {'download_video': DOWNLOAD_WORKERS * 2, 'download_1080p': DOWNLOAD_WORKERS,
+                    'stream_video': DOWNLOAD_WORKERS * 2, 'create_batch': DOWNLOAD_WORKERS,
+                    'test_download': 2, 'test_format': 2}
+for _item in os.environ.get('ADMISSION_LIMITS', '').split(','):  # e.g. "download_video=8,test_format=1"
+    if '=' in _item:
+        ADMISSION_LIMITS[_item.split('=', 1)[0].strip()] = int(_item.split('=', 1)[1])
+ADMISSION_QUEUE = int(os.environ.get('ADMISSION_QUEUE', 4))  # waiting requests per endpoint (each holds a thread)
+ADMISSION_MAX_WAIT = float(os.environ.get('ADMISSION_MAX_WAIT', 10))  # seconds
+CLIENT_RATE = float(os.environ.get('CLIENT_RATE', 0))  # requests per second per client (0 = no limit)
+CLIENT_BURST = int(os.environ.get('CLIENT_BURST', 10))
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))  # X-Forwarded-For hops added by our own proxies
+
+# get_video_info extraction strategies: 'sequential' tries Method 1/2/3 in order,
+# 'hedged' starts the next method when the current one hasn't answered within HEDGE_DELAY
+EXTRACTION_MODE = os.environ.get('EXTRACTION_MODE', 'sequential')
+HEDGE_DELAY = float(os.environ.get('HEDGE_DELAY', 5))  # seconds
+
+# Disk janitor for UPLOAD_FOLDER
+DOWNLOADS_QUOTA_BYTES = int(os.environ.get('DOWNLOADS_QUOTA_BYTES', 5 * 1024 ** 3))
+DOWNLOADS_MAX_AGE = int(os.environ.get('DOWNLOADS_MAX_AGE', 24 * 3600))  # seconds
+JANITOR_INTERVAL = int(os.environ.get('JANITOR_INTERVAL', 60))  # seconds between sweeps
+JANITOR_GRACE = int(os.environ.get('JANITOR_GRACE', 300))  # never touch files modified this recently
+
+# How download_file hands bytes to the client: 'off' streams from Flask,
+# 'x-accel' returns X-Accel-Redirect for nginx, 'x-sendfile' returns X-Sendfile (Apache/lighttpd)
+FILE_OFFLOAD = os.environ.get('FILE_OFFLOAD', 'off')
+X_ACCEL_PREFIX = os.environ.get('X_ACCEL_PREFIX', '/protected-downloads/')  # internal nginx location
+app.config['USE_X_SENDFILE'] = FILE_OFFLOAD == 'x-sendfile'  # send_file then emits X-Sendfile
+
+# Download tuning: parallel DASH/HLS fragments and an HTTP chunk size that grows with
+# measured throughput (aiming for roughly CHUNK_TARGET_SECONDS of transfer per chunk)
+CONCURRENT_FRAGMENTS = int(os.environ.get('CONCURRENT_FRAGMENTS', 4))
+MIN_CHUNK_SIZE = int(os.environ.get('MIN_CHUNK_SIZE', 1024 * 1024))
+MAX_CHUNK_SIZE = int(os.environ.get('MAX_CHUNK_SIZE', 64 * 1024 * 1024))
+CHUNK_TARGET_SECONDS = float(os.environ.get('CHUNK_TARGET_SECONDS', 2))
+
+# Stream-through downloads: bytes read from the yt-dlp pipe per chunk
+STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', 256 * 1024))
+
+# State shared between workers (sessions, metadata cache, job records, download index):
+# 'memory' keeps it in this process, 'sqlite' shares it between workers on one host
+# through STATE_DB, 'redis' shares it between hosts through any Redis-protocol server
+STATE_BACKEND = os.environ.get('STATE_BACKEND', 'sqlite')
+STATE_DB = os.environ.get('STATE_DB', 'state.sqlite3')
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+
+# Session state, kept in memory and flushed to the state backend in the background
+SESSION_FLUSH_INTERVAL = float(os.environ.get('SESSION_FLUSH_INTERVAL', 5))  # seconds
+
+# Realistic user agents that work locally
+DEFAULT_USER_AGENTS = [
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Safari/605.1.15',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36'
+]
+
+class InProcessBackend:
+    """State backend kept in this process's memory; nothing is shared between workers.
+
+    Values go through JSON like in the other backends, so callers see the
+    same types (lists, not tuples) whichever backend is configured.
+    """
+
+    name = 'memory'
+    shared = False
+
+    def __init__(self):
+        self._data = {}  # key -> (expires_at or None, JSON text)
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        item = self._data.get(key)
+        if item and item[0] is not None and item[0] <= now:
+            del self._data[key]
+            return None
+        return item
+
+    def get(self, key):
+        with self._lock:
+            item = self._live(key, time.time())
+        return json.loads(item[1]) if item else None
+
+    def set(self, key, value, ttl=None):
+        item = (time.time() + ttl if ttl else None, json.dumps(value, default=str))
+        with self._lock:
+            self._data[key] = item
+
+    def add(self, key, value, ttl=None):
+        """Set key only if it has no value; returns whether it was set"""
+        item = (time.time() + ttl if ttl else None, json.dumps(value, default=str))
+        with self._lock:
+            if self._live(key, time.time()):
+                return False
+            self._data[key] = item
+            return True
+
+    def renew(self, key, value, ttl):
+        """Reset key's ttl if it still holds value (or has lapsed unclaimed); False if another value holds it"""
+        item = (time.time() + ttl, json.dumps(value, default=str))
+        with self._lock:
+            current = self._live(key, time.time())
+            if current and current[1] != item[1]:
+                return False
+            self._data[key] = item
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def incr(self, key, amount=1):
+        with self._lock:
+            item = self._live(key, time.time())
+            value = (json.loads(item[1]) if item else 0) + amount
+            self._data[key] = (item[0] if item else None, json.dumps(value))
+            return value
+
+    def items(self, prefix):
+        """{key: value} for every live key starting with prefix"""
+        now = time.time()
+        with self._lock:
+            found = [(key, self._live(key, now)) for key in list(self._data) if key.startswith(prefix)]
+        return {key: json.loads(item[1]) for key, item in found if item}
+
+    def describe(self):
+        return {'backend': self.name}
+
+class SQLiteBackend:
+    """State backend in one SQLite database in WAL mode, shared by every worker on a host.
+
+    WAL lets readers carry on while a worker writes, and each thread keeps
+    its own connection. Read-modify-write operations (add, incr) run in a
+    BEGIN IMMEDIATE transaction so concurrent workers can't lose updates.
+    Nothing is opened at import: connections are made on first use and
+    belong to the process that made them, so a gunicorn master that imports
+    the app (--preload) never hands an open database to its forked workers.
+    """
+
+    name = 'sqlite'
+    shared = True
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._inherited = []  # connections opened before a fork; kept unclosed so the parent's locks survive
+
+    def _conn(self):
+        conn, pid = getattr(self._local, 'conn', None), os.getpid()
+        if conn is None or conn[0] != pid:
+            if conn is not None:
+                self._inherited.append(conn[1])
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute('CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)')
+            conn = self._local.conn = (pid, db)
+        return conn[1]
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def get(self, key):
+        row = self._conn().execute(
+            'SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+            (key, time.time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl=None):
+        self._conn().execute('INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)',
+                             (key, json.dumps(value, default=str), time.time() + ttl if ttl else None))
+        if random.random() < 0.01:
+            self._purge()
+
+    def add(self, key, value, ttl=None):
+        """Set key only if it has no value; returns whether it was set"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM kv WHERE key = ? AND expires_at <= ?', (key, now))
+            cursor = conn.execute('INSERT OR IGNORE INTO kv (key, value, expires_at) VALUES (?, ?, ?)',
+                                  (key, json.dumps(value, default=str), now + ttl if ttl else None))
+            return cursor.rowcount > 0
+
+    def renew(self, key, value, ttl):
+        """Reset key's ttl if it still holds value (or has lapsed unclaimed); False if another value holds it"""
+        cursor = self._conn().execute('UPDATE kv SET expires_at = ? WHERE key = ? AND value = ?',
+                                      (time.time() + ttl, key, json.dumps(value, default=str)))
+        return cursor.rowcount > 0 or self.add(key, value, ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self._conn().execute(f"DELETE FROM kv WHERE key IN ({', '.join('?' * len(keys))})", keys)
+
+    def incr(self, key, amount=1):
+        with self._transaction() as conn:
+            conn.execute('INSERT INTO kv (key, value, expires_at) VALUES (?, ?, NULL) '
+                         'ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + excluded.value',
+                         (key, amount))
+            return int(conn.execute('SELECT value FROM kv WHERE key = ?', (key,)).fetchone()[0])
+
+    def items(self, prefix):
+        """{key: value} for every live key starting with prefix"""
+        rows = self._conn().execute(
+            'SELECT key, value FROM kv WHERE key >= ? AND key < ? AND (expires_at IS NULL OR expires_at > ?)',
+            (prefix, prefix + '\U0010ffff', time.time()))
+        return {key: json.loads(value) for key, value in rows}
+
+    def _purge(self):
+        self._conn().execute('DELETE FROM kv WHERE expires_at <= ?', (time.time(),))
+
+    def describe(self):
+        return {'backend': self.name, 'path': self.path}
+
+class RedisError(Exception):
+    """Error reply from a Redis-protocol server"""
+
+class RedisBackend:
+    """State backend on any server speaking the Redis protocol (Redis, Valkey, KeyDB...).
+
+    A small RESP2 client over a plain socket, one connection per thread, so
+    no client library is needed. Connections are opened on first use and, like
+    SQLiteBackend's, never reused across a fork. Keys are namespaced with
+    prefix so several deployments can share one server.
+    """
+
+    name = 'redis'
+    shared = True
+
+    def __init__(self, url, prefix='ytdl:'):
+        parsed = urlparse(url)
+        self.url = url
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.strip('/') or 0)
+        self.password = parsed.password
+        self.prefix = prefix
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or conn[2] != os.getpid():
+            sock = socket.create_connection((self.host, self.port), timeout=10)
+            conn = self._local.conn = (sock, sock.makefile('rb'), os.getpid())
+            if self.password:
+                self._call('AUTH', self.password)
+            if self.db:
+                self._call('SELECT', self.db)
+        return conn
+
+    def _call(self, *args):
+        sock, reader, _ = self._connection()
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        try:
+            sock.sendall(b''.join(parts))
+            return self._read(reader)
+        except (OSError, ConnectionError):
+            # Drop the connection; the next call on this thread reconnects
+            self._local.conn = None
+            sock.close()
+            raise
+
+    def _read(self, reader):
+        line = reader.readline()
+        if not line:
+            raise ConnectionError('Redis connection closed')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode()
+        if kind == b'-':
+            raise RedisError(rest.decode())
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            return None if length < 0 else reader.read(length + 2)[:-2]
+        if kind == b'*':
+            length = int(rest)
+            return None if length < 0 else [self._read(reader) for _ in range(length)]
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+    def get(self, key):
+        raw = self._call('GET', self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        args = ['SET', self.prefix + key, json.dumps(value, default=str)]
+        if ttl:
+            args += ['PX', int(ttl * 1000)]
+        self._call(*args)
+
+    def add(self, key, value, ttl=None):
+        """Set key only if it has no value; returns whether it was set"""
+        args = ['SET', self.prefix + key, json.dumps(value, default=str), 'NX']
+        if ttl:
+            args += ['PX', int(ttl * 1000)]
+        return self._call(*args) is not None
+
+    def renew(self, key, value, ttl):
+        """Reset key's ttl if it still holds value (or has lapsed unclaimed); False if another value holds it.
+
+        Optimistic check-and-set with WATCH/MULTI/EXEC, so no Lua is needed:
+        EXEC is refused if anyone touched the key after the WATCH.
+        """
+        key, data = self.prefix + key, json.dumps(value, default=str)
+        try:
+            self._call('WATCH', key)
+            current = self._call('GET', key)
+            if current is not None and current != data.encode():
+                self._call('UNWATCH')
+                return False
+            self._call('MULTI')
+            self._call('SET', key, data, 'PX', int(ttl * 1000))
+            return self._call('EXEC') is not None
+        except RedisError:
+            # Don't leave a half-built transaction on this thread's connection
+            self._local.conn[0].close()
+            self._local.conn = None
+            raise
+
+    def delete(self, *keys):
+        if keys:
+            self._call('DEL', *(self.prefix + key for key in keys))
+
+    def incr(self, key, amount=1):
+        return self._call('INCRBY', self.prefix + key, amount)
+
+    def items(self, prefix):
+        """{key: value} for every key starting with prefix"""
+        pattern = re.sub(r'([*?\[\]\\])', r'\\\1', self.prefix + prefix) + '*'
+        keys, cursor = [], b'0'
+        while True:
+            cursor, batch = self._call('SCAN', cursor, 'MATCH', pattern, 'COUNT', 500)
+            keys.extend(batch)
+            if cursor == b'0':
+                break
+        found = {}
+        for start in range(0, len(keys), 500):
+            chunk = list(dict.fromkeys(keys[start:start + 500]))
+            for key, raw in zip(chunk, self._call('MGET', *chunk)):
+                if raw is not None:
+                    found[key.decode()[len(self.prefix):]] = json.loads(raw)
+        return found
+
+    def describe(self):
+        parsed = urlparse(self.url)
+        return {'backend': self.name, 'server': f"{parsed.hostname or 'localhost'}:{parsed.port or 6379}",
+                'db': self.db, 'prefix': self.prefix}
+
+def make_state_backend(kind):
+    """State backend named by STATE_BACKEND"""
+    if kind == 'memory':
+        return InProcessBackend()
+    if kind == 'sqlite':
+        return SQLiteBackend(STATE_DB)
+    if kind == 'redis':
+        return RedisBackend(REDIS_URL)
+    raise ValueError(f"Unknown STATE_BACKEND {kind!r} (expected memory, sqlite or redis)")
+
+STATE = make_state_backend(STATE_BACKEND)
+
+class SessionState:
+    """Process-local YouTube session state with batched persistence.
+
+    Requests only touch memory: counters are incremented under a lock and
+    fields are overwritten in place. A background thread flushes the
+    accumulated counter deltas and changed fields to the state backend every
+    SESSION_FLUSH_INTERVAL seconds and once more at shutdown. Counter deltas
+    are added to the stored totals with the backend's atomic incr, so several
+    workers sharing one backend don't lose each other's updates. The backend
+    is first read when the state is first used, not at import.
+    """
+
+    COUNTERS = ('request_count', 'successful_requests', 'failed_requests')
+
+    FIELD_PREFIX = 'session:field:'
+    COUNTER_PREFIX = 'session:counter:'
+
+    def __init__(self, backend, flush_interval):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._fields = {}
+        self._counters = dict.fromkeys(self.COUNTERS, 0)  # totals as last loaded + local deltas
+        self._deltas = dict.fromkeys(self.COUNTERS, 0)  # not yet flushed
+        self._dirty_fields = set()
+        self._pending_defaults = set()  # defaults only written if no other worker has a value
+        self._thread = None
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self._load()
+                    self._loaded = True
+
+    def _load(self):
+        fields, counters = {}, {}
+        try:
+            fields = {key[len(self.FIELD_PREFIX):]: value
+                      for key, value in self.backend.items(self.FIELD_PREFIX).items()}
+            counters = {key[len(self.COUNTER_PREFIX):]: value
+                        for key, value in self.backend.items(self.COUNTER_PREFIX).items()}
+        except Exception as e:
+            print(f"Error loading sessions: {e}")
+        with self._lock:
+            self._fields = {
+                'cookies': {},
+                'user_agent': DEFAULT_USER_AGENTS[0],
+                'user_agents': DEFAULT_USER_AGENTS,
+                'last_request': None,
+                'session_id': hashlib.md5(str(time.time()).encode()).hexdigest()[:8],
+                'created_at': datetime.now().isoformat()
+            }
+            self._pending_defaults = set(self._fields) - set(fields)
+            self._fields.update(fields)
+            for name in self.COUNTERS:
+                self._counters[name] = counters.get(name, 0) + self._deltas[name]
+
+    def snapshot(self):
+        """Copy of the current session fields and counters"""
+        self._ensure_loaded()
+        with self._lock:
+            return dict(self._fields, **self._counters)
+
+    def incr(self, name, amount=1):
+        self._ensure_loaded()
+        with self._lock:
+            self._counters[name] += amount
+            self._deltas[name] += amount
+
+    def update(self, **fields):
+        self._ensure_loaded()
+        with self._lock:
+            self._fields.update(fields)
+            self._dirty_fields.update(fields)
+
+    def record_success(self, url):
+        self.update(last_request=url)
+        self.incr('successful_requests')
+
+    def record_failure(self, error):
+        self.update(last_error=error)
+        self.incr('failed_requests')
+
+    def flush(self):
+        """Write pending counter deltas and changed fields to the state backend"""
+        with self._lock:
+            deltas = {name: value for name, value in self._deltas.items() if value}
+            fields = {name: self._fields[name] for name in self._dirty_fields}
+            defaults = {name: self._fields[name] for name in self._pending_defaults - self._dirty_fields}
+            self._deltas = dict.fromkeys(self.COUNTERS, 0)
+            self._dirty_fields = set()
+            self._pending_defaults = set()
+        if not deltas and not fields and not defaults:
+            return
+        try:
+            while deltas:
+                name, delta = next(iter(deltas.items()))
+                self.backend.incr(self.COUNTER_PREFIX + name, delta)
+                del deltas[name]  # applied; never retried
+            for name, value in defaults.items():
+                self.backend.add(self.FIELD_PREFIX + name, value)
+            for name, value in fields.items():
+                self.backend.set(self.FIELD_PREFIX + name, value)
+        except Exception as e:
+            print(f"Error saving sessions: {e}")
+            # Put the unsaved changes back so the next flush retries them
+            with self._lock:
+                for name, delta in deltas.items():
+                    self._deltas[name] += delta
+                self._dirty_fields.update(fields)
+                self._pending_defaults.update(defaults)
+
+    def reset(self):
+        """Forget all persisted and in-memory session state"""
+        with self._lock:
+            self._deltas = dict.fromkeys(self.COUNTERS, 0)
+            self._dirty_fields = set()
+        self.backend.delete(*self.backend.items('session:'))
+        with self._load_lock:
+            self._load()
+            self._loaded = True
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='session-flush', daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+SESSION_STATE = SessionState(STATE, SESSION_FLUSH_INTERVAL)
+atexit.register(SESSION_STATE.flush)
 
 def simulate_human_behavior():
     """Simulate human-like behavior patterns"""
-    # Random delay between requests (like human browsing)
-    time.sleep(random.uniform(1, 3))
-    
     # Random mouse movement simulation
     mouse_x = random.randint(100, 800)
     mouse_y = random.randint(100, 600)
@@ -125,28 +656,160 @@ def get_realistic_headers(sessions):
     return headers
 
 def create_local_like_session():
-    """Create a session that behaves exactly like local browser"""
-    sessions = load_sessions()
-    user_agents = load_user_agents()
+    """Create a session that behaves exactly like local browser (memory only, never blocks)"""
+    sessions = SESSION_STATE.snapshot()
     
     # Use the same user agent consistently (like local browser)
     if not sessions.get('user_agent') or random.random() < 0.1:  # 10% chance to rotate
-        sessions['user_agent'] = random.choice(user_agents)
-        save_sessions(sessions)
+        sessions['user_agent'] = random.choice(sessions['user_agents'])
     
     # Simulate human behavior
     behavior = simulate_human_behavior()
     
     # Update session
-    sessions['last_request'] = 'https://www.youtube.com/'
-    sessions['request_count'] += 1
-    sessions['last_behavior'] = behavior
-    
-    save_sessions(sessions)
-    return sessions
+    SESSION_STATE.update(user_agent=sessions['user_agent'], last_request='https://www.youtube.com/',
+                         last_behavior=behavior)
+    SESSION_STATE.incr('request_count')
+    return SESSION_STATE.snapshot()
+
+class Counter:
+    """Monotonic counter, one value per label combination"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(n, '')) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    kind = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+class CallbackGauge:
+    """Gauge read from func() at scrape time; func returns {label values tuple: value}"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, labelnames, func):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.func = func
 
-# Initialize global sessions
-GLOBAL_SESSIONS = create_local_like_session()
+    def samples(self):
+        return [(self.name, tuple(str(v) for v in key), value) for key, value in self.func().items()]
+
+class Histogram:
+    """Cumulative-bucket histogram with the usual _bucket/_sum/_count series"""
+
+    kind = 'histogram'
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, '')) for n in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(series) for key, series in self._values.items()}
+        samples = []
+        for key, series in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                cumulative += count
+                samples.append((self.name + '_bucket', key + (str(bound),), cumulative))
+            samples.append((self.name + '_sum', key, series[-1]))
+            samples.append((self.name + '_count', key, cumulative))
+        return samples
+
+class MetricsRegistry:
+    """Holds the process's metrics and renders them in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    @staticmethod
+    def _escape(value):
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, value in metric.samples():
+                labelnames = metric.labelnames + (('le',) if name.endswith('_bucket') else ())
+                labels = ','.join(f'{n}="{self._escape(v)}"' for n, v in zip(labelnames, key))
+                lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+METRICS = MetricsRegistry()
+HTTP_REQUEST_SECONDS = METRICS.register(Histogram(
+    'ytdl_http_request_duration_seconds', 'Time to produce a response, by route', ('route', 'method', 'status')))
+HTTP_REQUESTS_IN_FLIGHT = METRICS.register(Gauge(
+    'ytdl_http_requests_in_flight', 'Requests currently being handled, by route', ('route',)))
+STRATEGY_SECONDS = METRICS.register(Histogram(
+    'ytdl_strategy_duration_seconds', 'Duration of extraction and download strategies', ('strategy', 'outcome')))
+STRATEGY_RESULTS = METRICS.register(Counter(
+    'ytdl_strategy_results_total', 'Strategy outcomes, with the exception type for failures',
+    ('strategy', 'outcome', 'exception')))
+JOBS_RUNNING = METRICS.register(Gauge(
+    'ytdl_jobs_running', 'Download jobs currently running, by kind', ('kind',)))
+JOB_RESULTS = METRICS.register(Counter(
+    'ytdl_job_results_total', 'Finished download jobs by state and exception type', ('kind', 'state', 'exception')))
+BYTES_DOWNLOADED = METRICS.register(Counter(
+    'ytdl_bytes_downloaded_total', 'Media bytes fetched from YouTube'))
+BYTES_SERVED = METRICS.register(Counter(
+    'ytdl_bytes_served_total', 'Media bytes sent to clients, by route', ('route',)))
+
+@contextmanager
+def timed_strategy(name):
+    """Record the duration and outcome of the enclosed strategy"""
+    started = time.time()
+    try:
+        yield
+    except Exception as e:
+        observe_strategy(name, 'failed', time.time() - started, type(e).__name__)
+        raise
+    observe_strategy(name, 'success', time.time() - started)
+
+def observe_strategy(name, outcome, seconds, exception=''):
+    STRATEGY_SECONDS.observe(seconds, strategy=name, outcome=outcome)
+    STRATEGY_RESULTS.inc(strategy=name, outcome=outcome, exception=exception)
 
 def is_valid_youtube_url(url):
     """Check if the URL is a valid YouTube URL"""
@@ -160,14 +823,503 @@ def is_valid_youtube_url(url):
 
 def extract_video_id(url):
     """Extract video ID from YouTube URL"""
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
     parsed_url = urlparse(url)
-    if parsed_url.hostname in ('www.youtube.com', 'youtube.com'):
+    if parsed_url.hostname in ('www.youtube.com', 'youtube.com', 'm.youtube.com',
+                               'music.youtube.com', 'www.youtube-nocookie.com'):
         if parsed_url.path == '/watch':
-            return parse_qs(parsed_url.query)['v'][0]
+            return parse_qs(parsed_url.query).get('v', [None])[0]
+        # /embed/<id>, /v/<id> and /shorts/<id> style links
+        parts = parsed_url.path.strip('/').split('/')
+        if len(parts) >= 2 and parts[0] in ('embed', 'v', 'shorts', 'live'):
+            return parts[1]
     elif parsed_url.hostname == 'youtu.be':
-        return parsed_url.path[1:]
+        return parsed_url.path[1:] or None
     return None
 
+class MetadataCache:
+    """Thread-safe TTL + LRU cache for extracted video metadata, bounded by entries and bytes.
+
+    With a shared state backend, entries are also written through to it under
+    'meta:<key>' and a local miss is retried there, so one worker's extraction
+    serves the others until the TTL runs out.
+    """
+
+    PREFIX = 'meta:'
+
+    def __init__(self, ttl, max_entries, max_bytes, backend=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.backend = backend if backend is not None and backend.shared else None
+        self.shared_hits = 0
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss or expired entry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.time():
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+        shared = self._get_shared(key)
+        with self._lock:
+            if shared is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.shared_hits += 1
+        self._store(key, shared['value'], shared['expires_at'])
+        return shared['value']
+
+    def _get_shared(self, key):
+        if self.backend is None:
+            return None
+        try:
+            return self.backend.get(self.PREFIX + key)
+        except Exception as e:
+            print(f"[Cache] Shared metadata lookup failed: {e}")
+            return None
+
+    def set(self, key, value):
+        """Store value under key (and in the shared backend) and evict least recently used entries"""
+        expires_at = time.time() + self.ttl
+        self._store(key, value, expires_at)
+        if self.backend is not None:
+            try:
+                self.backend.set(self.PREFIX + key, {'expires_at': expires_at, 'value': value}, ttl=self.ttl)
+            except Exception as e:
+                print(f"[Cache] Shared metadata write failed: {e}")
+
+    def _store(self, key, value, expires_at):
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, size, value)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.backend is not None:
+            self.backend.delete(*self.backend.items(self.PREFIX))
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'shared_hits': self.shared_hits,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+                'ttl': self.ttl,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes
+            }
+
+METADATA_CACHE = MetadataCache(METADATA_CACHE_TTL, METADATA_CACHE_MAX_ENTRIES, METADATA_CACHE_MAX_BYTES, STATE)
+
+# Large info fields that none of the endpoints use
+TRIMMED_INFO_KEYS = ('automatic_captions', 'subtitles', 'thumbnails', 'heatmap', 'description', 'chapters')
+
+def _trim_info(info):
+    """Strip an extracted info dict down to what the info and download paths need"""
+    info = yt_dlp.YoutubeDL.sanitize_info(info, remove_private_keys=True)
+    for key in TRIMMED_INFO_KEYS:
+        info.pop(key, None)
+    # Storyboards are never offered or downloaded
+    info['formats'] = [f for f in info.get('formats', []) if f.get('protocol') != 'mhtml']
+    return info
+
+# Containers offered to users as video downloads
+VIDEO_CONTAINERS = ('mp4', 'webm', 'mkv', 'avi', 'mov')
+
+# yt-dlp codec string prefixes mapped to a codec family
+CODEC_FAMILIES = {
+    'avc1': 'h264', 'avc3': 'h264', 'h264': 'h264',
+    'hev1': 'h265', 'hvc1': 'h265', 'h265': 'h265',
+    'vp09': 'vp9', 'vp9': 'vp9', 'vp8': 'vp8',
+    'av01': 'av1', 'av1': 'av1',
+    'mp4a': 'aac', 'aac': 'aac', 'opus': 'opus', 'vorbis': 'vorbis', 'mp3': 'mp3',
+    'ac-3': 'ac3', 'ec-3': 'eac3'
+}
+
+def codec_family(codec):
+    """Codec family ('h264', 'vp9', 'aac', 'opus', ...) for a yt-dlp codec string, or None"""
+    if not codec or codec == 'none':
+        return None
+    name = codec.split('.')[0].lower()
+    return CODEC_FAMILIES.get(name, name)
+
+class FormatIndex:
+    """Compact, pre-ranked table of one extraction's formats with lookup indexes.
+
+    build() normalizes and ranks the formats once (by height, then bitrate)
+    and records row positions by format_id, height, codec family, container
+    and kind. to_dict() is plain JSON-compatible data that is cached next to
+    the info dict; FormatIndex(data) wraps it again without any re-ranking.
+    Height keys are strings so the table survives a JSON round trip.
+    """
+
+    KINDS = ('video', 'video_only', 'audio_only', 'muxed', 'progressive', 'offered')
+
+    def __init__(self, data):
+        self.data = data
+        self.rows = data['rows']
+
+    @staticmethod
+    def _row(f):
+        vcodec = f.get('vcodec')
+        acodec = f.get('acodec')
+        return {
+            'format_id': f.get('format_id'),
+            'ext': f.get('ext') or '',
+            'height': f.get('height') or 0,
+            'width': f.get('width') or 0,
+            'fps': f.get('fps') or 0,
+            'tbr': f.get('tbr') or 0,
+            'abr': f.get('abr') or 0,
+            'filesize': f.get('filesize'),
+            'format_note': f.get('format_note') or '',
+            'vcodec': vcodec or '',
+            'acodec': acodec or '',
+            'video_codec': codec_family(vcodec),
+            'audio_codec': codec_family(acodec),
+            'protocol': f.get('protocol') or '',
+            'has_video': bool(vcodec and vcodec != 'none'),
+            'has_audio': bool(acodec and acodec != 'none')
+        }
+
+    @classmethod
+    def build(cls, formats):
+        rows = [cls._row(f) for f in formats if f.get('format_id')]
+        rows.sort(key=lambda r: (r['height'], r['tbr'], r['abr']), reverse=True)
+        data = {'rows': rows, 'by_id': {}, 'by_height': {}, 'by_video_codec': {}, 'by_audio_codec': {},
+                'by_ext': {}}
+        data.update((kind, []) for kind in cls.KINDS)
+        for pos, row in enumerate(rows):
+            data['by_id'][row['format_id']] = pos
+            data['by_ext'].setdefault(row['ext'], []).append(pos)
+            if row['has_video']:
+                data['video'].append(pos)
+                data['by_height'].setdefault(str(row['height']), []).append(pos)
+                data['by_video_codec'].setdefault(row['video_codec'], []).append(pos)
+                data['muxed' if row['has_audio'] else 'video_only'].append(pos)
+                if row['has_audio'] and row['protocol'] in ('http', 'https'):
+                    data['progressive'].append(pos)
+            elif row['has_audio']:
+                data['audio_only'].append(pos)
+            if row['has_audio']:
+                data['by_audio_codec'].setdefault(row['audio_codec'], []).append(pos)
+        # Audio-only formats rank by audio bitrate rather than height
+        data['audio_only'].sort(key=lambda pos: (rows[pos]['abr'], rows[pos]['tbr']), reverse=True)
+        data['offered'] = cls._offered(rows, data['video'])
+        return cls(data)
+
+    @staticmethod
+    def _offered(rows, video):
+        """Best format per height among the video formats offered to users"""
+        playable = [pos for pos in video if rows[pos]['height'] >= 144 and rows[pos]['protocol'] != 'mhtml']
+        candidates = [pos for pos in playable if rows[pos]['ext'] in VIDEO_CONTAINERS] or playable
+        offered, seen_heights = [], set()
+        for pos in candidates:
+            if rows[pos]['height'] not in seen_heights:
+                seen_heights.add(rows[pos]['height'])
+                offered.append(pos)
+        return offered
+
+    def to_dict(self):
+        return self.data
+
+    def _rows(self, positions):
+        return [self.rows[pos] for pos in positions]
+
+    def get(self, format_id):
+        pos = self.data['by_id'].get(format_id)
+        return self.rows[pos] if pos is not None else None
+
+    def ranked(self, kind):
+        """Rows of one kind ('video', 'video_only', 'audio_only', 'muxed', 'progressive', 'offered'), best first"""
+        return self._rows(self.data[kind])
+
+    def best(self, kind):
+        positions = self.data[kind]
+        return self.rows[positions[0]] if positions else None
+
+    def heights(self):
+        return sorted((int(h) for h in self.data['by_height']), reverse=True)
+
+    def has_height(self, height):
+        return str(height) in self.data['by_height']
+
+    def at_height(self, height):
+        return self._rows(self.data['by_height'].get(str(height), []))
+
+    def with_video_codec(self, family):
+        return self._rows(self.data['by_video_codec'].get(family, []))
+
+    def with_audio_codec(self, family):
+        return self._rows(self.data['by_audio_codec'].get(family, []))
+
+    def in_container(self, ext):
+        return self._rows(self.data['by_ext'].get(ext, []))
+
+def cache_video_info(url, info):
+    """Trim, index and cache an extracted info dict; returns the cache entry"""
+    trimmed = _trim_info(info)
+    formats = FormatIndex.build(trimmed.get('formats', []))
+    entry = {
+        'info': trimmed,
+        'formats': formats.to_dict(),
+        'payload': _build_video_payload(trimmed, url, formats)
+    }
+    video_id = extract_video_id(url)
+    if video_id:
+        METADATA_CACHE.set(video_id, entry)
+    return entry
+
+def get_cached_formats(url, ydl, stats=None):
+    """Return (trimmed info dict, FormatIndex) for url, extracting with ydl only on a cache miss.
+
+    Both are shared with the cache and must not be mutated.
+    If a stats dict is given, its 'extractor_calls' counter is incremented on a miss.
+    """
+    video_id = extract_video_id(url)
+    entry = METADATA_CACHE.get(video_id) if video_id else None
+    if entry:
+        print(f"[Cache] Metadata hit for {video_id}")
+    else:
+        if stats is not None:
+            stats['extractor_calls'] = stats.get('extractor_calls', 0) + 1
+        info = ydl.extract_info(url, download=False)
+        if not info or not info.get('title'):
+            return info, FormatIndex.build((info or {}).get('formats', []))
+        entry = cache_video_info(url, info)
+    return entry['info'], FormatIndex(entry['formats'])
+
+def get_cached_info(url, ydl, stats=None):
+    """Return a trimmed info dict for url, extracting with ydl only on a cache miss (see get_cached_formats)"""
+    return get_cached_formats(url, ydl, stats)[0]
+
+class SingleFlight:
+    """Collapses concurrent calls that share a key into one execution.
+
+    The first caller runs the function; callers arriving while it is still
+    running wait for it and receive the same result or exception.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, func):
+        """Return (result, coalesced) for func(), sharing an in-flight call for key"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'done': threading.Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+                self.executed += 1
+            else:
+                self.coalesced += 1
+        if leader:
+            try:
+                call['result'] = func()
+            except Exception as e:
+                call['error'] = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call['done'].set()
+        else:
+            print(f"[SingleFlight] Joining in-flight {self.name} for {key}")
+            call['done'].wait()
+        if call['error'] is not None:
+            raise call['error']
+        return call['result'], not leader
+
+    def stats(self):
+        with self._lock:
+            return {'executed': self.executed, 'coalesced': self.coalesced, 'in_flight': len(self._calls)}
+
+INFO_FLIGHTS = SingleFlight('extraction')
+
+def download_from_info(ydl, info):
+    """Download from an already-extracted info dict without another extractor round trip.
+
+    Returns the processed info dict and the path of the final file.
+    """
+    result = ydl.process_ie_result(copy.deepcopy(info), download=True)
+    downloads = result.get('requested_downloads') or []
+    if downloads and downloads[-1].get('filepath'):
+        return result, downloads[-1]['filepath']
+    return result, ydl.prepare_filename(result)
+
+# Codec families that stream-copy into each output container and play back widely
+CONTAINER_CODECS = {
+    'mp4': {'video': ('h264', 'h265', 'av1'), 'audio': ('aac', 'mp3', 'ac3', 'eac3')},
+    'webm': {'video': ('vp9', 'vp8', 'av1'), 'audio': ('opus', 'vorbis')},
+    'm4a': {'video': (), 'audio': ('aac',)},
+    'opus': {'video': (), 'audio': ('opus',)}
+}
+
+# Audio-only downloads land in whichever of these the chosen stream can be copied into
+AUDIO_CONTAINERS = ('m4a', 'opus')
+mimetypes.add_type('audio/mp4', '.m4a')  # not in every platform's mime table
+mimetypes.add_type('audio/ogg', '.opus')
+
+def audio_container_for(codec):
+    """Audio container a codec can be stream-copied into, or None"""
+    return next((c for c in AUDIO_CONTAINERS if codec in CONTAINER_CODECS[c]['audio']), None)
+
+def plan_postprocessing(formats, format_id, container='mp4'):
+    """Choose formats and postprocessing so the output lands in container with the least work.
+
+    Prefers a video/audio pair whose codecs can be stream-copied into the
+    container (a remux, or nothing at all for a single file already in it).
+    An incompatible selected video is swapped for a compatible one at the
+    same height when available; only when no compatible pair exists is the
+    output transcoded. format_ids that are not in the index (selectors like
+    'bestvideo[height<=720]') are left to yt-dlp as before ('auto').
+    Returns a report dict plus the 'ydl_opts' that implement it.
+    """
+    codecs = CONTAINER_CODECS[container]
+    video = formats.get(format_id)
+    plan = {'container': container, 'requested_format': format_id}
+    
+    if video is None or not video['has_video']:
+        plan.update(mode='auto', ydl_opts={
+            'format': f'{format_id}+bestaudio/best',
+            'merge_output_format': container,
+            'postprocessors': [{'key': 'FFmpegVideoConvertor', 'preferedformat': container}]
+        })
+        return plan
+    
+    if video['video_codec'] not in codecs['video']:
+        substitute = next((f for f in formats.at_height(video['height'])
+                           if f['video_codec'] in codecs['video'] and f['has_audio'] == video['has_audio']), None)
+        if substitute:
+            plan['substituted_from'] = video['format_id']
+            video = substitute
+    video_ok = video['video_codec'] in codecs['video']
+    plan.update(video_format=video['format_id'], video_codec=video['video_codec'])
+    
+    if video['has_audio']:
+        plan['audio_codec'] = video['audio_codec']
+        if video_ok and video['audio_codec'] in codecs['audio']:
+            # A single file: nothing to do if it is already in the container, else a stream-copy remux
+            mode = 'none' if video['ext'] == container else 'remux'
+            plan.update(mode=mode, ydl_opts={
+                'format': video['format_id'],
+                'postprocessors': [{'key': 'FFmpegVideoRemuxer', 'preferedformat': container}] if mode == 'remux' else []
+            })
+        else:
+            plan.update(mode='transcode', ydl_opts={
+                'format': video['format_id'],
+                'postprocessors': [{'key': 'FFmpegVideoConvertor', 'preferedformat': container}]
+            })
+        return plan
+    
+    audio = next((f for f in formats.ranked('audio_only') if f['audio_codec'] in codecs['audio']), None)
+    if video_ok and audio:
+        # The merger stream-copies both streams straight into the container
+        plan.update(mode='remux', audio_format=audio['format_id'], audio_codec=audio['audio_codec'], ydl_opts={
+            'format': f"{video['format_id']}+{audio['format_id']}",
+            'merge_output_format': container,
+            'postprocessors': []
+        })
+        return plan
+    
+    # Nothing compatible: merge into MKV (always a copy), then convert to the container
+    audio = audio or formats.best('audio_only')
+    plan.update(mode='transcode', audio_format=audio['format_id'] if audio else None,
+                audio_codec=audio['audio_codec'] if audio else None, ydl_opts={
+        'format': f"{video['format_id']}+{audio['format_id']}" if audio else video['format_id'],
+        'merge_output_format': 'mkv',
+        'postprocessors': [{'key': 'FFmpegVideoConvertor', 'preferedformat': container}]
+    })
+    return plan
+
+def plan_audio(formats, format_id='bestaudio', container=None):
+    """Choose an audio-only format and how to get it into an audio container without video.
+
+    format_id is an audio-only format from the index, 'bestaudio' or a yt-dlp
+    selector; a format from the index that carries video raises ValueError
+    rather than being swapped for an audio stream behind the caller's back. Without a
+    container the output goes to whichever of AUDIO_CONTAINERS the chosen
+    stream's codec fits, so it is stream-copied ('none' if the downloaded
+    file already is that container, else 'remux'). Naming a container the
+    best stream doesn't fit picks the best stream that does fit, and only
+    when there is none is the audio transcoded. Returns a report dict plus
+    the 'ydl_opts' that implement it, like plan_postprocessing.
+    """
+    candidates = formats.ranked('audio_only')
+    requested = formats.get(format_id)
+    if requested is not None and requested['has_video']:
+        raise ValueError(f"Format {format_id} is a video format; audio mode takes an audio-only format or 'bestaudio'")
+    if requested is not None and requested['has_audio']:
+        audio = requested
+    elif format_id == 'bestaudio' and candidates:
+        # The best stream that fits the container
+        fitting = [f for f in candidates if container is None or f['audio_codec'] in CONTAINER_CODECS[container]['audio']]
+        audio = (fitting or candidates)[0]
+    else:
+        audio = None
+    plan = {'container': container, 'requested_format': format_id}
+    
+    if audio is None:
+        # A selector yt-dlp resolves itself, or no audio-only streams listed: extract from what it picks.
+        # No trailing /best, which could fetch a whole video stream just to keep its audio
+        plan.update(mode='auto', container=container or 'm4a', ydl_opts={
+            'format': f'{format_id}/bestaudio' if requested is None and format_id != 'bestaudio' else 'bestaudio',
+            'postprocessors': [{'key': 'FFmpegExtractAudio', 'preferredcodec': container or 'm4a'}]
+        })
+        return plan
+    
+    container = container or audio_container_for(audio['audio_codec']) or 'm4a'
+    plan.update(container=container, audio_format=audio['format_id'], audio_codec=audio['audio_codec'],
+                abr=audio['abr'])
+    if audio['audio_codec'] in CONTAINER_CODECS[container]['audio']:
+        plan['mode'] = 'none' if audio['ext'] == container else 'remux'
+    else:
+        plan['mode'] = 'transcode'
+    # FFmpegExtractAudio copies the stream when its codec already suits the container
+    plan['ydl_opts'] = {
+        'format': audio['format_id'],
+        'postprocessors': [] if plan['mode'] == 'none' else
+                          [{'key': 'FFmpegExtractAudio', 'preferredcodec': container}]
+    }
+    return plan
+
 def convert_mp4_to_mov(input_file):
     """Convert MP4 file to MOV format using FFmpeg"""
     try:
@@ -201,302 +1353,1887 @@ def convert_mp4_to_mov(input_file):
         print(f"[Conversion] Conversion error: {str(e)}")
         return input_file
 
-@app.route('/')
-def index():
-    return render_template('index.html')
+class DownloadStore:
+    """Content store for finished downloads keyed by (video_id, format_id, container).
 
-@app.route('/get_video_info', methods=['POST'])
-def get_video_info():
-    """Extract video information from YouTube URL using local-like behavior"""
-    try:
-        data = request.get_json()
-        url = data.get('url', '').strip()
-        
-        if not url or not is_valid_youtube_url(url):
-            return jsonify({'error': 'Please provide a valid YouTube URL'}), 400
-        
-        # Use local-like session (same as what works locally)
-        sessions = create_local_like_session()
-        print(f"[LOCAL MODE] Using session ID: {sessions['session_id']}")
-        print(f"[LOCAL MODE] User Agent: {sessions['user_agent']}")
-        print(f"[LOCAL MODE] Request count: {sessions['request_count']}")
-        
-        # Method 1: Local-like approach (replicates exact local behavior)
+    Files are named after the key rather than the video title, and an index
+    in the state backend records their title, size, checksum and creation
+    time so repeat requests can be answered without going back to YouTube.
+    Each artifact is stored under 'artifact:<video_id>:<format_id>:<container>'
+    with an 'artifact-file:<filename>' pointer for lookups by filename. When
+    the stored key differs from the one a request asked for (the planner
+    swapped formats, or the container came out different), an
+    'artifact-alias:' key maps the requested key to it, so a repeat request
+    is answered before anything is extracted.
+    """
+
+    PREFIX = 'artifact:'
+    FILE_PREFIX = 'artifact-file:'
+    ALIAS_PREFIX = 'artifact-alias:'
+
+    def __init__(self, folder, backend):
+        self.folder = folder
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def filename_for(video_id, format_id, container):
+        """Filesystem-safe name for a key; format selectors like 'best[ext=mp4]' are flattened"""
+        safe_format = re.sub(r'[^A-Za-z0-9_-]+', '-', format_id).strip('-') or 'default'
+        return f"{video_id}_{safe_format}.{container}"
+
+    def _key(self, video_id, format_id, container):
+        return f"{self.PREFIX}{video_id}:{format_id}:{container}"
+
+    def lookup(self, video_id, format_id, container):
+        """Return the stored artifact for a key (or a requested key aliased to one), or None if it is missing or damaged"""
+        key = self._key(video_id, format_id, container)
+        artifact = self.backend.get(key)
+        if artifact is None:
+            target = self.backend.get(self.ALIAS_PREFIX + key)
+            artifact = self.backend.get(target) if target else None
+        if artifact and not self._is_intact(artifact):
+            print(f"[Store] Dropping stale index entry for {artifact['filename']}")
+            self.forget(artifact['filename'])
+            artifact = None
+        if artifact:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return artifact
+
+    def _is_intact(self, artifact):
+        path = os.path.join(self.folder, artifact['filename'])
+        return os.path.exists(path) and os.path.getsize(path) == artifact['size']
+
+    def record(self, video_id, format_id, container, filepath, title, quality=None, requested=None):
+        """Index a finished file under its key and return the artifact record.
+
+        requested is the (format_id, container) the request asked for, if different; it becomes an alias.
+        """
+        artifact = {
+            'video_id': video_id,
+            'format_id': format_id,
+            'container': container,
+            'filename': os.path.basename(filepath),
+            'title': title,
+            'quality': quality,
+            'size': os.path.getsize(filepath),
+            'sha256': file_sha256(filepath),
+            'created_at': time.time(),
+            'last_served': None
+        }
+        self.forget(artifact['filename'])
+        key = self._key(video_id, format_id, container)
+        previous = self.backend.get(key)
+        if previous:
+            self.backend.delete(self.FILE_PREFIX + previous['filename'])
+        self.backend.set(key, artifact)
+        self.backend.set(self.FILE_PREFIX + artifact['filename'], key)
+        if requested and tuple(requested) != (format_id, container):
+            # A forgotten artifact leaves the alias dangling; lookup then finds nothing, as it should
+            self.backend.set(self.ALIAS_PREFIX + self._key(video_id, *requested), key)
+        print(f"[Store] Recorded {artifact['filename']} ({artifact['size']} bytes)")
+        return artifact
+
+    def get_by_filename(self, filename):
+        key = self.backend.get(self.FILE_PREFIX + filename)
+        return self.backend.get(key) if key else None
+
+    def all(self):
+        return list(self.backend.items(self.PREFIX).values())
+
+    def touch(self, filename):
+        """Record that a file was just served (drives LRU eviction)"""
+        key = self.backend.get(self.FILE_PREFIX + filename)
+        artifact = self.backend.get(key) if key else None
+        if artifact:
+            artifact['last_served'] = time.time()
+            self.backend.set(key, artifact)
+
+    def forget(self, filename):
+        key = self.backend.get(self.FILE_PREFIX + filename)
+        if key:
+            self.backend.delete(key, self.FILE_PREFIX + filename)
+
+    def stats(self):
+        artifacts = self.all()
+        return {'artifacts': len(artifacts), 'bytes': sum(a['size'] for a in artifacts),
+                'hits': self.hits, 'misses': self.misses}
+
+def job_files(url, format_id):
+    """Name prefix shared by every file a download job for url/format_id writes (streams, partials, result)"""
+    video_id = extract_video_id(url)
+    return DownloadStore.filename_for(video_id, format_id, '') if video_id else None
+
+def file_sha256(filepath):
+    """SHA-256 of a file, read in 1 MiB blocks"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+DOWNLOAD_STORE = DownloadStore(UPLOAD_FOLDER, STATE)
+
+def artifact_response(artifact, **extra):
+    """Download response body for a stored artifact"""
+    body = {
+        'success': True,
+        'filename': artifact['filename'],
+        'filepath': os.path.join(UPLOAD_FOLDER, artifact['filename']),
+        'title': artifact['title'] or 'Unknown Title',
+        'filesize': artifact['size'],
+        'checksum': artifact['sha256']
+    }
+    body.update(extra)
+    return body
+
+class FileLeases:
+    """Reference counts for files that are being streamed to clients"""
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, filename):
+        with self._lock:
+            self._counts[filename] = self._counts.get(filename, 0) + 1
+
+    def release(self, filename):
+        with self._lock:
+            remaining = self._counts.get(filename, 0) - 1
+            if remaining > 0:
+                self._counts[filename] = remaining
+            else:
+                self._counts.pop(filename, None)
+
+    def in_use(self, filename):
+        with self._lock:
+            return filename in self._counts
+
+FILE_LEASES = FileLeases()
+
+class LeasedFile(io.FileIO):
+    """A file opened for serving that holds a FILE_LEASES lease until it is closed.
+
+    send_file responses are passed straight to the server (no call_on_close),
+    which closes the file once the last byte is sent or the client goes away.
+    """
+
+    def __init__(self, path):
+        super().__init__(path, 'rb')
+        self.lease = os.path.basename(path)
+        FILE_LEASES.acquire(self.lease)
+
+    def close(self):
+        if not self.closed:
+            FILE_LEASES.release(self.lease)
+        super().close()
+
+# Suffixes of files yt-dlp and ffmpeg are still writing
+PARTIAL_SUFFIXES = ('.part', '.ytdl', '.temp', '.tmp')
+
+class DownloadJanitor:
+    """Background sweeper that keeps UPLOAD_FOLDER under a byte quota and a maximum file age.
+
+    Files over the age limit go first, then least recently served files until
+    usage fits the quota. Recently written files, files that are being
+    streamed and files of queued or running jobs are never evicted, nor are
+    partial downloads younger than the age limit (interrupted jobs resume
+    from them). Ages are measured from the later of mtime and ctime:
+    yt-dlp may set mtime to the upstream Last-Modified date, weeks in the
+    past, but setting it still moves ctime to the time of the download.
+    """
+
+    def __init__(self, store, quota_bytes, max_age, interval, grace):
+        self.store = store
+        self.quota_bytes = quota_bytes
+        self.max_age = max_age
+        self.interval = interval
+        self.grace = grace
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self.usage_bytes = 0
+        self.last_run = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='download-janitor', daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"[Janitor] Sweep failed: {str(e)}")
+            time.sleep(self.interval)
+
+    @staticmethod
+    def _written_at(entry):
+        stat = entry.stat()
+        return max(stat.st_mtime, stat.st_ctime)
+
+    def _is_protected(self, entry, now):
+        if FILE_LEASES.in_use(entry.name) or JOB_MANAGER.writes(entry.name):
+            return True
+        if entry.name.endswith(PARTIAL_SUFFIXES) or '.temp.' in entry.name:
+            # Kept for resumable jobs, but not forever once nothing came back for them
+            return now - self._written_at(entry) < self.max_age
+        return now - self._written_at(entry) < self.grace
+
+    def run_once(self):
+        """Sweep the folder once; returns the number of bytes evicted"""
+        now = time.time()
+        index = {a['filename']: a for a in self.store.all()}
+        usage = 0
+        candidates = []  # (last_used, created, size, name)
+        for entry in os.scandir(self.store.folder):
+            if not entry.is_file():
+                continue
+            size = entry.stat().st_size
+            usage += size
+            if self._is_protected(entry, now):
+                continue
+            artifact = index.get(entry.name)
+            created = artifact['created_at'] if artifact else self._written_at(entry)
+            last_used = (artifact and artifact['last_served']) or created
+            candidates.append((last_used, created, size, entry.name))
+
+        evicted = 0
+        candidates.sort()
+        for last_used, created, size, name in candidates:
+            too_old = now - created > self.max_age
+            over_quota = usage - evicted > self.quota_bytes
+            if not (too_old or over_quota):
+                continue
+            try:
+                os.remove(os.path.join(self.store.folder, name))
+            except FileNotFoundError:
+                pass
+            self.store.forget(name)
+            evicted += size
+            self.evicted_files += 1
+            print(f"[Janitor] Evicted {name} ({size} bytes, {'expired' if too_old else 'over quota'})")
+
+        self.evicted_bytes += evicted
+        self.usage_bytes = usage - evicted
+        self.last_run = now
+        return evicted
+
+    def stats(self):
+        return {
+            'usage_bytes': self.usage_bytes,
+            'quota_bytes': self.quota_bytes,
+            'max_age': self.max_age,
+            'evicted_files': self.evicted_files,
+            'evicted_bytes': self.evicted_bytes,
+            'last_run': datetime.fromtimestamp(self.last_run).isoformat() if self.last_run else None
+        }
+
+DOWNLOAD_JANITOR = DownloadJanitor(DOWNLOAD_STORE, DOWNLOADS_QUOTA_BYTES, DOWNLOADS_MAX_AGE,
+                                   JANITOR_INTERVAL, JANITOR_GRACE)
+METRICS.register(CallbackGauge(
+    'ytdl_download_janitor', 'Download folder usage and janitor evictions', ('stat',),
+    lambda: {(k,): v for k, v in DOWNLOAD_JANITOR.stats().items()
+             if k in ('usage_bytes', 'quota_bytes', 'evicted_files', 'evicted_bytes')}))
+
+class Handoff:
+    """Returned by a job function to continue the job with func(*args) on the postprocessing pool"""
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+class JobManager:
+    """Runs download work on a bounded thread pool and tracks each job by ID.
+
+    Job functions return a (response body, status code) tuple, which becomes
+    the job's result once it finishes. A job function running on a network
+    worker may instead return a Handoff; the job then waits in the
+    postprocessing queue (state 'postprocessing') and finishes on that pool,
+    leaving the network worker free for the next download.
+
+    Every change to a job is also published to a shared state backend under
+    'job:<id>', so a status or event request that lands on another worker
+    can still report the job.
+
+    Jobs whose function is registered with register_resumable() are also
+    persisted under 'resume:<id>' until they finish, together with a
+    'resume-lock:<id>' lease that the owning worker keeps renewing. When a
+    worker dies or is recycled its leases run out (or are released at exit),
+    and the first worker to claim one re-runs the job under the same ID; the
+    job function finds the persisted options in job['resume'] and continues
+    from the partial files. Renewal only succeeds while the lease still names
+    this worker, so a worker that stalled past its lease learns it lost the
+    job, and its copy stops at the next progress hook. Resuming needs a shared
+    backend: with STATE_BACKEND=memory nothing is persisted, and jobs
+    interrupted by a restart are lost.
+    """
+
+    PREFIX = 'job:'
+    RESUME_PREFIX = 'resume:'
+    LOCK_PREFIX = 'resume-lock:'
+
+    def __init__(self, max_workers, retention, postprocess_workers, backend=None,
+                 lease=30, max_attempts=3):
+        self.max_workers = max_workers
+        self.retention = retention
+        self.postprocess_workers = postprocess_workers
+        self.backend = backend if backend is not None and backend.shared else None
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._resumable = {}  # function name -> function
+        self._leases = set()  # IDs of resumable jobs this worker owns
+        self._lost = set()  # IDs of jobs still running here whose lease another worker took over
+        self._watcher = None
+        self.resumed = 0
+        self._finish_listeners = []
+        self._executor = None  # created on first use so each gunicorn worker owns its threads
+        self._postprocess_executor = None
+        self.postprocess_queued = 0
+        self.postprocess_running = 0
+        self._jobs = {}
+        self._inflight = {}  # coalescing key -> queued or running job
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='download')
+            return self._executor
+
+    def _get_postprocess_executor(self):
+        with self._lock:
+            if self._postprocess_executor is None:
+                self._postprocess_executor = ThreadPoolExecutor(max_workers=self.postprocess_workers,
+                                                                thread_name_prefix='postprocess')
+            return self._postprocess_executor
+
+    def submit(self, kind, func, *args, key=None, files=None, job_id=None, resume=None):
+        """Queue func(*args) as a new job and return the job record.
+
+        If key is given and a job with the same key is still queued or
+        running, that job is returned instead and no new work is queued.
+        files is the name prefix of the files the job writes in UPLOAD_FOLDER
+        (see job_files); the janitor leaves them alone until the job finishes.
+        job_id and resume are only passed when re-running an interrupted job.
+        """
+        job = {
+            'id': job_id or uuid.uuid4().hex,
+            'kind': kind,
+            'state': 'queued',
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'result': None,
+            'status_code': None,
+            'progress': None,
+            'timings': None,
+            'resume': resume,
+            'files': files,
+            'key': key,
+            'seq': 0  # bumped on every state or progress change
+        }
+        # Lookup and insert under one lock, so concurrent identical requests can't each queue a job
+        with self._lock:
+            existing = self._inflight.get(key) if key is not None else None
+            if existing is None:
+                self._prune()
+                self._jobs[job['id']] = job
+                if key is not None:
+                    self._inflight[key] = job
+            else:
+                self.coalesced += 1
+        if existing is not None:
+            print(f"[Jobs] Coalesced {kind} request into job {existing['id']}")
+            return existing
+        if resume is None and self.backend is not None and func.__name__ in self._resumable:
+            self._persist(job, func, args)
+        self._get_executor().submit(self._run, job, func, args)
+        print(f"[Jobs] Queued {kind} job {job['id']}")
+        return job
+
+    def _run(self, job, func, args):
+        self._update(job, state='running', started_at=time.time())
+        JOBS_RUNNING.inc(kind=job['kind'])
+        self._run_stage(job, func, args, PhaseTimer())
+
+    def _run_stage(self, job, func, args, timer):
+        _job_context.job = job
+        _job_context.timer = timer
+        exception = ''
         try:
-            print(f"[LOCAL MODE] Method 1: Local browser simulation...")
-            ydl_opts = {
-                'quiet': False,  # Show output like local
-                'no_warnings': False,  # Show warnings like local
-                'extract_flat': False,
-                # Use exact same settings that work locally
-                'nocheckcertificate': False,  # Don't skip certs like local
-                'no_check_certificate': False,
-                'ignoreerrors': False,
-                'extractor_retries': 1,  # Minimal retries like local
-                'retries': 1,
-                'fragment_retries': 1,
-                'http_chunk_size': 1048576,  # Small chunks like local
-                'sleep_interval': 0,  # No artificial delays like local
-                'max_sleep_interval': 0,
-                # Use the exact user agent that works locally
-                'user_agent': sessions['user_agent'],
-                # Use realistic headers that work locally
-                'http_headers': get_realistic_headers(sessions),
-                # Don't use aggressive bypass - use normal approach like local
-                'cookiefile': None,
-                'cookiesfrombrowser': None,
-                # Use normal extractor settings like local
-                'extractor_args': {
-                    'youtube': {
-                        'skip': ['storyboard', 'image'],  # Only skip obvious non-video
-                        'player_client': ['web'],  # Use web client like local
-                        'player_skip': [],  # Don't skip anything like local
-                    }
-                },
-                # Use normal format selection like local
-                'format': 'best[ext=mp4]/best',
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                
-                if info and info.get('title'):
-                    print(f"[LOCAL MODE] Success! Title: {info.get('title')}")
-                    # Update session with successful request
-                    sessions['last_request'] = url
-                    sessions['successful_requests'] = sessions.get('successful_requests', 0) + 1
-                    save_sessions(sessions)
-                    return _process_video_info(info, url)
-                    
+            outcome = func(*args)
+            if isinstance(outcome, Handoff):
+                self._hand_off(job, outcome, timer)
+                return
+            result, status_code = outcome
         except Exception as e:
-            print(f"[LOCAL MODE] Method 1 failed: {str(e)}")
-            print(f"[LOCAL MODE] Error type: {type(e).__name__}")
-        
-        # Method 2: Fallback to local browser cookies approach
+            result, status_code = {'error': f'Job failed: {str(e)}'}, 500
+            exception = type(e).__name__
+        finally:
+            _job_context.job = None
+            _job_context.timer = None
+        self._finish(job, result, status_code, exception, timer)
+
+    def add_finish_listener(self, func):
+        """Call func(job) whenever a job finishes or fails"""
+        self._finish_listeners.append(func)
+
+    def _hand_off(self, job, handoff, timer):
+        with self._lock:
+            self.postprocess_queued += 1
+        timer.start('postprocess_queue')
+        self._update(job, state='postprocessing')
+        print(f"[Jobs] {job['kind']} job {job['id']} handed off for postprocessing")
+        self._get_postprocess_executor().submit(self._run_postprocess, job, handoff, timer)
+
+    def _run_postprocess(self, job, handoff, timer):
+        with self._lock:
+            self.postprocess_queued -= 1
+            self.postprocess_running += 1
+        timer.stop('postprocess_queue')
         try:
-            print(f"[LOCAL MODE] Method 2: Browser cookies simulation...")
-            ydl_opts = {
-                'quiet': False,
-                'no_warnings': False,
-                'extract_flat': False,
-                # Use browser-like settings
-                'nocheckcertificate': False,
-                'no_check_certificate': False,
-                'ignoreerrors': False,
-                'extractor_retries': 1,
-                'retries': 1,
-                'fragment_retries': 1,
-                'http_chunk_size': 1048576,
-                'sleep_interval': 0,
-                'max_sleep_interval': 0,
-                # Use consistent user agent
-                'user_agent': sessions['user_agent'],
-                # Use realistic headers
-                'http_headers': get_realistic_headers(sessions),
-                # Try to use browser cookies (like local)
-                'cookiesfrombrowser': ('chrome', 'firefox', 'safari'),
-                'cookiefile': None,
-                # Normal extractor settings
-                'extractor_args': {
-                    'youtube': {
-                        'skip': ['storyboard', 'image'],
-                        'player_client': ['web'],
-                        'player_skip': [],
-                    }
-                },
-                'format': 'best[ext=mp4]/best',
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                
-                if info and info.get('title'):
-                    print(f"[LOCAL MODE] Method 2 successful: {info.get('title')}")
-                    sessions['last_request'] = url
-                    sessions['successful_requests'] = sessions.get('successful_requests', 0) + 1
-                    save_sessions(sessions)
-                    return _process_video_info(info, url)
-                    
+            self._run_stage(job, handoff.func, handoff.args, timer)
+        finally:
+            with self._lock:
+                self.postprocess_running -= 1
+
+    def _finish(self, job, result, status_code, exception, timer):
+        self._forget_resumable(job['id'])
+        timings = timer.summary()
+        JOBS_RUNNING.dec(kind=job['kind'])
+        self._update(job, result=result, status_code=status_code, timings=timings,
+                     state='finished' if status_code < 400 else 'failed', finished_at=time.time())
+        # One structured timing record per job
+        print(f"[Timing] {json.dumps(dict(timings, job_id=job['id'], kind=job['kind'], state=job['state']))}")
+        JOB_RESULTS.inc(kind=job['kind'], state=job['state'], exception=exception)
+        print(f"[Jobs] {job['kind']} job {job['id']} {job['state']} in {job['finished_at'] - job['started_at']:.1f}s")
+        with self._lock:
+            self._lost.discard(job['id'])
+        for listener in self._finish_listeners:
+            listener(job)
+
+    def _update(self, job, **fields):
+        with self._changed:
+            job.update(fields)
+            if job['finished_at'] and self._inflight.get(job['key']) is job:
+                del self._inflight[job['key']]
+            job['seq'] += 1
+            self._changed.notify_all()
+            # A job resumed elsewhere is published by its new owner, not by this stale copy
+            publish = self.backend is not None and job['id'] not in self._lost
+            record = {name: value for name, value in job.items() if name != 'key'} if publish else None
+        if record is not None:
+            try:
+                self.backend.set(self.PREFIX + job['id'], record, ttl=self.retention)
+            except Exception as e:
+                print(f"[Jobs] Could not publish job {job['id']}: {e}")
+
+    def publish_progress(self, job, progress):
+        """Record a progress snapshot for a job and wake any event streams"""
+        self._update(job, progress=progress)
+
+    def register_resumable(self, func):
+        """Allow jobs running func to be persisted and resumed by another worker"""
+        self._resumable[func.__name__] = func
+
+    @property
+    def owner(self):
+        # Evaluated on use so each forked worker has its own identity
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def _persist(self, job, func, args):
+        spec = {
+            'job_id': job['id'],
+            'kind': job['kind'],
+            'func': func.__name__,
+            'args': list(args),
+            'key': list(job['key']) if job['key'] is not None else None,
+            'files': job['files'],
+            'created_at': job['created_at'],
+            'attempt': 0,
+            'ydl_opts': None,
+            'target': None
+        }
+        try:
+            self.backend.set(self.LOCK_PREFIX + job['id'], self.owner, ttl=self.lease)
+            self.backend.set(self.RESUME_PREFIX + job['id'], spec)
         except Exception as e:
-            print(f"[LOCAL MODE] Method 2 failed: {str(e)}")
-            print(f"[LOCAL MODE] Error type: {type(e).__name__}")
-        
-        # Method 3: Minimal local approach (like when local fails)
+            print(f"[Jobs] Could not persist job {job['id']}: {e}")
+            return
+        with self._lock:
+            self._leases.add(job['id'])
+        self.start_resume_watcher()
+
+    def checkpoint(self, job, **fields):
+        """Merge fields into a resumable job's persisted record.
+
+        A no-op for other jobs and without a shared backend, where nothing
+        survives a restart anyway.
+        """
+        if self.backend is None or job['id'] not in self._leases:
+            return
         try:
-            print(f"[LOCAL MODE] Method 3: Minimal local approach...")
-            ydl_opts = {
-                'quiet': False,
-                'no_warnings': False,
-                'extract_flat': False,
-                # Minimal settings like local
-                'nocheckcertificate': False,
-                'no_check_certificate': False,
-                'ignoreerrors': False,
-                'extractor_retries': 1,
-                'retries': 1,
-                'fragment_retries': 1,
-                'http_chunk_size': 1048576,
-                'sleep_interval': 0,
-                'max_sleep_interval': 0,
-                # Keep same user agent
-                'user_agent': sessions['user_agent'],
-                # Minimal headers
-                'http_headers': {
-                    'User-Agent': sessions['user_agent'],
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                    'Accept-Language': 'en-US,en;q=0.9',
-                    'Referer': 'https://www.youtube.com/',
-                },
-                'cookiefile': None,
-                'cookiesfrombrowser': None,
-                # Very basic format
-                'format': 'best',
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                
-                if info and info.get('title'):
-                    print(f"[LOCAL MODE] Method 3 successful: {info.get('title')}")
-                    sessions['last_request'] = url
-                    sessions['successful_requests'] = sessions.get('successful_requests', 0) + 1
-                    save_sessions(sessions)
-                    return _process_video_info(info, url)
-                    
+            spec = self.backend.get(self.RESUME_PREFIX + job['id'])
+            if spec is not None:
+                spec.update(fields)
+                self.backend.set(self.RESUME_PREFIX + job['id'], spec)
         except Exception as e:
-            print(f"[LOCAL MODE] Method 3 failed: {str(e)}")
-            print(f"[LOCAL MODE] Error type: {type(e).__name__}")
-        
-        # All local methods failed - this is unusual
-        print(f"[LOCAL MODE] All local simulation methods failed for URL: {url}")
-        print(f"[LOCAL MODE] This suggests YouTube may have updated their system")
-        
-        # Update session with failure
-        sessions['failed_requests'] = sessions.get('failed_requests', 0) + 1
-        sessions['last_error'] = str(e)
-        save_sessions(sessions)
-        
-        return jsonify({
-            'error': 'Local simulation methods failed. This is unusual and may indicate YouTube has updated their system.',
-            'suggestion': 'Try again in a few minutes or check if YouTube is experiencing issues',
-            'session_info': {
-                'session_id': sessions['session_id'],
-                'user_agent': sessions['user_agent'],
-                'successful_requests': sessions.get('successful_requests', 0),
-                'failed_requests': sessions.get('failed_requests', 0),
-                'total_requests': sessions['request_count']
+            print(f"[Jobs] Could not checkpoint job {job['id']}: {e}")
+
+    def annotate(self, job, **fields):
+        """Set extra fields on a job record without counting it as progress"""
+        self._update(job, **fields)
+
+    def _forget_resumable(self, job_id):
+        with self._lock:
+            if job_id not in self._leases:
+                return
+            self._leases.discard(job_id)
+        try:
+            self.backend.delete(self.RESUME_PREFIX + job_id, self.LOCK_PREFIX + job_id)
+        except Exception as e:
+            print(f"[Jobs] Could not clear resume record for {job_id}: {e}")
+
+    def start_resume_watcher(self):
+        """Start the thread that renews this worker's leases and resumes orphaned jobs"""
+        if self.backend is None:
+            return
+        with self._lock:
+            if self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch, name='job-resume', daemon=True)
+                self._watcher.start()
+
+    def _watch(self):
+        while True:
+            try:
+                self._renew_leases()
+                self.resume_orphans()
+            except Exception as e:
+                print(f"[Jobs] Resume sweep failed: {e}")
+            time.sleep(self.lease / 3)
+
+    def _renew_leases(self):
+        with self._lock:
+            leases = list(self._leases)
+        for job_id in leases:
+            if self.backend.renew(self.LOCK_PREFIX + job_id, self.owner, ttl=self.lease):
+                continue
+            # Our lease lapsed and another worker resumed the job; let that copy own it
+            print(f"[Jobs] Lost resume lease for job {job_id} to {self.backend.get(self.LOCK_PREFIX + job_id)}")
+            with self._lock:
+                self._leases.discard(job_id)
+                if job_id in self._jobs and not self._jobs[job_id]['finished_at']:
+                    self._lost.add(job_id)
+
+    def lease_lost(self, job):
+        """True if another worker has taken over this running job"""
+        return job['id'] in self._lost
+
+    def release_leases(self):
+        """Drop this worker's leases (at exit) so another worker resumes its jobs right away"""
+        with self._lock:
+            leases, self._leases = list(self._leases), set()
+            self._lost.update(leases)  # whoever resumes them publishes their records from now on
+        for job_id in leases:
+            try:
+                self.backend.delete(self.LOCK_PREFIX + job_id)
+            except Exception:
+                pass
+
+    def resume_orphans(self):
+        """Claim and re-run persisted jobs whose owner's lease has lapsed; returns how many"""
+        resumed = 0
+        for spec in self.backend.items(self.RESUME_PREFIX).values():
+            job_id = spec['job_id']
+            with self._lock:
+                if job_id in self._jobs and not self._jobs[job_id]['finished_at']:
+                    continue
+            if not self.backend.add(self.LOCK_PREFIX + job_id, self.owner, ttl=self.lease):
+                continue  # still owned, or another worker just claimed it
+            func = self._resumable.get(spec['func'])
+            spec['attempt'] += 1
+            if func is None or spec['attempt'] > self.max_attempts:
+                print(f"[Jobs] Giving up on interrupted job {job_id} after {spec['attempt'] - 1} resumes")
+                self.backend.delete(self.RESUME_PREFIX + job_id, self.LOCK_PREFIX + job_id)
+                continue
+            self.backend.set(self.RESUME_PREFIX + job_id, spec)
+            with self._lock:
+                self._leases.add(job_id)
+                self.resumed += 1
+            key = tuple(spec['key']) if spec['key'] is not None else None
+            print(f"[Jobs] Resuming interrupted {spec['kind']} job {job_id} (attempt {spec['attempt']})")
+            job = self.submit(spec['kind'], func, *spec['args'], key=key, files=spec.get('files'),
+                              job_id=job_id, resume=spec)
+            if job['id'] != job_id:
+                # The same download was requested again meanwhile; that job picks up the partial files
+                self._forget_resumable(job_id)
+            resumed += 1
+        return resumed
+
+    def wait_for_change(self, job, seq, timeout):
+        """Block until the job's seq moves past seq or timeout elapses; returns the current job.
+
+        Jobs running on another worker are polled from the state backend.
+        """
+        with self._changed:
+            local = self._jobs.get(job['id']) is job
+            if local:
+                self._changed.wait_for(lambda: job['seq'] != seq, timeout)
+                return job
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            time.sleep(min(0.5, max(0.0, deadline - time.time())))
+            current = self._get_remote(job['id'])
+            if current is None or current['seq'] != seq:
+                return current or job
+        return job
+
+    def writes(self, filename):
+        """True if a queued or running job of this worker may still write or read filename"""
+        with self._lock:
+            return any(job['files'] and filename.startswith(job['files'])
+                       for job in self._jobs.values() if not job['finished_at'])
+
+    def wait_until(self, predicate, timeout):
+        """Block until predicate() is true after some job change, or timeout elapses"""
+        with self._changed:
+            self._changed.wait_for(predicate, timeout)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job if job is not None else self._get_remote(job_id)
+
+    def _get_remote(self, job_id):
+        if self.backend is None:
+            return None
+        try:
+            return self.backend.get(self.PREFIX + job_id)
+        except Exception as e:
+            print(f"[Jobs] Could not read job {job_id}: {e}")
+            return None
+
+    def list(self):
+        """Jobs of this worker plus those other workers have published"""
+        with self._lock:
+            jobs = {job['id']: job for job in self._jobs.values()}
+        if self.backend is not None:
+            try:
+                remote = self.backend.items(self.PREFIX).values()
+            except Exception as e:
+                print(f"[Jobs] Could not list shared jobs: {e}")
+                remote = []
+            for record in remote:
+                jobs.setdefault(record['id'], record)
+        return list(jobs.values())
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id in [j['id'] for j in self._jobs.values() if j['finished_at'] and j['finished_at'] < cutoff]:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            states = {}
+            for job in self._jobs.values():
+                states[job['state']] = states.get(job['state'], 0) + 1
+            postprocess = {'workers': self.postprocess_workers, 'queued': self.postprocess_queued,
+                           'running': self.postprocess_running}
+        return {'max_workers': self.max_workers, 'jobs': states, 'coalesced': self.coalesced,
+                'postprocess': postprocess, 'resumable': len(self._leases), 'resumed': self.resumed}
+
+JOB_MANAGER = JobManager(DOWNLOAD_WORKERS, JOB_RETENTION, POSTPROCESS_WORKERS, STATE,
+                         RESUME_LEASE, RESUME_MAX_ATTEMPTS)
+atexit.register(JOB_MANAGER.release_leases)
+
+# The job being run by the current pool thread, if any
+_job_context = threading.local()
+
+def current_job():
+    return getattr(_job_context, 'job', None)
+
+def current_timer():
+    return getattr(_job_context, 'timer', None)
+
+class ProgressReporter:
+    """Bridges yt-dlp progress and postprocessor hooks into throttled job progress events"""
+
+    # yt-dlp postprocessor names mapped to the phase shown to users
+    PHASES = {'Merger': 'merge', 'VideoConvertor': 'convert', 'VideoRemuxer': 'convert'}
+
+    def __init__(self, job, min_interval):
+        self.job = job
+        self.min_interval = min_interval
+        self._last_publish = 0.0
+        self._phase = None
+
+    def progress_hook(self, d):
+        if JOB_MANAGER.lease_lost(self.job):
+            # Another worker resumed this job; stop writing to the partial files it now owns
+            raise yt_dlp.utils.DownloadCancelled('Resume lease lost to another worker')
+        if d.get('status') not in ('downloading', 'finished'):
+            return
+        total = d.get('total_bytes') or d.get('total_bytes_estimate')
+        downloaded = d.get('downloaded_bytes') or 0
+        self.publish({
+            'phase': 'download',
+            'status': d['status'],
+            'format_id': (d.get('info_dict') or {}).get('format_id'),
+            'downloaded_bytes': downloaded,
+            'total_bytes': total,
+            'percent': round(downloaded * 100 / total, 1) if total else None,
+            'speed': d.get('speed'),
+            'eta': d.get('eta'),
+            'fragment_index': d.get('fragment_index'),
+            'fragment_count': d.get('fragment_count')
+        }, force=d['status'] == 'finished')
+
+    def postprocessor_hook(self, d):
+        phase = self.PHASES.get(d.get('postprocessor'), 'postprocess')
+        self.publish({
+            'phase': phase,
+            'status': d.get('status'),
+            'postprocessor': d.get('postprocessor')
+        }, force=d.get('status') != 'processing')
+
+    def publish(self, progress, force=False):
+        now = time.time()
+        phase_changed = progress['phase'] != self._phase
+        if not (force or phase_changed) and now - self._last_publish < self.min_interval:
+            return
+        self._phase = progress['phase']
+        self._last_publish = now
+        JOB_MANAGER.publish_progress(self.job, progress)
+
+    def ydl_opts(self):
+        return {
+            'progress_hooks': [self.progress_hook],
+            'postprocessor_hooks': [self.postprocessor_hook]
+        }
+
+class PhaseTimer:
+    """Timing spans for the phases of one job (extract, download, merge, convert, validate, ...).
+
+    Spans are opened and closed explicitly, with span(), or by yt-dlp's
+    progress and postprocessor hooks. Spans still open when summary() is
+    called (e.g. after an early return) are closed at that point.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.spans = []
+        self._open = {}  # (phase, key) -> span
+        self._lock = threading.Lock()
+
+    def start(self, phase, key=None, **detail):
+        with self._lock:
+            if (phase, key) in self._open:
+                return
+            span = {'phase': phase, 'start': round(time.time() - self.started, 3), 'seconds': None}
+            span.update(detail)
+            self._open[(phase, key)] = span
+            self.spans.append(span)
+
+    def stop(self, phase, key=None):
+        with self._lock:
+            span = self._open.pop((phase, key), None)
+            if span:
+                span['seconds'] = round(time.time() - self.started - span['start'], 3)
+
+    @contextmanager
+    def span(self, phase, **detail):
+        key = object()
+        self.start(phase, key, **detail)
+        try:
+            yield
+        finally:
+            self.stop(phase, key)
+
+    def progress_hook(self, d):
+        # Each stream (video, audio) is its own download span
+        stream = d.get('filename')
+        if d.get('status') == 'downloading':
+            self.start('download', stream, format_id=(d.get('info_dict') or {}).get('format_id'))
+        elif d.get('status') in ('finished', 'error'):
+            self.stop('download', stream)
+
+    def postprocessor_hook(self, d):
+        name = d.get('postprocessor')
+        phase = ProgressReporter.PHASES.get(name, 'postprocess')
+        if d.get('status') == 'started':
+            self.start(phase, name, postprocessor=name)
+        elif d.get('status') == 'finished':
+            self.stop(phase, name)
+
+    def summary(self):
+        for phase, key in list(self._open):
+            self.stop(phase, key)
+        phases = {}
+        for span in self.spans:
+            phases[span['phase']] = round(phases.get(span['phase'], 0) + span['seconds'], 3)
+        return {
+            'total_seconds': round(time.time() - self.started, 3),
+            'phases': phases,
+            'slowest_phase': max(phases, key=phases.get) if phases else None,
+            'spans': self.spans
+        }
+
+@contextmanager
+def phase_span(phase, **detail):
+    """Time the enclosed block as a phase of the current job (no-op outside a job)"""
+    timer = current_timer()
+    if timer is None:
+        yield
+        return
+    with timer.span(phase, **detail):
+        yield
+
+def job_progress_opts():
+    """yt-dlp options that report progress and phase timings for the current job (empty outside a job)"""
+    job = current_job()
+    if job is None:
+        return {}
+    opts = ProgressReporter(job, PROGRESS_MIN_INTERVAL).ydl_opts()
+    timer = current_timer()
+    if timer is not None:
+        opts['progress_hooks'].append(timer.progress_hook)
+        opts['postprocessor_hooks'].append(timer.postprocessor_hook)
+    return opts
+
+def job_summary(job, debug=False):
+    """Public view of a job record; debug adds per-phase timings"""
+    summary = {
+        'job_id': job['id'],
+        'kind': job['kind'],
+        'state': job['state'],
+        'status_url': f"/jobs/{job['id']}",
+        'events_url': f"/jobs/{job['id']}/events",
+        'created_at': datetime.fromtimestamp(job['created_at']).isoformat()
+    }
+    if job['started_at']:
+        end = job['finished_at'] or time.time()
+        summary['elapsed'] = round(end - job['started_at'], 2)
+    if job['progress']:
+        summary['progress'] = job['progress']
+    if job.get('resume'):
+        summary['resumed'] = {name: job['resume'].get(name) for name in ('attempt', 'partial_bytes', 'bytes_saved')}
+    if job['finished_at']:
+        summary['result'] = job['result']
+        summary['status_code'] = job['status_code']
+        if debug:
+            summary['timings'] = job['timings']
+    return summary
+
+def debug_requested():
+    return request.args.get('debug', '').lower() in ('1', 'true', 'yes')
+
+# Batch quality policies mapped to the format_id passed to run_download_video
+# (run_download_video appends +bestaudio/best to it)
+BATCH_QUALITIES = {
+    'best': 'bestvideo',
+    '1080p': 'bestvideo[height<=1080]',
+    '720p': 'bestvideo[height<=720]',
+    '480p': 'bestvideo[height<=480]',
+    '360p': 'bestvideo[height<=360]'
+}
+
+class BatchManager:
+    """Feeds the items of a URL batch into the job pool, at most `concurrency` at a time per batch.
+
+    Each batch gets a small feeder thread that waits for one of its jobs to
+    finish downloading before submitting the next item, so one long list
+    cannot occupy every pool worker.
+    """
+
+    OPEN_RETRY_AFTER = 30  # seconds suggested to a client that already has max_open batches running
+
+    def __init__(self, jobs, concurrency, retention, max_open=0):
+        self.jobs = jobs
+        self.concurrency = concurrency
+        self.retention = retention
+        self.max_open = max_open
+        self._batches = {}
+        self._lock = threading.Lock()
+
+    def create(self, urls, quality, client=None):
+        """Start a batch; raises Rejected if client already has max_open unfinished batches"""
+        format_id = BATCH_QUALITIES[quality]
+        batch = {
+            'id': uuid.uuid4().hex,
+            'quality': quality,
+            'format_id': format_id,
+            'client': client,
+            'created_at': time.time(),
+            'items': [{'url': url, 'video_id': extract_video_id(url), 'job': None} for url in urls]
+        }
+        with self._lock:
+            self._prune()
+            if self.max_open and client is not None:
+                open_batches = sum(1 for b in self._batches.values() if b['client'] == client and not self.is_done(b))
+                if open_batches >= self.max_open:
+                    raise Rejected('open_batches', self.OPEN_RETRY_AFTER)
+            self._batches[batch['id']] = batch
+        threading.Thread(target=self._feed, args=(batch,), name=f"batch-{batch['id'][:8]}", daemon=True).start()
+        print(f"[Batch] Created batch {batch['id']} with {len(urls)} URLs at {quality}")
+        return batch
+
+    def _feed(self, batch):
+        active = []
+        for item in batch['items']:
+            # A job handed to the postprocessing pool no longer holds a download slot
+            while len(active) >= self.concurrency:
+                self.jobs.wait_until(lambda: any(job['state'] not in ('queued', 'running') for job in active), 15)
+                active = [job for job in active if job['state'] in ('queued', 'running')]
+            # Shares the download_video key, so an item already being downloaded elsewhere joins that job
+            item['job'] = self.jobs.submit('batch_item', run_download_video, item['url'], batch['format_id'],
+                                           key=('download_video', item['video_id'] or item['url'], batch['format_id']),
+                                           files=job_files(item['url'], batch['format_id']))
+            active.append(item['job'])
+
+    def get(self, batch_id):
+        with self._lock:
+            return self._batches.get(batch_id)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for batch_id in [b['id'] for b in self._batches.values()
+                         if b['created_at'] < cutoff and self.is_done(b)]:
+            del self._batches[batch_id]
+
+    @staticmethod
+    def item_state(item):
+        return item['job']['state'] if item['job'] else 'pending'
+
+    def is_done(self, batch):
+        return all(self.item_state(item) in ('finished', 'failed') for item in batch['items'])
+
+    def finished_artifacts(self, batch):
+        """Stored artifacts for the items that have finished so far"""
+        artifacts = []
+        for item in batch['items']:
+            job = item['job']
+            if job and job['state'] == 'finished' and job['result'].get('filename'):
+                artifact = DOWNLOAD_STORE.get_by_filename(job['result']['filename'])
+                if artifact:
+                    artifacts.append(artifact)
+        return artifacts
+
+def batch_summary(batch):
+    """Public view of a batch with per-item status"""
+    counts = {}
+    items = []
+    for item in batch['items']:
+        state = BatchManager.item_state(item)
+        counts[state] = counts.get(state, 0) + 1
+        entry = {'url': item['url'], 'video_id': item['video_id'], 'state': state}
+        job = item['job']
+        if job:
+            entry['job_id'] = job['id']
+            if job['progress']:
+                entry['progress'] = job['progress']
+            if job['finished_at']:
+                result = job['result'] or {}
+                if job['state'] == 'finished':
+                    entry.update(filename=result.get('filename'), title=result.get('title'),
+                                 filesize=result.get('filesize'))
+                else:
+                    entry['error'] = result.get('error')
+        items.append(entry)
+    return {
+        'batch_id': batch['id'],
+        'quality': batch['quality'],
+        'status_url': f"/batch/{batch['id']}",
+        'zip_url': f"/batch/{batch['id']}/zip",
+        'created_at': datetime.fromtimestamp(batch['created_at']).isoformat(),
+        'total': len(items),
+        'counts': counts,
+        'done': BATCH_MANAGER.is_done(batch),
+        'items': items
+    }
+
+BATCH_MANAGER = BatchManager(JOB_MANAGER, BATCH_CONCURRENCY, JOB_RETENTION, BATCH_MAX_OPEN)
+
+METRICS.register(CallbackGauge(
+    'ytdl_jobs', 'Known download jobs by state', ('state',),
+    lambda: {(state,): count for state, count in JOB_MANAGER.stats()['jobs'].items()}))
+METRICS.register(CallbackGauge(
+    'ytdl_postprocess_queue', 'Jobs waiting for or running on the postprocessing pool', ('state',),
+    lambda: {(state,): JOB_MANAGER.stats()['postprocess'][state] for state in ('queued', 'running')}))
+METRICS.register(CallbackGauge(
+    'ytdl_extractions_in_flight', 'get_video_info extractions currently running', (),
+    lambda: {(): INFO_FLIGHTS.stats()['in_flight']}))
+METRICS.register(CallbackGauge(
+    'ytdl_metadata_cache', 'Metadata cache counters', ('stat',),
+    lambda: {(k,): v for k, v in METADATA_CACHE.stats().items() if k in ('entries', 'bytes', 'hits', 'misses', 'evictions')}))
+
+class Rejected(Exception):
+    """A request turned away by admission control; retry_after is in whole seconds"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class EndpointGate:
+    """Concurrency limit for one endpoint with a bounded wait queue and a queueing-time budget.
+
+    Newcomers queue behind anyone already waiting, and waiters are woken one
+    per freed slot. Release times over the last DRAIN_WINDOW seconds give the
+    drain rate used to tell rejected clients when to come back.
+    """
+
+    DRAIN_WINDOW = 60  # seconds
+    MAX_RETRY_AFTER = 300  # seconds
+
+    def __init__(self, name, limit, max_queue, max_wait):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self._released = deque(maxlen=1024)  # monotonic release times
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Take a slot, waiting up to max_wait; raises Rejected when the queue is full or the wait runs out"""
+        started = time.monotonic()
+        with self._cond:
+            if self.active >= self.limit or self.waiting:
+                if self.waiting >= self.max_queue:
+                    raise Rejected('queue_full', self._retry_after())
+                self.waiting += 1
+                try:
+                    admitted = self._cond.wait_for(lambda: self.active < self.limit, self.max_wait)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    raise Rejected('queue_timeout', self._retry_after())
+            self.active += 1
+            self.admitted += 1
+        ADMISSION_WAIT_SECONDS.observe(time.monotonic() - started, endpoint=self.name)
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._released.append(time.monotonic())
+            self._cond.notify()
+
+    def drain_rate(self):
+        """Slots freed per second over the recent window (0.0 if none were)"""
+        with self._cond:
+            return self._drain_rate()
+
+    def _drain_rate(self):
+        now = time.monotonic()
+        recent = [t for t in self._released if now - t <= self.DRAIN_WINDOW]
+        return len(recent) / max(now - recent[0], 1.0) if recent else 0.0
+
+    def _retry_after(self):
+        # Called with the lock held: time for the queue ahead of the client to drain
+        rate = self._drain_rate()
+        if not rate:
+            return max(1, math.ceil(self.max_wait))
+        return max(1, min(self.MAX_RETRY_AFTER, math.ceil((self.waiting + 1) / rate)))
+
+    def stats(self):
+        return {'limit': self.limit, 'active': self.active, 'waiting': self.waiting, 'max_queue': self.max_queue,
+                'admitted': self.admitted, 'drain_rate': round(self.drain_rate(), 3)}
+
+class ClientBuckets:
+    """Per-client token buckets (rate tokens per second, up to burst), keeping the most recent clients"""
+
+    def __init__(self, rate, burst, max_clients=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()  # client -> (tokens, monotonic time of last update)
+        self._lock = threading.Lock()
+
+    def take(self, client):
+        """Spend one token; returns 0 if allowed, otherwise seconds until the next token"""
+        if self.rate <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / self.rate
+            self._buckets[client] = (tokens - 1 if not wait else tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def refund(self, client):
+        """Give back the token spent by a request that was turned away for another reason"""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            if client in self._buckets:
+                tokens, updated = self._buckets[client]
+                self._buckets[client] = (min(self.burst, tokens + 1), updated)
+
+class AdmissionTicket:
+    """A held endpoint slot; release() is idempotent.
+
+    held is set when a job or a streamed response body takes the slot over,
+    so request teardown leaves it to them to release.
+    """
+
+    def __init__(self, gate):
+        self.gate = gate
+        self.held = False
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self.gate.release()
+
+class AdmissionController:
+    """Per-endpoint gates plus per-client rate limits for the heavy endpoints.
+
+    Synchronous endpoints hold their slot for the request; job endpoints pass
+    it to the job they queue (hold_for_job) so the limit covers queued and
+    running downloads, not just the few milliseconds it takes to submit one.
+    """
+
+    def __init__(self, limits, max_queue, max_wait, client_rate, client_burst):
+        self.gates = {name: EndpointGate(name, limit, max_queue, max_wait) for name, limit in limits.items()}
+        self.clients = ClientBuckets(client_rate, client_burst)
+        self._job_tickets = {}  # job ID -> ticket released when the job finishes
+        self._lock = threading.Lock()
+
+    def admit(self, endpoint, client):
+        """Admit a request or raise Rejected; returns a ticket (None for endpoints without a gate)"""
+        gate = self.gates.get(endpoint)
+        if gate is None:
+            return None
+        wait = self.clients.take(client)
+        if wait:
+            raise Rejected('client_rate', max(1, math.ceil(wait)))
+        try:
+            gate.acquire()
+        except Rejected:
+            self.clients.refund(client)
+            raise
+        return AdmissionTicket(gate)
+
+    def hold_for_job(self, ticket, job):
+        """Keep ticket's slot until job finishes; a request coalesced onto an existing job keeps none"""
+        with self._lock:
+            if job['id'] in self._job_tickets:
+                return
+            self._job_tickets[job['id']] = ticket
+            ticket.held = True
+        if job['finished_at']:
+            self.job_finished(job)
+
+    def job_finished(self, job):
+        with self._lock:
+            ticket = self._job_tickets.pop(job['id'], None)
+        if ticket is not None:
+            ticket.release()
+
+    def stats(self):
+        return {name: gate.stats() for name, gate in self.gates.items()}
+
+ADMISSION = AdmissionController(ADMISSION_LIMITS, ADMISSION_QUEUE, ADMISSION_MAX_WAIT, CLIENT_RATE, CLIENT_BURST)
+JOB_MANAGER.add_finish_listener(ADMISSION.job_finished)
+
+ADMISSION_WAIT_SECONDS = METRICS.register(Histogram(
+    'ytdl_admission_wait_seconds', 'Time admitted requests spent queued for a slot, by endpoint', ('endpoint',),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)))
+ADMISSION_REJECTIONS = METRICS.register(Counter(
+    'ytdl_admission_rejections_total', 'Requests turned away with 429, by endpoint and reason',
+    ('endpoint', 'reason')))
+METRICS.register(CallbackGauge(
+    'ytdl_admission_slots', 'Admission slots per endpoint: limit, active and waiting', ('endpoint', 'state'),
+    lambda: {(name, state): stats[state] for name, stats in ADMISSION.stats().items()
+             for state in ('limit', 'active', 'waiting')}))
+METRICS.register(CallbackGauge(
+    'ytdl_admission_drain_rate', 'Slots freed per second over the last minute, by endpoint', ('endpoint',),
+    lambda: {(name,): stats['drain_rate'] for name, stats in ADMISSION.stats().items()}))
+
+@app.before_request
+def start_background_services():
+    """Start per-process background threads on the first request this worker serves"""
+    if STARTUP['first_request_seconds'] is None:
+        STARTUP['first_request_seconds'] = round(time.perf_counter() - _IMPORT_STARTED, 3)
+        print(f"[Startup] First request {STARTUP['first_request_seconds']}s after import began")
+    DOWNLOAD_JANITOR.start()
+    SESSION_STATE.start()
+    JOB_MANAGER.start_resume_watcher()
+
+def warm_up():
+    """Load yt-dlp and its YouTube extractor, read session state and start background threads.
+
+    Everything here otherwise happens lazily on the first request; call it
+    after a worker forks (see gunicorn.conf.py) to move that cost off the
+    first user's request.
+    """
+    started = time.perf_counter()
+    yt_dlp.load()
+    with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True}) as ydl:
+        ydl.get_info_extractor('Youtube')
+    SESSION_STATE.snapshot()
+    DOWNLOAD_JANITOR.start()
+    SESSION_STATE.start()
+    JOB_MANAGER.start_resume_watcher()
+    STARTUP['warm_up_seconds'] = round(time.perf_counter() - started, 3)
+    print(f"[Startup] Warm-up finished in {STARTUP['warm_up_seconds']}s")
+
+# Routes whose response bodies are media; their bytes count towards ytdl_bytes_served_total
+MEDIA_ENDPOINTS = ('download_file', 'stream_video', 'batch_zip')
+
+def _route_label():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_started = time.time()
+    HTTP_REQUESTS_IN_FLIGHT.inc(route=_route_label())
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('metrics_started')
+    if started is not None:
+        # For streamed bodies this is the time to the first byte, not to the last
+        HTTP_REQUEST_SECONDS.observe(time.time() - started, route=_route_label(),
+                                     method=request.method, status=response.status_code)
+    if request.endpoint in MEDIA_ENDPOINTS and response.status_code in (200, 206) and request.method != 'HEAD':
+        if response.is_streamed and not response.direct_passthrough:
+            response.response = _count_served(response.response, request.endpoint)
+        elif response.content_length:
+            BYTES_SERVED.inc(response.content_length, route=request.endpoint)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    if g.get('metrics_started') is not None:
+        HTTP_REQUESTS_IN_FLIGHT.dec(route=_route_label())
+
+def _count_served(chunks, route):
+    try:
+        for chunk in chunks:
+            BYTES_SERVED.inc(len(chunk), route=route)
+            yield chunk
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+def client_address():
+    """Client IP for per-client limits, skipping the X-Forwarded-For hops added by TRUSTED_PROXIES"""
+    hops = [hop.strip() for hop in request.headers.get('X-Forwarded-For', '').split(',') if hop.strip()]
+    chain = hops + [request.remote_addr or 'unknown']
+    return chain[max(0, len(chain) - 1 - TRUSTED_PROXIES)]
+
+@app.before_request
+def admit_request():
+    """Apply admission control to the heavy endpoints; turned-away requests get a fast 429"""
+    if request.endpoint not in ADMISSION.gates:
+        return None
+    try:
+        g.admission = ADMISSION.admit(request.endpoint, client_address())
+    except Rejected as e:
+        return rejection_response(e)
+    return None
+
+def rejection_response(e, error='Server busy, please retry later'):
+    """429 with Retry-After for a Rejected raised while handling the current request"""
+    ADMISSION_REJECTIONS.inc(endpoint=request.endpoint, reason=e.reason)
+    print(f"[Admission] Rejected {request.endpoint} for {client_address()}: {e.reason}, retry in {e.retry_after}s")
+    response = jsonify({'error': error, 'reason': e.reason, 'retry_after': e.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+@app.teardown_request
+def release_admission(error=None):
+    ticket = g.get('admission')
+    if ticket is not None and not ticket.held:
+        ticket.release()
+
+def hold_admission_for(job):
+    """Let job keep this request's admission slot until it finishes"""
+    ticket = g.get('admission')
+    if ticket is not None:
+        ADMISSION.hold_for_job(ticket, job)
+
+def hold_admission_until_closed(response):
+    """Keep this request's admission slot until the streamed response body is closed"""
+    ticket = g.get('admission')
+    if ticket is not None:
+        ticket.held = True
+        response.call_on_close(ticket.release)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text-format metrics for this worker process"""
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/')
+def index():
+    return render_template('index.html')
+
+class StrategyRunner:
+    """Runs alternative strategies until one succeeds and records how long each took.
+
+    In sequential mode each strategy starts only after the previous one has
+    failed. In hedged mode the next strategy also starts once the running
+    ones have gone hedge_delay seconds without an answer; the first success
+    wins and the rest are cancelled (or, if already running, abandoned and
+    their results discarded). Each strategy is called with a threading.Event
+    that is set once the race is decided, and should stop at its next check
+    so abandoned work doesn't keep holding a pool thread.
+    """
+
+    def __init__(self, mode, hedge_delay, max_workers=8):
+        self.mode = mode
+        self.hedge_delay = hedge_delay
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='strategy')
+            return self._executor
+
+    def run(self, strategies):
+        """Run [(name, callable(cancel))] and return (winner name or None, result, attempts)"""
+        if self.mode == 'hedged':
+            winner, result, attempts = self._run_hedged(strategies)
+        else:
+            winner, result, attempts = self._run_sequential(strategies)
+        for attempt in attempts:
+            if attempt['status'] != 'not_started':
+                observe_strategy(attempt['strategy'], attempt['status'], attempt['seconds'],
+                                 attempt.get('error_type', ''))
+        return winner, result, attempts
+
+    def _run_sequential(self, strategies):
+        attempts = []
+        cancel = threading.Event()  # never set: one strategy runs at a time
+        for name, attempt in strategies:
+            started = time.time()
+            try:
+                result = attempt(cancel)
+            except Exception as e:
+                attempts.append(self._attempt(name, 'failed', started, e))
+                continue
+            attempts.append(self._attempt(name, 'success', started))
+            return name, result, attempts
+        return None, None, attempts
+
+    def _run_hedged(self, strategies):
+        executor = self._get_executor()
+        remaining = list(strategies)
+        pending = {}  # future -> (name, started)
+        attempts = []
+        cancel = threading.Event()
+        last_launch = 0.0
+        while remaining or pending:
+            # Launch the next strategy when nothing is running or the hedge delay has passed
+            if remaining and (not pending or time.time() - last_launch >= self.hedge_delay):
+                name, attempt = remaining.pop(0)
+                last_launch = time.time()
+                pending[executor.submit(attempt, cancel)] = (name, last_launch)
+                if len(pending) > 1:
+                    print(f"[Strategy] Hedging with {name}")
+            timeout = max(0.0, last_launch + self.hedge_delay - time.time()) if remaining else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, started = pending.pop(future)
+                error = future.exception()
+                if error is not None:
+                    attempts.append(self._attempt(name, 'failed', started, error))
+                    # A failure frees the slot immediately rather than waiting out the delay
+                    last_launch = 0.0
+                    continue
+                attempts.append(self._attempt(name, 'success', started))
+                cancel.set()  # running losers stop at their next check
+                for other, (other_name, other_started) in pending.items():
+                    status = 'cancelled' if other.cancel() else 'abandoned'
+                    attempts.append(self._attempt(other_name, status, other_started))
+                for other_name, _ in remaining:
+                    attempts.append({'strategy': other_name, 'status': 'not_started', 'seconds': 0.0})
+                return name, future.result(), attempts
+        return None, None, attempts
+
+    @staticmethod
+    def _attempt(name, status, started, error=None):
+        attempt = {'strategy': name, 'status': status, 'seconds': round(time.time() - started, 3)}
+        if error is not None:
+            attempt['error'] = str(error)
+            attempt['error_type'] = type(error).__name__
+        return attempt
+
+STRATEGY_RUNNER = StrategyRunner(EXTRACTION_MODE, HEDGE_DELAY)
+
+def extraction_strategies(sessions):
+    """Ordered (name, description, ydl_opts) for the get_video_info extraction methods"""
+    return [
+        # Method 1: Local-like approach (replicates exact local behavior)
+        ('Method 1', 'Local browser simulation', {
+            'quiet': False,  # Show output like local
+            'no_warnings': False,  # Show warnings like local
+            'extract_flat': False,
+            # Use exact same settings that work locally
+            'nocheckcertificate': False,  # Don't skip certs like local
+            'no_check_certificate': False,
+            'ignoreerrors': False,
+            'extractor_retries': 1,  # Minimal retries like local
+            'retries': 1,
+            'fragment_retries': 1,
+            'http_chunk_size': 1048576,  # Small chunks like local
+            'sleep_interval': 0,  # No artificial delays like local
+            'max_sleep_interval': 0,
+            # Use the exact user agent that works locally
+            'user_agent': sessions['user_agent'],
+            # Use realistic headers that work locally
+            'http_headers': get_realistic_headers(sessions),
+            # Don't use aggressive bypass - use normal approach like local
+            'cookiefile': None,
+            'cookiesfrombrowser': None,
+            # Use normal extractor settings like local
+            'extractor_args': {
+                'youtube': {
+                    'skip': ['storyboard', 'image'],  # Only skip obvious non-video
+                    'player_client': ['web'],  # Use web client like local
+                    'player_skip': [],  # Don't skip anything like local
+                }
             },
-            'debug_info': {
-                'url': url,
-                'video_id': extract_video_id(url),
-                'timestamp': datetime.now().isoformat()
-            }
-        }), 500
+            # Use normal format selection like local
+            'format': 'best[ext=mp4]/best',
+        }),
+        # Method 2: Fallback to local browser cookies approach
+        ('Method 2', 'Browser cookies simulation', {
+            'quiet': False,
+            'no_warnings': False,
+            'extract_flat': False,
+            # Use browser-like settings
+            'nocheckcertificate': False,
+            'no_check_certificate': False,
+            'ignoreerrors': False,
+            'extractor_retries': 1,
+            'retries': 1,
+            'fragment_retries': 1,
+            'http_chunk_size': 1048576,
+            'sleep_interval': 0,
+            'max_sleep_interval': 0,
+            # Use consistent user agent
+            'user_agent': sessions['user_agent'],
+            # Use realistic headers
+            'http_headers': get_realistic_headers(sessions),
+            # Try to use browser cookies (like local)
+            'cookiesfrombrowser': ('chrome', 'firefox', 'safari'),
+            'cookiefile': None,
+            # Normal extractor settings
+            'extractor_args': {
+                'youtube': {
+                    'skip': ['storyboard', 'image'],
+                    'player_client': ['web'],
+                    'player_skip': [],
+                }
+            },
+            'format': 'best[ext=mp4]/best',
+        }),
+        # Method 3: Minimal local approach (like when local fails)
+        ('Method 3', 'Minimal local approach', {
+            'quiet': False,
+            'no_warnings': False,
+            'extract_flat': False,
+            # Minimal settings like local
+            'nocheckcertificate': False,
+            'no_check_certificate': False,
+            'ignoreerrors': False,
+            'extractor_retries': 1,
+            'retries': 1,
+            'fragment_retries': 1,
+            'http_chunk_size': 1048576,
+            'sleep_interval': 0,
+            'max_sleep_interval': 0,
+            # Keep same user agent
+            'user_agent': sessions['user_agent'],
+            # Minimal headers
+            'http_headers': {
+                'User-Agent': sessions['user_agent'],
+                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+                'Accept-Language': 'en-US,en;q=0.9',
+                'Referer': 'https://www.youtube.com/',
+            },
+            'cookiefile': None,
+            'cookiesfrombrowser': None,
+            # Very basic format
+            'format': 'best',
+        }),
+    ]
+
+def stop_when_cancelled(ydl, cancel):
+    """Make each HTTP request ydl makes check cancel first, so an abandoned extraction ends early"""
+    urlopen = ydl.urlopen
+
+    def checked_urlopen(req):
+        if cancel.is_set():
+            raise yt_dlp.utils.DownloadCancelled('Another strategy already answered')
+        return urlopen(req)
+
+    ydl.urlopen = checked_urlopen
+    return ydl
+
+def attempt_extraction(url, name, description, ydl_opts, cancel):
+    """Run one extraction strategy, giving up at the next request once cancel is set; returns the info dict or raises"""
+    print(f"[LOCAL MODE] {name}: {description}...")
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = stop_when_cancelled(ydl, cancel).extract_info(url, download=False)
+        if not info or not info.get('title'):
+            raise ValueError('Extractor returned no title')
+        print(f"[LOCAL MODE] {name} successful: {info.get('title')}")
+        return info
+    except Exception as e:
+        print(f"[LOCAL MODE] {name} failed: {str(e)}")
+        print(f"[LOCAL MODE] Error type: {type(e).__name__}")
+        raise
+
+@app.route('/get_video_info', methods=['POST'])
+def get_video_info():
+    """Extract video information from YouTube URL using local-like behavior"""
+    try:
+        data = request.get_json()
+        url = data.get('url', '').strip()
+        
+        if not url or not is_valid_youtube_url(url):
+            return jsonify({'error': 'Please provide a valid YouTube URL'}), 400
+
+        # Serve repeat lookups from the metadata cache without touching YouTube
+        video_id = extract_video_id(url)
+        entry = METADATA_CACHE.get(video_id) if video_id else None
+        if entry:
+            print(f"[Cache] Metadata hit for {video_id}")
+            response = jsonify(entry['payload'])
+            response.headers['X-Cache'] = 'HIT'
+            return response
+
+        # Concurrent lookups of the same video share a single extraction
+        (body, status), coalesced = INFO_FLIGHTS.do(video_id or url, lambda: extract_video_info(url))
+        response = jsonify(body)
+        response.status_code = status
+        response.headers['X-Cache'] = 'COALESCED' if coalesced else 'MISS'
+        return response
         
     except Exception as e:
         print(f"Error in get_video_info: {str(e)}")
         return jsonify({'error': f'Error extracting video info: {str(e)}'}), 500
 
-def _process_video_info(info, url):
-    """Process extracted video info and return formatted response"""
+def extract_video_info(url):
+    """Run the extraction strategies for url; returns (response body, status code)"""
+    # Use local-like session (same as what works locally)
+    sessions = create_local_like_session()
+    print(f"[LOCAL MODE] Using session ID: {sessions['session_id']}")
+    print(f"[LOCAL MODE] User Agent: {sessions['user_agent']}")
+    print(f"[LOCAL MODE] Request count: {sessions['request_count']}")
+    
+    # Try Method 1/2/3 in order, or hedged (see EXTRACTION_MODE)
+    strategies = [
+        (name, lambda cancel, name=name, description=description, ydl_opts=ydl_opts:
+            attempt_extraction(url, name, description, ydl_opts, cancel))
+        for name, description, ydl_opts in extraction_strategies(sessions)
+    ]
+    winner, info, attempts = STRATEGY_RUNNER.run(strategies)
+    extraction = {
+        'mode': STRATEGY_RUNNER.mode,
+        'winner': winner,
+        'attempts': attempts
+    }
+    
+    if winner:
+        # Update session with successful request
+        SESSION_STATE.record_success(url)
+        return _process_video_info(info, url, extraction)
+    
+    # All local methods failed - this is unusual
+    print(f"[LOCAL MODE] All local simulation methods failed for URL: {url}")
+    print(f"[LOCAL MODE] This suggests YouTube may have updated their system")
+    
+    # Update session with failure
+    SESSION_STATE.record_failure(attempts[-1].get('error') if attempts else None)
+    sessions = SESSION_STATE.snapshot()
+    
+    return {
+        'error': 'Local simulation methods failed. This is unusual and may indicate YouTube has updated their system.',
+        'suggestion': 'Try again in a few minutes or check if YouTube is experiencing issues',
+        'session_info': {
+            'session_id': sessions['session_id'],
+            'user_agent': sessions['user_agent'],
+            'successful_requests': sessions.get('successful_requests', 0),
+            'failed_requests': sessions.get('failed_requests', 0),
+            'total_requests': sessions['request_count']
+        },
+        'debug_info': {
+            'url': url,
+            'video_id': extract_video_id(url),
+            'timestamp': datetime.now().isoformat()
+        },
+        'extraction': extraction
+    }, 500
+
+def _process_video_info(info, url, extraction=None):
+    """Process extracted video info and return (response body, status code)"""
     try:
-        # Get available formats and filter for actual video formats
-        formats = []
-        for f in info.get('formats', []):
-            # Include all video formats (both with and without audio)
-            if (f.get('height') and f.get('ext') and 
-                f.get('vcodec') and f.get('vcodec') != 'none' and
-                f.get('height') >= 144 and  # Minimum reasonable video height
-                f.get('protocol') != 'mhtml' and  # Skip MHTML formats
-                not f.get('ext') in ['html', 'htm', 'mhtml'] and
-                f.get('ext') in ['mp4', 'webm', 'mkv', 'avi', 'mov']):  # Only video formats
-                
-                # Check if this is video-only (no audio)
-                is_video_only = f.get('acodec') == 'none' or not f.get('acodec')
-                
-                formats.append({
-                    'format_id': f.get('format_id', ''),
-                    'height': f.get('height', 0),
-                    'ext': f.get('ext', ''),
-                    'filesize': f.get('filesize', 0),
-                    'format_note': f.get('format_note', ''),
-                    'vcodec': f.get('vcodec', ''),
-                    'acodec': f.get('acodec', ''),
-                    'fps': f.get('fps', 0),
-                    'tbr': f.get('tbr', 0),  # Total bitrate
-                    'protocol': f.get('protocol', ''),
-                    'is_video_only': is_video_only
-                })
-        
-        # If no video formats found, try to get best available
-        if not formats:
-            # Look for any format with video
-            for f in info.get('formats', []):
-                if (f.get('height') and f.get('vcodec') and 
-                    f.get('vcodec') != 'none' and f.get('height') >= 144 and
-                    f.get('protocol') != 'mhtml'):
-                    formats.append({
-                        'format_id': f.get('format_id', ''),
-                        'height': f.get('height', 0),
-                        'ext': f.get('ext', 'mp4'),
-                        'filesize': f.get('filesize', 0),
-                        'format_note': f.get('format_note', 'Video format'),
-                        'vcodec': f.get('vcodec', ''),
-                        'acodec': f.get('acodec', ''),
-                        'fps': f.get('fps', 0),
-                        'tbr': f.get('tbr', 0),
-                        'protocol': f.get('protocol', '')
-                    })
+        entry = cache_video_info(url, info)
+        payload = entry['payload']
+        if extraction:
+            # Per-request detail; not part of the cached payload
+            payload = dict(payload, extraction=extraction)
+        return payload, 200
         
-        # Sort formats by height (quality) and then by bitrate
-        formats.sort(key=lambda x: (x['height'], x.get('tbr', 0)), reverse=True)
-        
-        # Remove duplicates based on height, but keep the best quality for each height
-        unique_formats = []
-        seen_heights = set()
-        for f in formats:
-            if f['height'] not in seen_heights:
-                seen_heights.add(f['height'])
-                unique_formats.append(f)
-        
-        # Ensure we have at least one format - use yt-dlp's best format
-        if not unique_formats:
-            unique_formats = [{
-                'format_id': 'best[ext=mp4]/best',  # Prefer MP4, fallback to best
-                'height': 720,
-                'ext': 'mp4',
-                'filesize': 0,
-                'format_note': 'Best available quality (auto-selected)',
-                'vcodec': 'unknown',
-                'acodec': 'unknown',
-                'fps': 0,
-                'tbr': 0,
-                'protocol': 'unknown'
-            }]
-        
-        print(f"Found {len(unique_formats)} video formats")
-        for f in unique_formats:
-            print(f"  - {f['height']}p {f['ext']} ({f['format_id']})")
+    except Exception as e:
+        print(f"Error processing video info: {str(e)}")
+        return {'error': f'Error processing video info: {str(e)}'}, 500
+
+def _build_video_payload(info, url, formats):
+    """Build the trimmed /get_video_info response body from an info dict and its FormatIndex"""
+    # Best video format per height, ranked by height and then bitrate
+    unique_formats = [{
+        'format_id': f['format_id'],
+        'height': f['height'],
+        'ext': f['ext'],
+        'filesize': f['filesize'] or 0,
+        'format_note': f['format_note'],
+        'vcodec': f['vcodec'],
+        'acodec': f['acodec'],
+        'fps': f['fps'],
+        'tbr': f['tbr'],  # Total bitrate
+        'protocol': f['protocol'],
+        'is_video_only': not f['has_audio']
+    } for f in formats.ranked('offered')]
+    
+    # Ensure we have at least one format - use yt-dlp's best format
+    if not unique_formats:
+        unique_formats = [{
+            'format_id': 'best[ext=mp4]/best',  # Prefer MP4, fallback to best
+            'height': 720,
+            'ext': 'mp4',
+            'filesize': 0,
+            'format_note': 'Best available quality (auto-selected)',
+            'vcodec': 'unknown',
+            'acodec': 'unknown',
+            'fps': 0,
+            'tbr': 0,
+            'protocol': 'unknown'
+        }]
+    
+    print(f"Found {len(unique_formats)} video formats")
+    for f in unique_formats:
+        print(f"  - {f['height']}p {f['ext']} ({f['format_id']})")
+    
+    # Audio-only streams for the audio mode, best bitrate first, with the container each copies into
+    audio_formats = [{
+        'format_id': f['format_id'],
+        'ext': f['ext'],
+        'abr': f['abr'],
+        'acodec': f['acodec'],
+        'filesize': f['filesize'] or 0,
+        'format_note': f['format_note'],
+        'container': audio_container_for(f['audio_codec']) or 'm4a'
+    } for f in formats.ranked('audio_only')]
+    
+    video_id = extract_video_id(url)
+    return {
+        'title': info.get('title', 'Unknown Title'),
+        'duration': info.get('duration', 0),
+        # Served resized and cacheable by /thumb; the original stays available for reference
+        'thumbnail': f"/thumb/{video_id}" if video_id else info.get('thumbnail', ''),
+        'thumbnail_source': info.get('thumbnail', ''),
+        'formats': unique_formats,
+        'audio_formats': audio_formats,
+        'video_id': video_id
+    }
+
+class ThumbnailCache:
+    """On-disk LRU of fetched thumbnails and their resized variants, bounded by bytes.
+
+    Each video's original image is fetched once and kept as <video_id>.src;
+    every (width, format) variant is rendered from it with ffmpeg on first
+    request. The least recently served files are deleted once the folder
+    grows past max_bytes. Concurrent misses for the same file share one
+    fetch or render.
+    """
+
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._files = None  # filename -> [size, etag or None], least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._flights = SingleFlight('thumbnail')
+        self._webp = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _index(self):
+        # Called with the lock held; the folder is scanned on first use
+        if self._files is None:
+            os.makedirs(self.folder, exist_ok=True)
+            entries = sorted((e for e in os.scandir(self.folder) if e.is_file() and '.tmp.' not in e.name),
+                             key=lambda e: e.stat().st_mtime)
+            self._files = OrderedDict((e.name, [e.stat().st_size, None]) for e in entries)
+            self._bytes = sum(size for size, _ in self._files.values())
+        return self._files
+
+    def supports_webp(self):
+        """Whether the local ffmpeg can encode WebP (checked once)"""
+        if self._webp is None:
+            try:
+                encoders = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'], capture_output=True,
+                                          text=True, timeout=10).stdout
+            except (OSError, subprocess.SubprocessError):
+                encoders = ''
+            self._webp = 'libwebp' in encoders
+        return self._webp
+
+    def get(self, video_id, width, fmt, source_url):
+        """Return (path, etag) of a variant, fetching and rendering it on a miss"""
+        name = f"{video_id}_{width}.{fmt}"
+        with self._lock:
+            item = self._index().get(name)
+            if item is not None:
+                self._files.move_to_end(name)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if item is None:
+            self._flights.do(name, lambda: self._render(video_id, width, fmt, source_url, name))
+            with self._lock:
+                item = self._files.get(name)
+            if item is None:
+                raise FileNotFoundError(f"Thumbnail {name} was evicted before it could be served")
+        path = os.path.join(self.folder, name)
+        if item[1] is None:
+            item[1] = file_sha256(path)[:32]
+        return path, item[1]
+
+    def _render(self, video_id, width, fmt, source_url, name):
+        source_name = f"{video_id}.src"
+        source = os.path.join(self.folder, source_name)
+        with self._lock:
+            have_source = source_name in self._index() and os.path.exists(source)
+        if not have_source:
+            self._flights.do(source_name, lambda: self._fetch(source_url, source_name))
+        path = os.path.join(self.folder, name)
+        tmp = f"{path}.tmp.{fmt}"  # keeps the extension ffmpeg picks the encoder by
+        cmd = ['ffmpeg', '-y', '-loglevel', 'error', '-i', source, '-frames:v', '1',
+               '-vf', f"scale='min({width},iw)':-2"]
+        cmd += ['-c:v', 'libwebp', '-quality', '80'] if fmt == 'webp' else ['-q:v', '4']
+        try:
+            subprocess.run(cmd + [tmp], check=True, capture_output=True, timeout=30)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self._add(name)
+
+    def _fetch(self, source_url, source_name):
+        print(f"[Thumb] Fetching {source_url}")
+        response = requests.get(source_url, timeout=15, headers={'User-Agent': DEFAULT_USER_AGENTS[0]})
+        response.raise_for_status()
+        with open(os.path.join(self.folder, source_name), 'wb') as f:
+            f.write(response.content)
+        self._add(source_name)
+
+    def _add(self, name):
+        size = os.path.getsize(os.path.join(self.folder, name))
+        with self._lock:
+            files = self._index()
+            if name in files:
+                self._bytes -= files.pop(name)[0]
+            files[name] = [size, None]
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(files) > 1:
+                oldest, (oldest_size, _) = next(iter(files.items()))
+                if oldest == name:
+                    break
+                del files[oldest]
+                self._bytes -= oldest_size
+                self.evictions += 1
+                try:
+                    os.remove(os.path.join(self.folder, oldest))
+                except FileNotFoundError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            files = self._index()
+            return {'files': len(files), 'bytes': self._bytes, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+THUMBNAILS = ThumbnailCache(THUMB_FOLDER, THUMB_CACHE_BYTES)
+
+def thumbnail_source(video_id):
+    """Original thumbnail URL for a video: from cached metadata, else YouTube's standard location"""
+    entry = METADATA_CACHE.get(video_id)
+    url = entry['info'].get('thumbnail') if entry else None
+    return url or f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg"
+
+@app.route('/thumb/<video_id>')
+def thumbnail(video_id):
+    """Serve a resized, cacheable thumbnail (?w= width; WebP if the client accepts it, else JPEG)"""
+    try:
+        if not re.fullmatch(r'[\w-]{11}', video_id):
+            return jsonify({'error': 'Invalid video ID'}), 404
+        requested = request.args.get('w', THUMB_WIDTHS[0], type=int)
+        width = min(THUMB_WIDTHS, key=lambda w: abs(w - requested))
+        wanted = request.args.get('format') or ('webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpg')
+        fmt = 'webp' if wanted == 'webp' and THUMBNAILS.supports_webp() else 'jpg'
         
-        return jsonify({
-            'title': info.get('title', 'Unknown Title'),
-            'duration': info.get('duration', 0),
-            'thumbnail': info.get('thumbnail', ''),
-            'formats': unique_formats,
-            'video_id': extract_video_id(url)
-        })
+        path, etag = THUMBNAILS.get(video_id, width, fmt, thumbnail_source(video_id))
+        # send_file resolves relative paths against the app's root, not the working directory
+        response = send_file(os.path.abspath(path), mimetype='image/webp' if fmt == 'webp' else 'image/jpeg',
+                             conditional=True, etag=etag, max_age=THUMB_MAX_AGE)
+        if not request.args.get('format'):
+            response.vary.add('Accept')  # the format depends on Accept
+        return response
         
+    except requests.RequestException as e:
+        print(f"Error fetching thumbnail for {video_id}: {str(e)}")
+        return jsonify({'error': f'Could not fetch thumbnail: {str(e)}'}), 502
     except Exception as e:
-        print(f"Error processing video info: {str(e)}")
-        return jsonify({'error': f'Error processing video info: {str(e)}'}), 500
+        print(f"Error serving thumbnail for {video_id}: {str(e)}")
+        return jsonify({'error': f'Error serving thumbnail: {str(e)}'}), 500
 
 @app.route('/download_video', methods=['POST'])
 def download_video():
+    """Queue a download job for the selected format and return its job ID immediately.
+
+    With "mode": "audio" only an audio stream is fetched ("format_id" is an
+    audio format or "bestaudio", and a video format gets a 400; optional
+    "container" is "m4a" or "opus").
+    """
     try:
         data = request.get_json()
         url = data.get('url', '').strip()
-        format_id = data.get('format_id', 'best')
-        print(f"[Backend] Received format_id: {format_id}")  # Debug log
+        mode = data.get('mode', 'video')
+        format_id = data.get('format_id') or ('bestaudio' if mode == 'audio' else 'best')
+        print(f"[Backend] Received format_id: {format_id} ({mode})")  # Debug log
         
         if not url:
             return jsonify({'error': 'Please provide a YouTube URL'}), 400
@@ -504,13 +3241,58 @@ def download_video():
         if not is_valid_youtube_url(url):
             return jsonify({'error': 'Please provide a valid YouTube URL'}), 400
         
+        if mode == 'audio':
+            container = data.get('container')
+            if container is not None and container not in AUDIO_CONTAINERS:
+                return jsonify({'error': f"Audio container must be one of: {', '.join(AUDIO_CONTAINERS)}"}), 400
+            # Reject video format IDs up front when the formats are already cached (the job checks otherwise)
+            video_id = extract_video_id(url)
+            entry = METADATA_CACHE.get(video_id) if video_id else None
+            if entry:
+                formats = FormatIndex(entry['formats'])
+                try:
+                    plan_audio(formats, format_id, container)
+                except ValueError as e:
+                    return jsonify({'error': str(e),
+                                    'audio_formats': [f['format_id'] for f in formats.ranked('audio_only')]}), 400
+            job = JOB_MANAGER.submit('download_audio', run_download_audio, url, format_id, container,
+                                     key=('download_audio', extract_video_id(url) or url, format_id, container),
+                                     files=job_files(url, format_id))
+            hold_admission_for(job)
+            return jsonify(job_summary(job)), 202
+        
+        # Identical requests while a download is in flight share its job
+        job = JOB_MANAGER.submit('download_video', run_download_video, url, format_id,
+                                 key=('download_video', extract_video_id(url) or url, format_id),
+                                 files=job_files(url, format_id))
+        hold_admission_for(job)
+        return jsonify(job_summary(job)), 202
+        
+    except Exception as e:
+        print(f"Error in download_video: {str(e)}")  # Debug print
+        return jsonify({'error': f'Error downloading video: {str(e)}'}), 500
+
+def run_download_video(url, format_id):
+    """Download job body for /download_video; returns (response body, status code)"""
+    try:
+        # A finished copy of this exact video/format/container is served as-is
+        video_id = extract_video_id(url)
+        artifact = DOWNLOAD_STORE.lookup(video_id, format_id, 'mp4') if video_id else None
+        if artifact:
+            print(f"[Store] Reusing {artifact['filename']} for {video_id} {format_id}")
+            return artifact_response(artifact, selected_quality=artifact['quality'] or 'Unknown',
+                                     expected_size='Unknown', extractor_calls=0, cached=True), 200
+        
         # Configure yt-dlp options for download using local-like behavior
         sessions = create_local_like_session()
         print(f"[LOCAL MODE] Download using session ID: {sessions['session_id']}")
         
         ydl_opts = {
             'format': f'{format_id}+bestaudio/best',  # Use selected format + best audio
-            'outtmpl': os.path.join(UPLOAD_FOLDER, '%(title)s_%(format_id)s.mp4'),  # Output as MP4
+            # Named by video ID so odd titles can't collide or break download_file; the planned
+            # merge/remux/convert step makes the final file .mp4
+            'outtmpl': os.path.join(UPLOAD_FOLDER, DownloadStore.filename_for('%(id)s', format_id, '%(ext)s')),
+            'updatetime': False,  # mtime is the download time, not upstream Last-Modified (janitor ages)
             'quiet': False,  # Show output like local
             'no_warnings': False,  # Show warnings like local
             'merge_output_format': 'mp4',  # Force MP4 output
@@ -525,116 +3307,312 @@ def download_video():
             'http_headers': get_realistic_headers(sessions),
             'retries': 1,  # Minimal retries like local
             'fragment_retries': 1,
-            'http_chunk_size': 1048576,  # Small chunks like local
             'sleep_interval': 0,  # No artificial delays like local
             'max_sleep_interval': 0,
             # Better format handling
             'prefer_ffmpeg': True,  # Use FFmpeg for better merging
-            'postprocessors': [{
-                'key': 'FFmpegVideoConvertor',
-                'preferedformat': 'mp4',  # Ensure proper MP4 output
-            }],
+            # Formats, merge container and postprocessors come from plan_postprocessing()
+            # Live progress for /jobs/<id>/events
+            **job_progress_opts(),
         }
         
+        # Parallel fragments and adaptive chunk size
+        meter = tune_download(ydl_opts)
+        
         print(f"[Download] Using format_id: {format_id}")
-        print(f"[Download] Full format string: {format_id}+bestaudio/best")
+        
+        # Extract at most once per request; the same info dict drives the download
+        pipeline_stats = {'extractor_calls': 0}
         
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            # First, extract info to validate the format
-            info = ydl.extract_info(url, download=False)
-            print(f"Video title: {info.get('title', 'Unknown')}")
-            print(f"Available formats: {len(info.get('formats', []))}")
+            # First, get info to validate the format (served from the metadata cache after an analyze)
+            with phase_span('extract'):
+                cached_info, formats = get_cached_formats(url, ydl, pipeline_stats)
+            print(f"Video title: {cached_info.get('title', 'Unknown')}")
+            print(f"Available formats: {len(cached_info.get('formats', []))}")
             
-            # Download the video with the selected format
-            info = ydl.extract_info(url, download=True)
-            filename = ydl.prepare_filename(info)
+            # Stream-copy a compatible audio/video pair when one exists; transcode only when none does
+            plan = plan_postprocessing(formats, format_id, 'mp4')
+            postprocess = {k: v for k, v in plan.items() if k != 'ydl_opts'}
+            print(f"[Download] Postprocessing plan: {postprocess}")
+            print(f"[Download] Planned format string: {plan['ydl_opts'].get('format', ydl_opts['format'])}")
             
-            print(f"[Download] Expected filename: {filename}")
-            print(f"[Download] Selected format_id: {format_id}")
+            # A different format_id (e.g. VP9 248 swapped for 137) may already have produced these streams
+            stored_format = artifact_format(plan)
+            artifact = DOWNLOAD_STORE.lookup(video_id, stored_format, plan['container']) if video_id and stored_format != format_id else None
+            if artifact:
+                print(f"[Store] Reusing {artifact['filename']} for {video_id} {format_id} (stored as {stored_format})")
+                return artifact_response(artifact, selected_quality=artifact['quality'] or 'Unknown',
+                                         expected_size='Unknown', extractor_calls=pipeline_stats['extractor_calls'],
+                                         postprocess=postprocess, cached=True), 200
             
-            # Verify the downloaded format matches what was requested
-            downloaded_info = ydl.extract_info(url, download=False)
-            selected_format = None
-            for f in downloaded_info.get('formats', []):
-                if f.get('format_id') == format_id:
-                    selected_format = f
-                    break
+            if plan['mode'] in ('remux', 'transcode') and current_job() is not None:
+                # Fetch the raw streams on this network worker and queue the ffmpeg work for the
+                # postprocessing pool, so this worker can move straight on to the next download
+                stream_opts = dict(ydl_opts, format=','.join(stream_formats(plan)), postprocessors=[],
+                                   outtmpl=os.path.join(UPLOAD_FOLDER, DownloadStore.filename_for(
+                                       '%(id)s', format_id, 'f%(format_id)s.%(ext)s')))
+                stream_opts, resume = resumable_download_opts(stream_opts, video_id, format_id)
+                with timed_strategy('download'), yt_dlp.YoutubeDL(stream_opts) as download_ydl:
+                    info, _ = download_from_info(download_ydl, cached_info)
+                report_resume(resume)
+                streams = [d['filepath'] for d in info.get('requested_downloads') or [] if d.get('filepath')]
+                # Leased until the postprocess stage is done with them, including their wait in its queue
+                for path in streams:
+                    FILE_LEASES.acquire(os.path.basename(path))
+                return Handoff(postprocess_download_video, url, format_id, video_id, cached_info, formats,
+                               info, streams, plan, pipeline_stats, meter)
             
-            if selected_format:
-                print(f"[Download] Selected format details: {selected_format.get('height')}p, {selected_format.get('ext')}, {selected_format.get('format_note', '')}")
-                print(f"[Download] Selected format bitrate: {selected_format.get('tbr', 'Unknown')} kbps")
-                print(f"[Download] Selected format filesize: {selected_format.get('filesize', 'Unknown')} bytes")
-            else:
-                print(f"[Download] WARNING: Could not find format_id {format_id} in available formats")
+            # Download the video with the planned formats (yt-dlp merges/converts inline)
+            download_opts, resume = resumable_download_opts(dict(ydl_opts, **plan['ydl_opts']), video_id, format_id)
+            with timed_strategy('download'), yt_dlp.YoutubeDL(download_opts) as download_ydl:
+                info, filename = download_from_info(download_ydl, cached_info)
+            report_resume(resume)
             
-            # Check if the downloaded file is actually a video
-            if os.path.exists(filename):
-                file_size = os.path.getsize(filename)
-                file_ext = os.path.splitext(filename)[1].lower()
-                
-                print(f"Downloaded file: {filename}, size: {file_size}, ext: {file_ext}")
-                print(f"[Download] File size comparison: Downloaded={file_size}, Expected={selected_format.get('filesize', 'Unknown') if selected_format else 'Unknown'}")
-                
-                # Check for invalid file types
-                invalid_extensions = ['.mhtml', '.html', '.htm', '.jpg', '.png', '.webp', '.gif']
-                if file_ext in invalid_extensions:
-                    os.remove(filename)
-                    return jsonify({'error': f'Downloaded file is {file_ext.upper()}, not a video. Please try a different quality option.'}), 500
-                
-                # If file is too small, it might be invalid
-                if file_size < 1000000:  # Less than 1MB
-                    os.remove(filename)
-                    return jsonify({'error': 'Downloaded file is too small to be a valid video. Please try a different quality option.'}), 500
-                
-                # Check if file size is much smaller than expected (quality issue)
-                if selected_format and selected_format.get('filesize'):
-                    expected_size = selected_format.get('filesize')
-                    size_ratio = file_size / expected_size
-                    print(f"[Download] Size ratio: Downloaded/Expected = {size_ratio:.2f}")
-                    if size_ratio < 0.5:  # If downloaded file is less than 50% of expected size
-                        print(f"[Download] WARNING: Downloaded file is much smaller than expected - quality may be compromised")
-                
-                return jsonify({
-                    'success': True,
-                    'filename': os.path.basename(filename),
-                    'filepath': filename,
-                    'title': info.get('title', 'Unknown Title'),
-                    'filesize': file_size,
-                    'selected_quality': f"{selected_format.get('height', 'Unknown')}p" if selected_format else 'Unknown',
-                    'expected_size': selected_format.get('filesize', 'Unknown') if selected_format else 'Unknown'
-                })
-            else:
-                # Try fallback download with simpler format
-                print(f"[Download] First attempt failed, trying fallback download...")
-                fallback_opts = {
-                    'format': 'best[ext=mp4]/best',  # Simpler format selection
-                    'outtmpl': os.path.join(UPLOAD_FOLDER, '%(title)s_fallback.mp4'),
-                    'quiet': False,
-                    'verbose': True,
-                }
+            return finish_download_video(url, format_id, video_id, cached_info, formats, info, filename,
+                                         postprocess, pipeline_stats, meter)
                 
-                with yt_dlp.YoutubeDL(fallback_opts) as fallback_ydl:
-                    fallback_info = fallback_ydl.extract_info(url, download=True)
-                    fallback_filename = fallback_ydl.prepare_filename(fallback_info)
-                    
-                    if os.path.exists(fallback_filename):
-                        file_size = os.path.getsize(fallback_filename)
-                        print(f"[Download] Fallback successful: {fallback_filename}, size: {file_size}")
-                        return jsonify({
-                            'success': True,
-                            'filename': os.path.basename(fallback_filename),
-                            'filepath': fallback_filename,
-                            'title': info.get('title', 'Unknown Title'),
-                            'filesize': file_size,
-                            'selected_quality': 'Fallback quality (best available)',
-                            'expected_size': 'Unknown'
-                        })
-                    else:
-                        return jsonify({'error': 'Both download attempts failed'}), 500
+    except Exception as e:
+        print(f"Error in download_video: {str(e)}")  # Debug print
+        return {'error': f'Error downloading video: {str(e)}'}, 500
+
+
+JOB_MANAGER.register_resumable(run_download_video)
+
+def run_download_audio(url, format_id, container=None):
+    """Download job body for audio mode: fetch just the audio stream; returns (response body, status code)"""
+    try:
+        # A finished copy in the requested (or any audio) container is served as-is
+        video_id = extract_video_id(url)
+        for candidate in ([container] if container else AUDIO_CONTAINERS):
+            artifact = DOWNLOAD_STORE.lookup(video_id, format_id, candidate) if video_id else None
+            if artifact:
+                print(f"[Store] Reusing {artifact['filename']} for {video_id} {format_id}")
+                return artifact_response(artifact, selected_quality=artifact['quality'] or 'Unknown',
+                                         expected_size='Unknown', extractor_calls=0, cached=True), 200
+        
+        sessions = create_local_like_session()
+        ydl_opts = {
+            'outtmpl': os.path.join(UPLOAD_FOLDER, DownloadStore.filename_for('%(id)s', format_id, '%(ext)s')),
+            'updatetime': False,
+            'quiet': False,
+            'no_warnings': False,
+            'user_agent': sessions['user_agent'],
+            'http_headers': get_realistic_headers(sessions),
+            'retries': 1,
+            'fragment_retries': 1,
+            # Format and postprocessors come from plan_audio()
+            **job_progress_opts(),
+        }
+        meter = tune_download(ydl_opts)
+        pipeline_stats = {'extractor_calls': 0}
+        
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with phase_span('extract'):
+                cached_info, formats = get_cached_formats(url, ydl, pipeline_stats)
+            
+            # Stream-copy into m4a/opus unless a container was asked for that no audio stream fits
+            try:
+                plan = plan_audio(formats, format_id, container)
+            except ValueError as e:
+                return {'error': str(e)}, 400
+            postprocess = {k: v for k, v in plan.items() if k != 'ydl_opts'}
+            print(f"[Download] Audio plan: {postprocess}")
+            
+            download_opts, resume = resumable_download_opts(dict(ydl_opts, **plan['ydl_opts']), video_id, format_id)
+            with timed_strategy('download_audio'), yt_dlp.YoutubeDL(download_opts) as download_ydl:
+                info, filename = download_from_info(download_ydl, cached_info)
+            report_resume(resume)
+        
+        with phase_span('validate'):
+            if not filename or not os.path.exists(filename):
+                return {'error': 'Audio download failed - file not found'}, 500
+            if os.path.getsize(filename) < 10000:
+                os.remove(filename)
+                return {'error': 'Downloaded audio file is too small to be valid. Please try another format.'}, 500
+        
+        selected_quality = f"{round(plan['abr'])}kbps {plan['container']}" if plan.get('abr') else plan['container']
+        with phase_span('store'):
+            artifact = DOWNLOAD_STORE.record(info.get('id') or video_id, format_id,
+                                             os.path.splitext(filename)[1].lstrip('.'), filename,
+                                             info.get('title', 'Unknown Title'), selected_quality)
+        audio = formats.get(plan.get('audio_format'))
+        return artifact_response(
+            artifact,
+            selected_quality=selected_quality,
+            expected_size=(audio['filesize'] or 'Unknown') if audio else 'Unknown',
+            extractor_calls=pipeline_stats['extractor_calls'],
+            transfer=meter.stats(),
+            postprocess=postprocess,
+            cached=False
+        ), 200
+        
+    except Exception as e:
+        print(f"Error in download_audio: {str(e)}")
+        return {'error': f'Error downloading audio: {str(e)}'}, 500
+
+JOB_MANAGER.register_resumable(run_download_audio)
+
+def stream_formats(plan):
+    """format_ids to download as separate streams for a remux/transcode plan, video first"""
+    return [plan['video_format']] + ([plan['audio_format']] if plan.get('audio_format') else [])
+
+def artifact_format(plan):
+    """format_id a planned download is stored under: the streams actually fetched (e.g. '137+140'),
+    so requests the planner maps onto the same streams share one file. 'auto' plans keep the selector."""
+    return plan['requested_format'] if plan['mode'] == 'auto' else '+'.join(stream_formats(plan))
+
+def postprocess_download_video(url, format_id, video_id, cached_info, formats, info, streams, plan,
+                               pipeline_stats, meter):
+    """Postprocessing stage of a /download_video job: mux or transcode the fetched streams into MP4.
+
+    The streams arrive leased by run_download_video; the leases are released here.
+    """
+    try:
+        try:
+            filename = os.path.join(UPLOAD_FOLDER, DownloadStore.filename_for(video_id or info.get('id'), format_id, 'mp4'))
+            phase = 'merge' if plan['mode'] == 'remux' else 'convert'
+            JOB_MANAGER.publish_progress(current_job(), {'phase': phase, 'status': 'started', 'mode': plan['mode']})
+            with phase_span(phase, mode=plan['mode']):
+                run_ffmpeg_postprocess(streams, filename, plan)
+        finally:
+            for path in streams:
+                FILE_LEASES.release(os.path.basename(path))
+                if os.path.exists(path):
+                    os.remove(path)
+        
+        postprocess = {k: v for k, v in plan.items() if k != 'ydl_opts'}
+        return finish_download_video(url, format_id, video_id, cached_info, formats, info, filename,
+                                     postprocess, pipeline_stats, meter)
+        
+    except Exception as e:
+        print(f"Error in download_video postprocessing: {str(e)}")
+        return {'error': f'Error processing video: {str(e)}'}, 500
+
+def run_ffmpeg_postprocess(streams, output, plan):
+    """Stream-copy (or, where the plan needs it, re-encode) the downloaded streams into output"""
+    codecs = CONTAINER_CODECS[plan['container']]
+    cmd = ['ffmpeg', '-y', '-loglevel', 'error']
+    for path in streams:
+        cmd += ['-i', path]
+    if len(streams) == 2:
+        cmd += ['-map', '0:v:0', '-map', '1:a:0']
+    # Only the stream that is incompatible with the container is re-encoded
+    cmd += ['-c:v', 'copy'] if plan.get('video_codec') in codecs['video'] else ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '20']
+    cmd += ['-c:a', 'copy'] if plan.get('audio_codec') in codecs['audio'] else ['-c:a', 'aac', '-b:a', '192k']
+    cmd.append(output)
+    print(f"[Postprocess] {plan['mode']}: {' '.join(cmd)}")
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        if os.path.exists(output):
+            os.remove(output)
+        raise RuntimeError(f"ffmpeg {plan['mode']} failed: {result.stderr.strip()[-500:]}")
+
+def finish_download_video(url, format_id, video_id, cached_info, formats, info, filename, postprocess,
+                          pipeline_stats, meter):
+    """Validate and store a finished /download_video file (or try the fallback download)"""
+    try:
+        print(f"[Download] Expected filename: {filename}")
+        print(f"[Download] Selected format_id: {format_id}")
+        print(f"[Download] Extractor calls: {pipeline_stats['extractor_calls']}")
+        
+        # Verify the downloaded format matches what was requested (or what the planner swapped it for)
+        selected_format = formats.get(postprocess.get('video_format') or format_id)
+        
+        if selected_format:
+            print(f"[Download] Selected format details: {selected_format.get('height')}p, {selected_format.get('ext')}, {selected_format.get('format_note', '')}")
+            print(f"[Download] Selected format bitrate: {selected_format.get('tbr', 'Unknown')} kbps")
+            print(f"[Download] Selected format filesize: {selected_format.get('filesize', 'Unknown')} bytes")
+        else:
+            print(f"[Download] WARNING: Could not find format_id {format_id} in available formats")
+        
+        # Check if the downloaded file is actually a video
+        timer = current_timer()
+        if timer:
+            timer.start('validate')
+        if os.path.exists(filename):
+            file_size = os.path.getsize(filename)
+            file_ext = os.path.splitext(filename)[1].lower()
+            
+            print(f"Downloaded file: {filename}, size: {file_size}, ext: {file_ext}")
+            print(f"[Download] File size comparison: Downloaded={file_size}, Expected={selected_format.get('filesize', 'Unknown') if selected_format else 'Unknown'}")
+            
+            # Check for invalid file types
+            invalid_extensions = ['.mhtml', '.html', '.htm', '.jpg', '.png', '.webp', '.gif']
+            if file_ext in invalid_extensions:
+                os.remove(filename)
+                return {'error': f'Downloaded file is {file_ext.upper()}, not a video. Please try a different quality option.'}, 500
+            
+            # If file is too small, it might be invalid
+            if file_size < 1000000:  # Less than 1MB
+                os.remove(filename)
+                return {'error': 'Downloaded file is too small to be a valid video. Please try a different quality option.'}, 500
+            
+            # Check if file size is much smaller than expected (quality issue)
+            if selected_format and selected_format.get('filesize'):
+                expected_size = selected_format.get('filesize')
+                size_ratio = file_size / expected_size
+                print(f"[Download] Size ratio: Downloaded/Expected = {size_ratio:.2f}")
+                if size_ratio < 0.5:  # If downloaded file is less than 50% of expected size
+                    print(f"[Download] WARNING: Downloaded file is much smaller than expected - quality may be compromised")
+            
+            if timer:
+                timer.stop('validate')
+            
+            selected_quality = f"{selected_format.get('height', 'Unknown')}p" if selected_format else 'Unknown'
+            # Keyed by the streams fetched and the container yt-dlp actually produced
+            with phase_span('store'):
+                artifact = DOWNLOAD_STORE.record(info.get('id') or video_id, artifact_format(postprocess),
+                                                 file_ext.lstrip('.') or 'mp4', filename,
+                                                 info.get('title', 'Unknown Title'), selected_quality,
+                                                 requested=(format_id, postprocess['container']))
+            return artifact_response(
+                artifact,
+                selected_quality=selected_quality,
+                expected_size=selected_format.get('filesize', 'Unknown') if selected_format else 'Unknown',
+                extractor_calls=pipeline_stats['extractor_calls'],
+                transfer=meter.stats(),
+                postprocess=postprocess,
+                cached=False
+            ), 200
+        else:
+            if timer:
+                timer.stop('validate')
+            # Try fallback download with simpler format
+            print(f"[Download] First attempt failed, trying fallback download...")
+            fallback_opts = {
+                'format': 'best[ext=mp4]/best',  # Simpler format selection
+                'outtmpl': os.path.join(UPLOAD_FOLDER, DownloadStore.filename_for('%(id)s', 'fallback', 'mp4')),
+                'updatetime': False,
+                'quiet': False,
+                'verbose': True,
+                **job_progress_opts(),
+            }
+            fallback_meter = tune_download(fallback_opts)
+            
+            with yt_dlp.YoutubeDL(fallback_opts) as fallback_ydl:
+                with timed_strategy('fallback download'):
+                    fallback_info, fallback_filename = download_from_info(fallback_ydl, cached_info)
                 
+                if os.path.exists(fallback_filename):
+                    file_size = os.path.getsize(fallback_filename)
+                    print(f"[Download] Fallback successful: {fallback_filename}, size: {file_size}")
+                    artifact = DOWNLOAD_STORE.record(info.get('id') or video_id, 'fallback', 'mp4', fallback_filename,
+                                                     info.get('title', 'Unknown Title'), 'Fallback quality (best available)')
+                    return artifact_response(
+                        artifact,
+                        selected_quality='Fallback quality (best available)',
+                        expected_size='Unknown',
+                        extractor_calls=pipeline_stats['extractor_calls'],
+                        transfer=fallback_meter.stats(),
+                        cached=False
+                    ), 200
+                else:
+                    return {'error': 'Both download attempts failed'}, 500
+    
     except Exception as e:
         print(f"Error in download_video: {str(e)}")  # Debug print
-        return jsonify({'error': f'Error downloading video: {str(e)}'}), 500
+        return {'error': f'Error downloading video: {str(e)}'}, 500
 
 @app.route('/download_1080p', methods=['POST'])
 def download_1080p():
@@ -649,10 +3627,32 @@ def download_1080p():
         if not is_valid_youtube_url(url):
             return jsonify({'error': 'Please provide a valid YouTube URL'}), 400
         
+        job = JOB_MANAGER.submit('download_1080p', run_download_1080p, url,
+                                 key=('download_1080p', extract_video_id(url) or url), files=job_files(url, '1080p'))
+        hold_admission_for(job)
+        return jsonify(job_summary(job)), 202
+        
+    except Exception as e:
+        print(f"Error in download_1080p: {str(e)}")
+        return jsonify({'error': f'Error downloading 1080p video: {str(e)}'}), 500
+
+def run_download_1080p(url):
+    """Download job body for /download_1080p; returns (response body, status code)"""
+    try:
+        # Reuse a finished 1080p download of this video if one is stored
+        video_id = extract_video_id(url)
+        for container in ('mp4', 'webm', 'mkv'):
+            artifact = DOWNLOAD_STORE.lookup(video_id, '1080p', container) if video_id else None
+            if artifact:
+                print(f"[Store] Reusing {artifact['filename']} for {video_id} 1080p")
+                return artifact_response(artifact, quality=artifact['quality'] or 'Best available',
+                                         extractor_calls=0, cached=True), 200
+        
         # Configure yt-dlp options specifically for 1080p
         ydl_opts = {
             'format': 'best[height<=1080][ext=mp4]/best[height<=1080]/best[ext=mp4]/best',
-            'outtmpl': os.path.join(UPLOAD_FOLDER, '%(title)s_1080p.%(ext)s'),
+            'outtmpl': os.path.join(UPLOAD_FOLDER, DownloadStore.filename_for('%(id)s', '1080p', '%(ext)s')),
+            'updatetime': False,
             'quiet': True,
             'no_warnings': True,
             'merge_output_format': 'mp4',
@@ -663,25 +3663,33 @@ def download_1080p():
             'ignoreerrors': False,
             'format_sort': ['res:1080', 'res:720', 'res:480'],
             'format_sort_force': True,
+            **job_progress_opts(),
         }
+        meter = tune_download(ydl_opts)
         
         print(f"Downloading 1080p version of: {url}")  # Debug print
         
+        # Extract at most once per request; the same info dict drives the download
+        pipeline_stats = {'extractor_calls': 0}
+        
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            # First, extract info to validate the format
-            info = ydl.extract_info(url, download=False)
-            print(f"Video title: {info.get('title', 'Unknown')}")
+            # First, get info to validate the format (served from the metadata cache after an analyze)
+            with phase_span('extract'):
+                cached_info, formats = get_cached_formats(url, ydl, pipeline_stats)
+            print(f"Video title: {cached_info.get('title', 'Unknown')}")
             
             # Check if 1080p is available
-            formats = info.get('formats', [])
-            has_1080p = any(f.get('height') == 1080 for f in formats)
+            has_1080p = formats.has_height(1080)
             print(f"1080p available: {has_1080p}")
             
-            # Download the video
-            info = ydl.extract_info(url, download=True)
-            filename = ydl.prepare_filename(info)
+            # Download the video from the same info dict instead of extracting again
+            with timed_strategy('download_1080p'):
+                info, filename = download_from_info(ydl, cached_info)
             
             # Check if the downloaded file is actually a video
+            timer = current_timer()
+            if timer:
+                timer.start('validate')
             if os.path.exists(filename):
                 file_size = os.path.getsize(filename)
                 file_ext = os.path.splitext(filename)[1].lower()
@@ -692,45 +3700,511 @@ def download_1080p():
                 invalid_extensions = ['.mhtml', '.html', '.htm', '.jpg', '.png', '.webp', '.gif']
                 if file_ext in invalid_extensions:
                     os.remove(filename)
-                    return jsonify({'error': f'Downloaded file is {file_ext.upper()}, not a video.'}), 500
+                    return {'error': f'Downloaded file is {file_ext.upper()}, not a video.'}, 500
                 
                 # If file is too small, it might be invalid
                 if file_size < 1000000:  # Less than 1MB
                     os.remove(filename)
-                    return jsonify({'error': 'Downloaded file is too small to be a valid video.'}), 500
+                    return {'error': 'Downloaded file is too small to be a valid video.'}, 500
                 
-                return jsonify({
-                    'success': True,
-                    'filename': os.path.basename(filename),
-                    'filepath': filename,
-                    'title': info.get('title', 'Unknown Title'),
-                    'filesize': file_size,
-                    'quality': '1080p' if has_1080p else 'Best available'
-                })
+                if timer:
+                    timer.stop('validate')
+                
+                quality = '1080p' if has_1080p else 'Best available'
+                with phase_span('store'):
+                    artifact = DOWNLOAD_STORE.record(info.get('id') or video_id, '1080p', file_ext.lstrip('.'), filename,
+                                                     info.get('title', 'Unknown Title'), quality)
+                return artifact_response(artifact, quality=quality, extractor_calls=pipeline_stats['extractor_calls'],
+                                         transfer=meter.stats(), cached=False), 200
             else:
-                return jsonify({'error': 'Download failed - file not found'}), 500
+                return {'error': 'Download failed - file not found'}, 500
                 
     except Exception as e:
         print(f"Error in download_1080p: {str(e)}")
-        return jsonify({'error': f'Error downloading 1080p video: {str(e)}'}), 500
+        return {'error': f'Error downloading 1080p video: {str(e)}'}, 500
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Report the state of a download job and its result once finished"""
+    job = JOB_MANAGER.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_summary(job, debug_requested()))
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Stream a job's progress as Server-Sent Events until it finishes"""
+    first_job = JOB_MANAGER.get(job_id)
+    if not first_job:
+        return jsonify({'error': 'Job not found'}), 404
+
+    debug = debug_requested()
+
+    def sse(event, data):
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    def generate():
+        job = first_job
+        yield ': connected\n\n'
+        seq = -1
+        while True:
+            if job['seq'] != seq:
+                seq = job['seq']
+                if job['progress']:
+                    yield sse('progress', dict(job['progress'], state=job['state']))
+                if job['finished_at']:
+                    yield sse('done', job_summary(job, debug))
+                    return
+            else:
+                yield ': keep-alive\n\n'
+            job = JOB_MANAGER.wait_for_change(job, seq, 15)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # let nginx pass events through unbuffered
+    })
+
+@app.route('/jobs')
+def list_jobs():
+    """List known download jobs and pool usage"""
+    jobs = sorted(JOB_MANAGER.list(), key=lambda j: j['created_at'], reverse=True)
+    return jsonify({
+        'jobs': [job_summary(job) for job in jobs],
+        'pool': JOB_MANAGER.stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/batch', methods=['POST'])
+def create_batch():
+    """Queue a list of URLs for download at one quality and return the batch ID immediately"""
+    try:
+        data = request.get_json() or {}
+        urls = data.get('urls') or []
+        quality = data.get('quality', 'best')
+        
+        if isinstance(urls, str):
+            urls = urls.split()
+        urls = [u.strip() for u in urls if isinstance(u, str) and u.strip()]
+        
+        if not urls:
+            return jsonify({'error': 'Please provide a list of YouTube URLs'}), 400
+        
+        if len(urls) > BATCH_MAX_URLS:
+            return jsonify({'error': f'Too many URLs: a batch takes at most {BATCH_MAX_URLS}'}), 400
+        
+        if quality not in BATCH_QUALITIES:
+            return jsonify({'error': f"Unknown quality '{quality}'", 'qualities': list(BATCH_QUALITIES)}), 400
+        
+        invalid = [u for u in urls if not is_valid_youtube_url(u)]
+        if invalid:
+            return jsonify({'error': 'Some URLs are not valid YouTube URLs', 'invalid': invalid}), 400
+        
+        # Pasted lists often repeat a video; download each one once
+        unique = list(OrderedDict((extract_video_id(u) or u, u) for u in urls).values())
+        
+        try:
+            batch = BATCH_MANAGER.create(unique, quality, client_address())
+        except Rejected as e:
+            return rejection_response(e, f'Too many unfinished batches: at most {BATCH_MAX_OPEN} per client')
+        return jsonify(batch_summary(batch)), 202
+        
+    except Exception as e:
+        print(f"Error in create_batch: {str(e)}")
+        return jsonify({'error': f'Error creating batch: {str(e)}'}), 500
+
+@app.route('/batch/<batch_id>')
+def batch_status(batch_id):
+    """Per-item status of a batch; poll until done is true"""
+    batch = BATCH_MANAGER.get(batch_id)
+    if not batch:
+        return jsonify({'error': 'Batch not found'}), 404
+    return jsonify(batch_summary(batch))
+
+class ZipStreamWriter:
+    """Write-only file object that collects zipfile output so it can be yielded in pieces"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def unique_arcname(name, used):
+    base, ext = os.path.splitext(name)
+    candidate, n = name, 1
+    while candidate in used:
+        n += 1
+        candidate = f"{base} ({n}){ext}"
+    used.add(candidate)
+    return candidate
+
+@app.route('/batch/<batch_id>/zip')
+def batch_zip(batch_id):
+    """Stream the batch's finished files as a ZIP without building it in memory or on disk.
+
+    Videos are already compressed, so entries are stored rather than deflated.
+    While the batch is still running this returns 409 unless partial=1 is given.
+    """
+    batch = BATCH_MANAGER.get(batch_id)
+    if not batch:
+        return jsonify({'error': 'Batch not found'}), 404
+    if not BATCH_MANAGER.is_done(batch) and request.args.get('partial') != '1':
+        return jsonify({'error': 'Batch is still running', 'status_url': f"/batch/{batch_id}"}), 409
+    
+    artifacts = BATCH_MANAGER.finished_artifacts(batch)
+    if not artifacts:
+        return jsonify({'error': 'No finished downloads in this batch'}), 404
+    
+    filenames = [a['filename'] for a in artifacts]
+    for filename in filenames:
+        FILE_LEASES.acquire(filename)
+    
+    def generate():
+        out = ZipStreamWriter()
+        used = set()
+        # The writer has no tell()/seek(), so zipfile writes data descriptors after each entry
+        with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+            for artifact in artifacts:
+                path = os.path.join(UPLOAD_FOLDER, artifact['filename'])
+                if not os.path.exists(path):
+                    continue
+                arcname = unique_arcname(
+                    f"{safe_filename(artifact['title'], artifact['video_id'])}.{artifact['container']}", used)
+                zinfo = zipfile.ZipInfo.from_file(path, arcname)
+                zinfo.compress_type = zipfile.ZIP_STORED
+                with open(path, 'rb') as src, zf.open(zinfo, 'w', force_zip64=True) as dest:
+                    for block in iter(lambda: src.read(STREAM_CHUNK_SIZE), b''):
+                        dest.write(block)
+                        yield out.drain()
+                DOWNLOAD_STORE.touch(artifact['filename'])
+        yield out.drain()
+    
+    def release_leases():
+        for filename in filenames:
+            FILE_LEASES.release(filename)
+    
+    response = Response(generate(), mimetype='application/zip', headers={
+        'Content-Disposition': content_disposition(f"batch_{batch_id[:8]}.zip"),
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no'
+    })
+    # Closing the body runs this even when the generator never started (HEAD, client gone before
+    # the first byte), which a finally inside generate() would miss
+    response.call_on_close(release_leases)
+    return response
 
 @app.route('/download_file/<filename>')
 def download_file(filename):
+    """Serve a finished download with Range, ETag and Last-Modified support, or hand it to the proxy"""
     try:
         filepath = os.path.join(UPLOAD_FOLDER, filename)
         if os.path.exists(filepath):
-            return send_file(filepath, as_attachment=True)
+            # Stored files are named by video ID; offer the title-based name to the user
+            artifact = DOWNLOAD_STORE.get_by_filename(filename)
+            download_name = filename
+            if artifact and artifact['title']:
+                download_name = f"{safe_filename(artifact['title'], artifact['video_id'])}_{artifact['format_id']}.{artifact['container']}"
+            DOWNLOAD_STORE.touch(filename)
+            
+            # Let nginx serve the bytes and free this worker straight away
+            if FILE_OFFLOAD == 'x-accel':
+                response = Response(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+                response.headers['X-Accel-Redirect'] = X_ACCEL_PREFIX.rstrip('/') + '/' + quote(filename)
+                response.headers['Content-Disposition'] = content_disposition(download_name)
+                return response
+            
+            # The lease lasts until the server closes the file, so the janitor leaves it alone meanwhile
+            file = LeasedFile(filepath)
+            try:
+                stat = os.fstat(file.fileno())
+                response = send_file(file, as_attachment=True, download_name=download_name,
+                                     last_modified=stat.st_mtime,
+                                     etag=artifact['sha256'] if artifact else f"{stat.st_mtime}-{stat.st_size}")
+                response.content_length = stat.st_size
+                # Range requests get 206 and If-None-Match / If-Modified-Since get 304; the checksum
+                # gives a strong ETag for indexed files
+                return response.make_conditional(request.environ, accept_ranges=True, complete_length=stat.st_size)
+            except Exception:
+                file.close()
+                raise
         else:
             return jsonify({'error': 'File not found'}), 404
     except Exception as e:
         return jsonify({'error': f'Error serving file: {str(e)}'}), 500
 
+def safe_filename(name, default):
+    """Strip characters that are unsafe in a download filename"""
+    return re.sub(r'[\\/:*?"<>|\x00-\x1f]+', '_', name or '').strip() or default
+
+def content_disposition(download_name):
+    """Attachment Content-Disposition header value with an RFC 5987 fallback for non-ASCII names"""
+    try:
+        download_name.encode('ascii')
+        return f'attachment; filename="{download_name}"'
+    except UnicodeEncodeError:
+        ascii_name = download_name.encode('ascii', 'ignore').decode('ascii') or 'download'
+        return f'attachment; filename="{ascii_name}"; filename*=UTF-8\'\'{quote(download_name)}'
+
+class DownloadTuner:
+    """Chooses fragment concurrency and HTTP chunk size for downloads from measured throughput.
+
+    Throughput is an exponentially weighted average over finished streams,
+    so the chunk size grows (or shrinks) as downloads report their speed.
+    """
+
+    def __init__(self, concurrent_fragments, min_chunk, max_chunk, target_seconds):
+        self.concurrent_fragments = concurrent_fragments
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.target_seconds = target_seconds
+        self.throughput = None  # bytes per second
+        self.samples = 0
+        self._lock = threading.Lock()
+
+    def record(self, num_bytes, seconds):
+        if num_bytes <= 0 or seconds <= 0:
+            return
+        rate = num_bytes / seconds
+        with self._lock:
+            self.throughput = rate if self.throughput is None else 0.7 * self.throughput + 0.3 * rate
+            self.samples += 1
+
+    def chunk_size(self):
+        """Power-of-two chunk size covering about target_seconds at the measured throughput"""
+        with self._lock:
+            throughput = self.throughput
+        if throughput is None:
+            return self.min_chunk
+        size = self.min_chunk
+        while size * 2 <= throughput * self.target_seconds and size * 2 <= self.max_chunk:
+            size *= 2
+        return size
+
+    def stats(self):
+        return {
+            'concurrent_fragments': self.concurrent_fragments,
+            'chunk_size': self.chunk_size(),
+            'throughput_mb_per_s': round(self.throughput / 1e6, 2) if self.throughput else None,
+            'samples': self.samples
+        }
+
+DOWNLOAD_TUNER = DownloadTuner(CONCURRENT_FRAGMENTS, MIN_CHUNK_SIZE, MAX_CHUNK_SIZE, CHUNK_TARGET_SECONDS)
+
+class ThroughputMeter:
+    """Progress hook that measures one job's effective transfer rate and feeds the tuner"""
+
+    def __init__(self, tuner, chunk_size):
+        self.tuner = tuner
+        self.chunk_size = chunk_size
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def progress_hook(self, d):
+        # Files that were already on disk finish without an elapsed time
+        if d.get('status') != 'finished' or not d.get('elapsed'):
+            return
+        num_bytes = d.get('downloaded_bytes') or d.get('total_bytes') or 0
+        self.bytes += num_bytes
+        self.seconds += d['elapsed']
+        BYTES_DOWNLOADED.inc(num_bytes)
+        self.tuner.record(num_bytes, d['elapsed'])
+
+    def stats(self):
+        return {
+            'bytes': self.bytes,
+            'seconds': round(self.seconds, 2),
+            'mb_per_s': round(self.bytes / self.seconds / 1e6, 2) if self.seconds else None,
+            'chunk_size': self.chunk_size,
+            'concurrent_fragments': self.tuner.concurrent_fragments
+        }
+
+def tune_download(ydl_opts):
+    """Apply fragment concurrency and the adaptive chunk size to ydl_opts; returns the job's meter"""
+    meter = ThroughputMeter(DOWNLOAD_TUNER, DOWNLOAD_TUNER.chunk_size())
+    ydl_opts['concurrent_fragment_downloads'] = DOWNLOAD_TUNER.concurrent_fragments
+    ydl_opts['http_chunk_size'] = meter.chunk_size
+    ydl_opts['progress_hooks'] = list(ydl_opts.get('progress_hooks', [])) + [meter.progress_hook]
+    return meter
+
+# yt-dlp options persisted with a resumable job; hooks and session headers are rebuilt on resume
+RESUME_OPTS = ('format', 'outtmpl', 'merge_output_format', 'postprocessors', 'http_chunk_size',
+               'concurrent_fragment_downloads')
+
+class ResumeTracker:
+    """Progress hook that works out how much of a resumed download was already on disk"""
+
+    def __init__(self, partials):
+        self.partials = partials  # .part path -> size found before resuming
+        self.bytes_saved = 0
+        self._seen = set()
+
+    def progress_hook(self, d):
+        path = os.path.abspath(d.get('tmpfilename') or '')
+        if d.get('status') != 'downloading' or path in self._seen or path not in self.partials:
+            return
+        self._seen.add(path)
+        # yt-dlp counts a resumed prefix in downloaded_bytes; a restart from zero doesn't
+        if (d.get('downloaded_bytes') or 0) >= self.partials[path]:
+            self.bytes_saved += self.partials[path]
+
+def find_partials(video_id, format_id):
+    """Partial (.part) files left in UPLOAD_FOLDER for a video/format, with their sizes"""
+    prefix = DownloadStore.filename_for(video_id, format_id, '')
+    partials = {}
+    for entry in os.scandir(UPLOAD_FOLDER):
+        if entry.name.startswith(prefix) and entry.name.endswith('.part') and entry.is_file():
+            partials[os.path.abspath(entry.path)] = entry.stat().st_size
+    return partials
+
+def resumable_download_opts(ydl_opts, video_id, format_id):
+    """Persist the current job's download options, or restore them if the job is being resumed.
+
+    Returns (options to download with, ResumeTracker or None when not resuming).
+    """
+    job = current_job()
+    if job is None:
+        return ydl_opts, None
+    spec = job.get('resume')
+    if spec and spec.get('ydl_opts'):
+        ydl_opts = dict(ydl_opts, **spec['ydl_opts'])
+    else:
+        JOB_MANAGER.checkpoint(job, ydl_opts={name: ydl_opts[name] for name in RESUME_OPTS if name in ydl_opts},
+                               target=ydl_opts['outtmpl'])
+    ydl_opts['continuedl'] = True  # pick up .part files with range requests
+    if not spec:
+        return ydl_opts, None
+    tracker = ResumeTracker(find_partials(video_id, format_id))
+    ydl_opts['progress_hooks'] = list(ydl_opts.get('progress_hooks', [])) + [tracker.progress_hook]
+    return ydl_opts, tracker
+
+def report_resume(tracker):
+    """Record on the current job how many bytes resuming saved"""
+    job = current_job()
+    if tracker is None or job is None:
+        return
+    partial_bytes = sum(tracker.partials.values())
+    JOB_MANAGER.annotate(job, resume=dict(job['resume'], partial_bytes=partial_bytes,
+                                          bytes_saved=tracker.bytes_saved))
+    print(f"[Resume] Job {job['id']} reused {tracker.bytes_saved} of {partial_bytes} partial bytes")
+
+def is_progressive(fmt):
+    """True if a FormatIndex row carries both audio and video over plain HTTP, so it needs no merge"""
+    return bool(fmt and fmt['has_video'] and fmt['has_audio'] and fmt['protocol'] in ('http', 'https'))
+
+@app.route('/stream_video')
+def stream_video():
+    """Pipe a single-stream format straight from yt-dlp to the client.
+
+    Formats that need a merge are queued as a /download_video job instead: the
+    response is then a 202 with the job's status_url, and the finished file
+    is fetched from download_file.
+    """
+    try:
+        url = request.args.get('url', '').strip()
+        format_id = request.args.get('format_id', 'best')
+        
+        if not url or not is_valid_youtube_url(url):
+            return jsonify({'error': 'Please provide a valid YouTube URL'}), 400
+        
+        with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True}) as ydl:
+            info, formats = get_cached_formats(url, ydl)
+        
+        fmt = formats.get(format_id)
+        if format_id == 'best' and fmt is None:
+            fmt = formats.best('progressive')
+        
+        if not is_progressive(fmt):
+            print(f"[Stream] Format {format_id} needs a merge - using the file-based download")
+            return _stream_fallback(url, format_id)
+        
+        print(f"[Stream] Piping format {fmt['format_id']} for {info.get('id')}")
+        
+        # yt-dlp reads the already-extracted info instead of extracting again
+        with tempfile.NamedTemporaryFile('w', suffix='.info.json', delete=False) as f:
+            json.dump(info, f)
+            info_file = f.name
+        cmd = [
+            sys.executable, '-m', 'yt_dlp',
+            '--load-info-json', info_file,
+            '-f', fmt['format_id'],
+            '-o', '-',
+            '--quiet', '--no-warnings', '--no-part'
+        ]
+        # The pipe buffer bounds memory: when the client stops reading, yt-dlp blocks on write
+        # stderr goes to a file so a chatty yt-dlp can never fill a second pipe and stall
+        stderr_file = tempfile.TemporaryFile()
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file, bufsize=STREAM_CHUNK_SIZE)
+        
+        def cleanup():
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+            stderr_file.close()
+            try:
+                os.remove(info_file)
+            except OSError:
+                pass
+        
+        # Wait for the first bytes so a failed start can still fall back cleanly
+        first_chunk = proc.stdout.read(STREAM_CHUNK_SIZE)
+        if not first_chunk:
+            proc.wait()
+            stderr_file.seek(0)
+            error = stderr_file.read().decode(errors='replace').strip()
+            cleanup()
+            print(f"[Stream] yt-dlp produced no data ({error}) - using the file-based download")
+            return _stream_fallback(url, format_id)
+        
+        def generate():
+            try:
+                yield first_chunk
+                for chunk in iter(lambda: proc.stdout.read(STREAM_CHUNK_SIZE), b''):
+                    yield chunk
+            finally:
+                cleanup()
+        
+        ext = fmt.get('ext') or 'mp4'
+        safe_title = safe_filename(info.get('title'), info.get('id') or 'video')
+        # The pipe keeps running after the view returns, so the admission slot goes with the body
+        return hold_admission_until_closed(Response(
+            generate(), mimetype=mimetypes.guess_type(f'x.{ext}')[0] or 'application/octet-stream', headers={
+                'Content-Disposition': content_disposition(f"{safe_title}_{fmt['format_id']}.{ext}"),
+                'Cache-Control': 'no-store',
+                'X-Accel-Buffering': 'no'  # stream through nginx without spooling
+            }))
+        
+    except Exception as e:
+        print(f"Error in stream_video: {str(e)}")
+        return jsonify({'error': f'Error streaming video: {str(e)}'}), 500
+
+def _stream_fallback(url, format_id):
+    """Queue the file-based download exactly as /download_video does and return its job (202).
+
+    A finished file is then fetched from download_file; the job keeps this
+    request's admission slot until it completes.
+    """
+    job = JOB_MANAGER.submit('download_video', run_download_video, url, format_id,
+                             key=('download_video', extract_video_id(url) or url, format_id),
+                             files=job_files(url, format_id))
+    hold_admission_for(job)
+    return jsonify(job_summary(job)), 202
+
 @app.route('/cleanup/<filename>', methods=['DELETE'])
 def cleanup_file(filename):
     try:
         filepath = os.path.join(UPLOAD_FOLDER, filename)
         if os.path.exists(filepath):
             os.remove(filepath)
+            DOWNLOAD_STORE.forget(filename)
             return jsonify({'success': True})
         else:
             return jsonify({'error': 'File not found'}), 404
@@ -752,10 +4226,12 @@ def test_download():
         ydl_opts = {
             'format': format_id,
             'outtmpl': os.path.join(UPLOAD_FOLDER, 'test_%(title)s_%(format_id)s.mov'),
+            'updatetime': False,
             'merge_output_format': 'mov',
             'quiet': False,
             'no_warnings': False,
         }
+        meter = tune_download(ydl_opts)
         
         print(f"[Test Download] Using format_id: {format_id}")
         
@@ -769,7 +4245,8 @@ def test_download():
                     'success': True,
                     'filename': os.path.basename(filename),
                     'filesize': file_size,
-                    'format_id': format_id
+                    'format_id': format_id,
+                    'transfer': meter.stats()
                 })
             else:
                 return jsonify({'error': 'Test download failed'}), 500
@@ -798,14 +4275,10 @@ def test_format():
         }
         
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
+            info, formats = get_cached_formats(url, ydl)
             
             # Find the specific format
-            target_format = None
-            for f in info.get('formats', []):
-                if f.get('format_id') == format_id:
-                    target_format = f
-                    break
+            target_format = formats.get(format_id)
             
             if not target_format:
                 return jsonify({'error': f'Format {format_id} not found'})
@@ -819,9 +4292,11 @@ def test_format():
             test_ydl_opts = {
                 'format': format_id,
                 'outtmpl': os.path.join(UPLOAD_FOLDER, 'test_%(title)s_%(format_id)s.%(ext)s'),
+                'updatetime': False,
                 'quiet': False,
                 'verbose': True,
             }
+            meter = tune_download(test_ydl_opts)
             
             with yt_dlp.YoutubeDL(test_ydl_opts) as test_ydl:
                 test_info = test_ydl.extract_info(url, download=True)
@@ -839,7 +4314,8 @@ def test_format():
                             'bitrate': target_format.get('tbr'),
                             'expected_size': target_format.get('filesize'),
                             'codec': target_format.get('vcodec')
-                        }
+                        },
+                        'transfer': meter.stats()
                     })
                 else:
                     return jsonify({'error': 'Test download failed'})
@@ -864,27 +4340,15 @@ def debug_formats():
         }
         
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
+            info, formats = get_cached_formats(url, ydl)
             
-            all_formats = []
-            for f in info.get('formats', []):
-                all_formats.append({
-                    'format_id': f.get('format_id', ''),
-                    'height': f.get('height', 0),
-                    'ext': f.get('ext', ''),
-                    'filesize': f.get('filesize', 0),
-                    'format_note': f.get('format_note', ''),
-                    'vcodec': f.get('vcodec', ''),
-                    'acodec': f.get('acodec', ''),
-                    'protocol': f.get('protocol', ''),
-                    'url': f.get('url', '')[:100] + '...' if f.get('url') else '',
-                    'is_video_only': f.get('acodec') == 'none' or not f.get('acodec'),
-                    'tbr': f.get('tbr', 0),
-                    'fps': f.get('fps', 0)
-                })
+            # The index leaves out URLs (they expire); show a prefix of each for debugging
+            urls = {f.get('format_id'): f.get('url') for f in info.get('formats', [])}
             
-            # Sort by height for easier reading
-            all_formats.sort(key=lambda x: x['height'], reverse=True)
+            # Rows are already ranked by height, then bitrate
+            all_formats = [dict(f, url=urls[f['format_id']][:100] + '...' if urls.get(f['format_id']) else '',
+                                is_video_only=not f['has_audio'])
+                           for f in formats.rows]
             
             return jsonify({
                 'title': info.get('title', 'Unknown'),
@@ -1015,12 +4479,28 @@ def test_auth_bypass():
             'timestamp': '2024-01-18'
         }), 500
 
+@app.route('/cache_status')
+def cache_status():
+    """View metadata cache statistics"""
+    return jsonify({
+        'status': 'success',
+        'metadata_cache': METADATA_CACHE.stats(),
+        'thumbnails': THUMBNAILS.stats(),
+        'download_store': DOWNLOAD_STORE.stats(),
+        'janitor': DOWNLOAD_JANITOR.stats(),
+        'download_tuning': DOWNLOAD_TUNER.stats(),
+        'coalescing': {
+            'extractions': INFO_FLIGHTS.stats(),
+            'download_jobs': JOB_MANAGER.coalesced
+        },
+        'timestamp': datetime.now().isoformat()
+    })
+
 @app.route('/session_status')
 def session_status():
     """View current session status and debug information"""
     try:
-        sessions = load_sessions()
-        user_agents = load_user_agents()
+        sessions = SESSION_STATE.snapshot()
         
         return jsonify({
             'status': 'success',
@@ -1035,9 +4515,8 @@ def session_status():
                 'last_behavior': sessions.get('last_behavior', {}),
                 'created_at': sessions.get('created_at', 'Unknown')
             },
-            'available_user_agents': user_agents,
-            'session_file': SESSIONS_FILE,
-            'user_agents_file': USER_AGENTS_FILE,
+            'available_user_agents': sessions.get('user_agents', []),
+            'state_backend': STATE.describe(),
             'timestamp': datetime.now().isoformat(),
             'local_mode': True
         })
@@ -1053,20 +4532,16 @@ def session_status():
 def reset_session():
     """Reset the current session to start fresh"""
     try:
-        # Remove session files
-        if os.path.exists(SESSIONS_FILE):
-            os.remove(SESSIONS_FILE)
-        if os.path.exists(USER_AGENTS_FILE):
-            os.remove(USER_AGENTS_FILE)
+        # Drop persisted state
+        SESSION_STATE.reset()
         
         # Create new session
-        global GLOBAL_SESSIONS
-        GLOBAL_SESSIONS = create_local_like_session()
+        sessions = create_local_like_session()
         
         return jsonify({
             'status': 'success',
             'message': 'Session reset successfully',
-            'new_session_id': GLOBAL_SESSIONS['session_id'],
+            'new_session_id': sessions['session_id'],
             'timestamp': datetime.now().isoformat()
         })
         
@@ -1077,6 +4552,24 @@ def reset_session():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+# Seconds from the start of this module's import; first request and warm-up are filled in later
+STARTUP = {
+    'import_seconds': round(time.perf_counter() - _IMPORT_STARTED, 3),
+    'first_request_seconds': None,
+    'warm_up_seconds': None
+}
+print(f"[Startup] app imported in {STARTUP['import_seconds']}s")
+
+def startup_timings():
+    timings = dict(STARTUP, yt_dlp_import_seconds=yt_dlp.import_seconds)
+    return {name: value for name, value in timings.items() if value is not None}
+
+METRICS.register(CallbackGauge(
+    'ytdl_startup_seconds', 'Cold-start timings for this worker process', ('phase',),
+    lambda: {(phase,): value for phase, value in startup_timings().items()}))
+
 if __name__ == '__main__':
+    if os.environ.get('WARM_UP', '1') == '1':
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
     port = int(os.environ.get('PORT', 5000))
     app.run(debug=False, host='0.0.0.0', port=port) 
\ No newline at end of file
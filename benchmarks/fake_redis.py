@@ -0,0 +1,187 @@
+"""Local stand-in for a Redis server, for running the app with STATE_BACKEND=redis.
+
+Speaks enough RESP2 for the app's RedisBackend: PING, AUTH, SELECT, GET,
+SET (with PX and NX), DEL, INCRBY, MGET, SCAN (MATCH, COUNT) and the
+WATCH/MULTI/EXEC transactions used to renew leases. Data lives in one dict
+guarded by a lock, so every client connection sees the same keyspace just as
+workers sharing a real server would:
+
+    python benchmarks/fake_redis.py --port 6379
+    STATE_BACKEND=redis REDIS_URL=redis://127.0.0.1:6379/0 gunicorn app:app -w 4
+"""
+import re
+import time
+import argparse
+import threading
+import socketserver
+
+class FakeRedis:
+    """Threaded RESP2 server over an in-memory keyspace"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self._data = {}  # key bytes -> (value bytes, expires_at or None)
+        self._versions = {}  # key bytes -> times written, deleted or expired (for WATCH)
+        self._lock = threading.RLock()
+        self.commands = 0
+        self.server = socketserver.ThreadingTCPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"redis://{host}:{self.server.server_address[1]}/0"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='fake-redis', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _live(self, key, now):
+        item = self._data.get(key)
+        if item and item[1] is not None and item[1] <= now:
+            self._delete(key)
+            return None
+        return item
+
+    def _store(self, key, item):
+        self._data[key] = item
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def _delete(self, key):
+        if self._data.pop(key, None) is None:
+            return False
+        self._versions[key] = self._versions.get(key, 0) + 1
+        return True
+
+    def versions(self, keys):
+        with self._lock:
+            now = time.time()
+            for key in keys:
+                self._live(key, now)
+            return {key: self._versions.get(key, 0) for key in keys}
+
+    def execute_transaction(self, watched, queued):
+        """EXEC: run queued commands atomically, or return None if a watched key changed"""
+        with self._lock:
+            if self.versions(list(watched)) != watched:
+                return None
+            return [self.execute(args) for args in queued]
+
+    def execute(self, args):
+        """Run one command; returns the reply value (an Exception becomes an error reply)"""
+        name = args[0].upper().decode()
+        now = time.time()
+        with self._lock:
+            self.commands += 1
+            if name in ('PING', 'AUTH', 'SELECT'):
+                return 'PONG' if name == 'PING' else 'OK'
+            if name == 'GET':
+                item = self._live(args[1], now)
+                return item[0] if item else None
+            if name == 'SET':
+                key, value, options = args[1], args[2], [a.upper() for a in args[3:]]
+                expires_at = None
+                if b'PX' in options:
+                    expires_at = now + int(args[3 + options.index(b'PX') + 1]) / 1000
+                if b'NX' in options and self._live(key, now):
+                    return None
+                self._store(key, (value, expires_at))
+                return 'OK'
+            if name == 'DEL':
+                return sum(self._delete(key) for key in args[1:])
+            if name == 'INCRBY':
+                item = self._live(args[1], now)
+                try:
+                    value = int(item[0] if item else 0) + int(args[2])
+                except ValueError:
+                    return ValueError('ERR value is not an integer or out of range')
+                self._store(args[1], (str(value).encode(), item[1] if item else None))
+                return value
+            if name == 'MGET':
+                return [(self._live(key, now) or (None,))[0] for key in args[1:]]
+            if name == 'SCAN':
+                options = [a.upper() for a in args[2:]]
+                pattern = args[2 + options.index(b'MATCH') + 1].decode() if b'MATCH' in options else '*'
+                # The whole keyspace in one page; cursor 0 ends the scan
+                match = glob_regex(pattern).fullmatch
+                keys = [key for key in list(self._data) if self._live(key, now) and match(key.decode())]
+                return [b'0', keys]
+        return ValueError(f"ERR unknown command '{name}'")
+
+    def _handler(self):
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                watched, queued = {}, None  # this connection's WATCHed key versions and MULTI queue
+                while True:
+                    args = self._read_command()
+                    if args is None:
+                        return
+                    name = args[0].upper()
+                    if name == b'WATCH':
+                        watched.update(fake.versions(args[1:]))
+                        reply = 'OK'
+                    elif name in (b'UNWATCH', b'DISCARD'):
+                        watched, queued, reply = {}, None, 'OK'
+                    elif name == b'MULTI':
+                        queued, reply = [], 'OK'
+                    elif name == b'EXEC':
+                        reply = fake.execute_transaction(watched, queued or [])
+                        watched, queued = {}, None
+                    elif queued is not None:
+                        queued.append(args)
+                        reply = 'QUEUED'
+                    else:
+                        reply = fake.execute(args)
+                    self.wfile.write(encode(reply))
+
+            def _read_command(self):
+                line = self.rfile.readline()
+                if not line:
+                    return None
+                args = []
+                for _ in range(int(line[1:-2])):
+                    length = int(self.rfile.readline()[1:-2])
+                    args.append(self.rfile.read(length + 2)[:-2])
+                return args
+
+        return Handler
+
+def glob_regex(pattern):
+    """Compile a Redis glob (*, ? and backslash escapes; no [classes]) to a regex"""
+    parts, chars = [], iter(pattern)
+    for char in chars:
+        if char == '\\':
+            parts.append(re.escape(next(chars, '\\')))
+        elif char == '*':
+            parts.append('.*')
+        elif char == '?':
+            parts.append('.')
+        else:
+            parts.append(re.escape(char))
+    return re.compile(''.join(parts), re.S)
+
+def encode(value):
+    """RESP2 encoding of a reply value"""
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, Exception):
+        return b'-%s\r\n' % str(value).encode()
+    if isinstance(value, str):
+        return b'+%s\r\n' % value.encode()
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, bytes):
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+    return b'*%d\r\n' % len(value) + b''.join(encode(item) for item in value)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    args = parser.parse_args()
+    fake = FakeRedis(args.host, args.port)
+    print(f"Serving {fake.url}")
+    fake.server.serve_forever()
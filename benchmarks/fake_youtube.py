@@ -0,0 +1,188 @@
+"""Local stand-in for YouTube used by the benchmark harness.
+
+Serves canned extractor responses (info dicts) and media over localhost:
+
+    /info/<video_id>.json                     canned info dict for a video
+    /media/<video_id>/<format_id>             progressive or single-file media (Range supported)
+    /media/<video_id>/<format_id>/frag<n>     one DASH fragment
+    /thumb/<video_id>.jpg                     thumbnail
+
+Media fixtures are generated once with ffmpeg so yt-dlp's merger and
+convertor see real MP4/M4A files. DASH fragments are consecutive byte
+slices of the video-only file, so yt-dlp's concatenation rebuilds it exactly.
+
+`patch_yt_dlp(base_url)` swaps YoutubeDL.extract_info for a version that
+fetches the canned info from this server and runs it through yt-dlp's normal
+format selection and download path.
+"""
+import os
+import re
+import copy
+import json
+import time
+import shutil
+import subprocess
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+FRAGMENT_SIZE = 512 * 1024
+
+# (format_id, file, protocol, extra info dict fields)
+FORMATS = [
+    ('18', 'progressive.mp4', 'http', {
+        'ext': 'mp4', 'height': 360, 'width': 640, 'vcodec': 'avc1.42001E', 'acodec': 'mp4a.40.2',
+        'format_note': '360p', 'fps': 30}),
+    ('137', 'video.mp4', 'http_dash_segments', {
+        'ext': 'mp4', 'height': 1080, 'width': 1920, 'vcodec': 'avc1.640028', 'acodec': 'none',
+        'format_note': '1080p', 'fps': 30, 'container': 'mp4_dash'}),
+    ('140', 'audio.m4a', 'http', {
+        'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a.40.2', 'abr': 128, 'asr': 44100,
+        'format_note': 'medium', 'container': 'm4a_dash'}),
+]
+
+def video_ids(count):
+    """count distinct 11-character IDs that pass the app's URL validation"""
+    return [f"bench{i:06d}" for i in range(count)]
+
+def make_fixtures(directory, seconds=10, video_bitrate='4M'):
+    """Generate the media files with ffmpeg (skipped if they already exist)"""
+    if not shutil.which('ffmpeg'):
+        raise RuntimeError('ffmpeg is required to generate benchmark media')
+    os.makedirs(directory, exist_ok=True)
+    source = ['-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate=30:duration={seconds}',
+              '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}']
+    video = ['-c:v', 'libx264', '-preset', 'ultrafast', '-b:v', video_bitrate, '-pix_fmt', 'yuv420p']
+    audio = ['-c:a', 'aac', '-b:a', '128k']
+    outputs = {
+        'progressive.mp4': source + video + audio,
+        'video.mp4': source[:4] + video + ['-an'],
+        'audio.m4a': source[4:] + audio + ['-vn'],
+        'thumb.jpg': ['-f', 'lavfi', '-i', 'testsrc2=size=1280x720', '-frames:v', '1'],
+    }
+    for name, args in outputs.items():
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            subprocess.run(['ffmpeg', '-y', '-loglevel', 'error'] + args + [path], check=True)
+    return directory
+
+def canned_info(video_id, base_url, media_dir):
+    """Info dict shaped like the YouTube extractor's output, pointing at this server"""
+    formats = []
+    for format_id, name, protocol, fields in FORMATS:
+        size = os.path.getsize(os.path.join(media_dir, name))
+        url = f"{base_url}/media/{video_id}/{format_id}"
+        fmt = dict(fields, format_id=format_id, url=url, protocol=protocol, filesize=size,
+                   tbr=round(size * 8 / 1000 / 10, 1))
+        if protocol == 'http_dash_segments':
+            count = (size + FRAGMENT_SIZE - 1) // FRAGMENT_SIZE
+            fmt['fragment_base_url'] = url + '/'
+            fmt['fragments'] = [{'path': f'frag{n}'} for n in range(count)]
+        formats.append(fmt)
+    return {
+        'id': video_id,
+        'title': f'Benchmark video {video_id}',
+        'duration': 10,
+        'thumbnail': f"{base_url}/thumb/{video_id}.jpg",
+        'uploader': 'bench',
+        'webpage_url': f"https://www.youtube.com/watch?v={video_id}",
+        'extractor': 'youtube',
+        'extractor_key': 'Youtube',
+        'formats': formats
+    }
+
+class FakeYouTube:
+    """Threaded HTTP server for canned info and media; extract_delay simulates extractor latency"""
+
+    def __init__(self, media_dir, host='127.0.0.1', port=0, extract_delay=0.0):
+        self.media_dir = media_dir
+        self.extract_delay = extract_delay
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._files = {format_id: os.path.join(media_dir, name) for format_id, name, _, _ in FORMATS}
+        self._files['thumb'] = os.path.join(media_dir, 'thumb.jpg')
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.base_url = f"http://{host}:{self.server.server_address[1]}"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='fake-youtube', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _count(self, num_bytes):
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += num_bytes
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                match = re.fullmatch(r'/info/([\w-]{11})\.json', self.path)
+                if match:
+                    time.sleep(fake.extract_delay)
+                    body = json.dumps(canned_info(match.group(1), fake.base_url, fake.media_dir)).encode()
+                    return self._send(200, body, 'application/json')
+                if re.fullmatch(r'/thumb/[\w-]{11}\.jpg', self.path):
+                    with open(fake._files['thumb'], 'rb') as f:
+                        return self._send(200, f.read(), 'image/jpeg')
+                match = re.fullmatch(r'/media/[\w-]{11}/(\w+)(?:/frag(\d+))?', self.path)
+                if not match or match.group(1) not in fake._files:
+                    return self._send(404, b'not found', 'text/plain')
+                with open(fake._files[match.group(1)], 'rb') as f:
+                    data = f.read()
+                if match.group(2) is not None:
+                    start = int(match.group(2)) * FRAGMENT_SIZE
+                    return self._send(200, data[start:start + FRAGMENT_SIZE], 'video/mp4')
+                ranged = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+                if ranged:
+                    start = int(ranged.group(1))
+                    end = int(ranged.group(2)) if ranged.group(2) else len(data) - 1
+                    end = min(end, len(data) - 1)
+                    return self._send(206, data[start:end + 1], 'video/mp4',
+                                      {'Content-Range': f'bytes {start}-{end}/{len(data)}'})
+                return self._send(200, data, 'video/mp4')
+
+            def _send(self, status, body, content_type, headers=None):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Accept-Ranges', 'bytes')
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+                fake._count(len(body))
+
+        return Handler
+
+def patch_yt_dlp(base_url):
+    """Route YoutubeDL.extract_info through the fake server's canned info dicts"""
+    import requests
+    import yt_dlp
+    from urllib.parse import urlparse, parse_qs
+
+    session = requests.Session()
+
+    def extract_info(self, url, download=True, ie_key=None, extra_info=None, process=True, force_generic_extractor=False):
+        video_id = parse_qs(urlparse(url).query).get('v', [url[-11:]])[0]
+        response = session.get(f"{base_url}/info/{video_id}.json", timeout=30)
+        response.raise_for_status()
+        info = response.json()
+        if not process:
+            return info
+        return self.process_ie_result(copy.deepcopy(info), download=download, extra_info=extra_info or {})
+
+    yt_dlp.YoutubeDL.extract_info = extract_info
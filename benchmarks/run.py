@@ -0,0 +1,199 @@
+"""Benchmark harness for app.py against the local fake YouTube backend.
+
+Runs the app in-process on a threaded localhost server, drives
+get_video_info (cold and warm cache), download_video and download_file at a
+fixed concurrency, and prints one JSON document with throughput, latency
+percentiles and peak RSS so results can be diffed between commits:
+
+    python benchmarks/run.py --videos 20 --concurrency 4 --output results.json
+
+Requires ffmpeg (to generate the media fixtures and for yt-dlp's merger).
+The app runs in a temporary working directory, so its downloads, SQLite
+files and session state never touch the checkout.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from fake_redis import FakeRedis
+from fake_youtube import FakeYouTube, make_fixtures, patch_yt_dlp, video_ids
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def run_scenario(name, func, items, concurrency):
+    """Call func(item) for every item on concurrency threads; func returns bytes transferred"""
+    latencies = []
+    errors = []
+    transferred = [0]
+    lock = threading.Lock()
+
+    def one(item):
+        started = time.perf_counter()
+        try:
+            num_bytes = func(item) or 0
+        except Exception as e:
+            with lock:
+                errors.append(f"{type(e).__name__}: {e}")
+            return
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            transferred[0] += num_bytes
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, items))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    result = {
+        'requests': len(items),
+        'ok': len(latencies),
+        'errors': len(errors),
+        'wall_seconds': round(wall, 3),
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else None,
+        'bytes': transferred[0],
+        'mb_per_s': round(transferred[0] / wall / 1e6, 2) if wall else None,
+        'latency_seconds': {
+            'p50': round(percentile(latencies, 50), 4) if latencies else None,
+            'p90': round(percentile(latencies, 90), 4) if latencies else None,
+            'p99': round(percentile(latencies, 99), 4) if latencies else None,
+            'max': round(latencies[-1], 4) if latencies else None
+        }
+    }
+    if errors:
+        result['first_errors'] = errors[:5]
+    print(f"[Bench] {name}: {result['ok']}/{result['requests']} ok, "
+          f"p50 {result['latency_seconds']['p50']}s, {result['throughput_rps']} req/s", file=sys.stderr)
+    return result
+
+def start_app(app):
+    """Serve the Flask app on a free localhost port from a background thread"""
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='bench-app', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--videos', type=int, default=20, help='distinct videos per scenario')
+    parser.add_argument('--concurrency', type=int, default=4, help='client threads')
+    parser.add_argument('--downloads', type=int, default=4, help='videos downloaded in the download scenario')
+    parser.add_argument('--serve-rounds', type=int, default=5, help='times each downloaded file is fetched')
+    parser.add_argument('--format-id', default='137', help='format passed to /download_video (137 = DASH video)')
+    parser.add_argument('--extract-delay', type=float, default=0.2, help='simulated extractor latency (seconds)')
+    parser.add_argument('--media-dir', default=os.path.join(tempfile.gettempdir(), 'ytdl-bench-media'),
+                        help='where generated media fixtures are kept between runs')
+    parser.add_argument('--state-backend', choices=('memory', 'sqlite', 'redis'), default='sqlite',
+                        help='STATE_BACKEND for the app (redis runs against a local stand-in)')
+    parser.add_argument('--output', help='write results JSON here as well as to stdout')
+    args = parser.parse_args()
+    output_path = os.path.abspath(args.output) if args.output else None
+
+    make_fixtures(args.media_dir)
+    fake = FakeYouTube(args.media_dir, extract_delay=args.extract_delay).start()
+    patch_yt_dlp(fake.base_url)
+    redis = None
+    os.environ['STATE_BACKEND'] = args.state_backend
+    if args.state_backend == 'redis':
+        redis = FakeRedis().start()
+        os.environ['REDIS_URL'] = redis.url
+
+    # The app and yt-dlp log to stdout; keep stdout for the results document
+    results_out = sys.stdout
+    sys.stdout = sys.stderr
+
+    # Import the app from a scratch directory so its relative paths stay out of the checkout
+    workdir = tempfile.mkdtemp(prefix='ytdl-bench-')
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_ROOT)
+    import_started = time.perf_counter()
+    import app as app_module
+    import_seconds = time.perf_counter() - import_started
+    server, base = start_app(app_module.app)
+    client = requests.Session()
+    client.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency * 2))
+
+    urls = [f"https://www.youtube.com/watch?v={vid}" for vid in video_ids(args.videos)]
+
+    def get_info(url):
+        response = client.post(f"{base}/get_video_info", json={'url': url}, timeout=120)
+        response.raise_for_status()
+        return len(response.content)
+
+    def download(url):
+        response = client.post(f"{base}/download_video", json={'url': url, 'format_id': args.format_id}, timeout=30)
+        response.raise_for_status()
+        status_url = base + response.json()['status_url']
+        while True:
+            job = client.get(status_url, timeout=30).json()
+            if job['state'] in ('finished', 'failed'):
+                break
+            time.sleep(0.05)
+        if job['state'] != 'finished':
+            raise RuntimeError(job.get('result', {}).get('error', 'download failed'))
+        downloaded_files.append(job['result']['filename'])
+        return job['result']['filesize']
+
+    def fetch_file(filename):
+        with client.get(f"{base}/download_file/{filename}", stream=True, timeout=120) as response:
+            response.raise_for_status()
+            return sum(len(chunk) for chunk in response.iter_content(256 * 1024))
+
+    downloaded_files = []
+    scenarios = {}
+    scenarios['get_video_info_cold'] = run_scenario('get_video_info (cold)', get_info, urls, args.concurrency)
+    scenarios['get_video_info_warm'] = run_scenario('get_video_info (warm)', get_info, urls, args.concurrency)
+    scenarios['download_video'] = run_scenario('download_video', download, urls[:args.downloads], args.concurrency)
+    scenarios['download_file'] = run_scenario('download_file', fetch_file, downloaded_files * args.serve_rounds,
+                                              args.concurrency)
+
+    server.shutdown()
+    fake.stop()
+    if redis:
+        redis.stop()
+
+    results = {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': {k: v for k, v in vars(args).items() if k not in ('output', 'media_dir')},
+        'app_import_seconds': round(import_seconds, 3),
+        'scenarios': scenarios,
+        'backend': {'requests': fake.requests, 'bytes_sent': fake.bytes_sent},
+        # ru_maxrss is KiB on Linux and bytes on macOS; covers the app, the client threads and the fake backend
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // (1024 if sys.platform == 'darwin' else 1)
+    }
+    output = json.dumps(results, indent=2)
+    print(output, file=results_out)
+    if output_path:
+        with open(output_path, 'w') as f:
+            f.write(output + '\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,20 @@
+"""Gunicorn settings, read automatically from the working directory.
+
+Set WARM_UP=0 to skip the post-fork warm-up and keep everything lazy.
+"""
+import os
+import threading
+
+def post_worker_init(worker):
+    """Warm up a freshly forked worker in the background so it accepts traffic straight away"""
+    if os.environ.get('WARM_UP', '1') != '1':
+        return
+    from app import warm_up
+
+    def run():
+        try:
+            warm_up()
+        except Exception as e:
+            print(f"[Startup] Warm-up failed: {e}")
+
+    threading.Thread(target=run, name='warm-up', daemon=True).start()
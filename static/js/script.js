@@ -1,6 +1,10 @@
 // Global variables
 let currentVideoInfo = null;
 let selectedFormat = null;
+let downloadMode = 'video';  // 'video' or 'audio' (audio-only download)
+
+// How often to poll a queued download job (ms)
+const JOB_POLL_INTERVAL = 1500;
 
 // DOM elements
 const videoUrlInput = document.getElementById('videoUrl');
@@ -22,7 +26,10 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Download button event listener will be added dynamically
     document.addEventListener('click', function(e) {
-        if (e.target.id === 'downloadBtn') {
+        const modeBtn = e.target.closest('.mode-btn');
+        if (modeBtn) {
+            setDownloadMode(modeBtn.dataset.mode);
+        } else if (e.target.id === 'downloadBtn') {
             downloadVideo();
         } else if (e.target.id === 'download1080pBtn') {
             // This button is removed, so this block is no longer needed.
@@ -86,12 +93,41 @@ function displayVideoInfo(videoInfo) {
     
     // Set video details
     document.getElementById('videoTitle').textContent = videoInfo.title;
-    document.getElementById('videoThumbnail').src = videoInfo.thumbnail;
+    setThumbnail(document.getElementById('videoThumbnail'), videoInfo.thumbnail);
     document.getElementById('videoDuration').textContent = formatDuration(videoInfo.duration);
     document.getElementById('videoId').textContent = `ID: ${videoInfo.video_id}`;
     
     // Populate format options
-    populateFormatOptions(videoInfo.formats);
+    setDownloadMode('video');
+}
+
+// Switch between video formats and audio-only formats
+function setDownloadMode(mode) {
+    downloadMode = mode;
+    document.querySelectorAll('.mode-btn').forEach(btn => {
+        btn.classList.toggle('active', btn.dataset.mode === mode);
+    });
+    document.getElementById('downloadBtn').innerHTML = mode === 'audio'
+        ? '<i class="fas fa-download"></i> Download Audio'
+        : '<i class="fas fa-download"></i> Download Video';
+    
+    if (!currentVideoInfo) return;
+    if (mode === 'audio') {
+        populateAudioOptions(currentVideoInfo.audio_formats);
+    } else {
+        populateFormatOptions(currentVideoInfo.formats);
+    }
+}
+
+// Point the thumbnail at our resized copies (/thumb/<id>), with a larger one for high-density screens
+function setThumbnail(img, thumbnail) {
+    if (thumbnail && thumbnail.startsWith('/thumb/')) {
+        img.src = `${thumbnail}?w=320`;
+        img.srcset = `${thumbnail}?w=320 1x, ${thumbnail}?w=480 2x`;
+    } else {
+        img.removeAttribute('srcset');
+        img.src = thumbnail || '';
+    }
 }
 
 // Populate format options
@@ -140,6 +176,43 @@ function populateFormatOptions(formats) {
     createFormatOptions(uniqueFormats);
 }
 
+// Populate audio-only options: best available first, then each stream by bitrate
+function populateAudioOptions(audioFormats) {
+    const formatOptionsContainer = document.getElementById('formatOptions');
+    formatOptionsContainer.innerHTML = '';
+    
+    const best = (audioFormats || [])[0];
+    const options = [{
+        format_id: 'bestaudio',
+        title: 'Best Audio',
+        description: best ? `${best.container.toUpperCase()} • no re-encoding` : 'Best available audio'
+    }];
+    (audioFormats || []).forEach(format => {
+        const filesize = format.filesize ? formatFileSize(format.filesize) : 'Unknown size';
+        const bitrate = format.abr ? `${Math.round(format.abr)}kbps` : 'Unknown bitrate';
+        options.push({
+            format_id: format.format_id,
+            title: `${bitrate} ${format.container.toUpperCase()}`,
+            description: `${filesize} • ${format.acodec || 'unknown codec'} • ${format.format_note || 'Audio'}`
+        });
+    });
+    
+    options.forEach((option, index) => {
+        const formatOption = document.createElement('div');
+        formatOption.className = 'format-option';
+        formatOption.dataset.formatId = option.format_id;
+        formatOption.innerHTML = `
+            <h5>${option.title}</h5>
+            <p>${option.description}</p>
+        `;
+        formatOption.addEventListener('click', () => selectFormat(formatOption, option));
+        formatOptionsContainer.appendChild(formatOption);
+        if (index === 0) {
+            selectFormat(formatOption, option);
+        }
+    });
+}
+
 // Helper function to create format option elements
 function createFormatOptions(formats) {
     const formatOptionsContainer = document.getElementById('formatOptions');
@@ -222,6 +295,7 @@ async function downloadVideo() {
     console.log('[Download] Selected format_id:', selectedFormat); // Debug log
     
     hideAllSections();
+    resetProgress();
     showSection(downloadProgress);
     
     try {
@@ -232,16 +306,22 @@ async function downloadVideo() {
             },
             body: JSON.stringify({
                 url: videoUrlInput.value.trim(),
-                format_id: selectedFormat
+                format_id: selectedFormat,
+                mode: downloadMode
             })
         });
         
-        const data = await response.json();
+        const job = await response.json();
         
         if (!response.ok) {
-            throw new Error(data.error || 'Download failed');
+            throw new Error(job.error || 'Download failed');
         }
         
+        console.log('[Download] Queued job:', job.job_id); // Debug log
+        
+        // Follow the job's progress until the server has finished the download
+        const data = await watchJob(job);
+        
         // Show download complete
         showDownloadComplete(data);
         
@@ -250,6 +330,93 @@ async function downloadVideo() {
     }
 }
 
+// Follow a job's progress events; falls back to polling if the stream drops
+function watchJob(job) {
+    return new Promise((resolve, reject) => {
+        if (!window.EventSource) {
+            waitForJob(job.status_url).then(resolve, reject);
+            return;
+        }
+        
+        const source = new EventSource(job.events_url);
+        
+        source.addEventListener('progress', function(e) {
+            updateProgress(JSON.parse(e.data));
+        });
+        
+        source.addEventListener('done', function(e) {
+            source.close();
+            const summary = JSON.parse(e.data);
+            if (summary.state === 'finished') {
+                resolve(summary.result);
+            } else {
+                reject(new Error((summary.result && summary.result.error) || 'Download failed'));
+            }
+        });
+        
+        source.onerror = function() {
+            console.log('[Download] Progress stream lost, polling instead'); // Debug log
+            source.close();
+            waitForJob(job.status_url).then(resolve, reject);
+        };
+    });
+}
+
+// Show a progress snapshot in the download section
+function updateProgress(progress) {
+    const phaseLabels = {
+        download: 'Downloading video...',
+        merge: 'Merging audio and video...',
+        convert: 'Converting video...',
+        postprocess: 'Finishing up...'
+    };
+    document.getElementById('progressPhase').textContent = phaseLabels[progress.phase] || 'Downloading video...';
+    
+    if (progress.phase !== 'download') {
+        document.getElementById('progressBarFill').style.width = '100%';
+        document.getElementById('progressDetails').textContent = 'Almost done.';
+        return;
+    }
+    
+    if (progress.percent !== null && progress.percent !== undefined) {
+        document.getElementById('progressBarFill').style.width = `${progress.percent}%`;
+    }
+    
+    let details = formatFileSize(progress.downloaded_bytes);
+    if (progress.total_bytes) details += ` of ${formatFileSize(progress.total_bytes)}`;
+    if (progress.speed) details += ` • ${formatFileSize(progress.speed)}/s`;
+    if (progress.eta) details += ` • ${formatDuration(Math.round(progress.eta))} left`;
+    document.getElementById('progressDetails').textContent = details;
+}
+
+// Reset the download section before a new download
+function resetProgress() {
+    document.getElementById('progressPhase').textContent = 'Downloading video...';
+    document.getElementById('progressBarFill').style.width = '0%';
+    document.getElementById('progressDetails').textContent = 'This may take a few minutes depending on the video size.';
+}
+
+// Poll a download job until it finishes and return its result
+async function waitForJob(statusUrl) {
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL));
+        
+        const response = await fetch(statusUrl);
+        const job = await response.json();
+        
+        if (!response.ok) {
+            throw new Error(job.error || 'Lost track of the download job');
+        }
+        
+        if (job.state === 'finished') {
+            return job.result;
+        }
+        if (job.state === 'failed') {
+            throw new Error((job.result && job.result.error) || 'Download failed');
+        }
+    }
+}
+
 // Show download complete
 function showDownloadComplete(downloadData) {
     hideAllSections();
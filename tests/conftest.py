@@ -0,0 +1,45 @@
+"""Shared setup: import app from a scratch directory so tests never touch the checkout."""
+import os
+import sys
+import shutil
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+# app creates its folders and state database relative to the working directory
+os.chdir(tempfile.mkdtemp(prefix='ytdl-tests-'))
+os.environ.setdefault('STATE_BACKEND', 'memory')
+
+@pytest.fixture
+def youtube(tmp_path_factory, monkeypatch):
+    """Fake YouTube backend for app.yt_dlp; its extractions list records each URL the extractor was called for"""
+    # Imported here, after the working directory and STATE_BACKEND are set up
+    import app
+    import fake_youtube
+    if shutil.which('ffmpeg'):
+        media = fake_youtube.make_fixtures(str(tmp_path_factory.mktemp('media')), seconds=4)
+    else:
+        # Single-file downloads never reach ffmpeg, so any bytes over the 1 MB sanity check will do
+        media = str(tmp_path_factory.mktemp('media'))
+        for name in ('progressive.mp4', 'video.mp4', 'audio.m4a', 'thumb.jpg'):
+            with open(os.path.join(media, name), 'wb') as f:
+                f.write(os.urandom(2 * 1024 * 1024))
+    fake = fake_youtube.FakeYouTube(media).start()
+    # patch_yt_dlp assigns the class attribute directly; registering it first lets monkeypatch undo that
+    monkeypatch.setattr(app.yt_dlp.YoutubeDL, 'extract_info', app.yt_dlp.YoutubeDL.extract_info)
+    fake_youtube.patch_yt_dlp(fake.base_url)
+    extract = app.yt_dlp.YoutubeDL.extract_info
+    fake.extractions = []
+
+    def counting_extract_info(self, url, *args, **kwargs):
+        fake.extractions.append(url)
+        return extract(self, url, *args, **kwargs)
+
+    monkeypatch.setattr(app.yt_dlp.YoutubeDL, 'extract_info', counting_extract_info)
+    app.METADATA_CACHE.clear()
+    yield fake
+    app.METADATA_CACHE.clear()
+    fake.stop()
@@ -0,0 +1,43 @@
+import pytest
+
+import app
+
+def test_client_rate_is_off_by_default():
+    assert app.CLIENT_RATE == 0
+
+def test_gate_rejection_refunds_the_client_token():
+    admission = app.AdmissionController({'heavy': 1}, max_queue=0, max_wait=0.1, client_rate=0.001, client_burst=1)
+    held = admission.admit('heavy', 'other')
+    with pytest.raises(app.Rejected) as rejected:
+        admission.admit('heavy', 'client')
+    assert rejected.value.reason == 'queue_full'
+    held.release()
+    assert admission.admit('heavy', 'client') is not None  # its only token was not spent on the 429
+
+@pytest.mark.parametrize('trusted, expected', [(0, '10.0.0.1'), (1, '203.0.113.7')])
+def test_client_address_skips_trusted_proxy_hops(monkeypatch, trusted, expected):
+    monkeypatch.setattr(app, 'TRUSTED_PROXIES', trusted)
+    headers = {'X-Forwarded-For': '198.51.100.1, 203.0.113.7'}
+    with app.app.test_request_context(headers=headers, environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+        assert app.client_address() == expected
+
+def test_stream_video_and_batch_are_gated():
+    assert {'stream_video', 'create_batch'} <= set(app.ADMISSION.gates)
+
+class IdleJobs:
+    """Stands in for JobManager: submitted jobs stay queued"""
+
+    def submit(self, kind, func, *args, key=None, files=None):
+        return {'id': key, 'state': 'queued'}
+
+    def wait_until(self, predicate, timeout):
+        pass
+
+def test_batches_are_limited_per_client():
+    batches = app.BatchManager(IdleJobs(), concurrency=1, retention=60, max_open=1)
+    urls = ['https://www.youtube.com/watch?v=dQw4w9WgXcQ']
+    batches.create(urls, 'best', client='a')
+    with pytest.raises(app.Rejected) as rejected:
+        batches.create(urls, 'best', client='a')
+    assert rejected.value.reason == 'open_batches'
+    batches.create(urls, 'best', client='b')
@@ -0,0 +1,97 @@
+import io
+import os
+import time
+import zipfile
+import threading
+
+import pytest
+
+import app
+
+def url(n):
+    return f'https://www.youtube.com/watch?v=batch{n:06d}'
+
+@pytest.fixture
+def batches(monkeypatch):
+    jobs = app.JobManager(4, 60, 1)
+    jobs.add_finish_listener(app.ADMISSION.job_finished)
+    manager = app.BatchManager(jobs, 2, 60, max_open=0)
+    monkeypatch.setattr(app, 'JOB_MANAGER', jobs)
+    monkeypatch.setattr(app, 'BATCH_MANAGER', manager)
+    return manager
+
+def wait_done(manager, batch, timeout=10):
+    # Polled: the feeder records item['job'] only after submit returns, possibly after the job's last change
+    deadline = time.time() + timeout
+    while not manager.is_done(batch) and time.time() < deadline:
+        time.sleep(0.01)
+    return manager.is_done(batch)
+
+def fake_download(url, format_id):
+    """Stores a small file for the video, titled the same for every video"""
+    video_id = app.extract_video_id(url)
+    path = os.path.join(app.UPLOAD_FOLDER, app.DownloadStore.filename_for(video_id, 'best', 'mp4'))
+    with open(path, 'wb') as f:
+        f.write(video_id.encode() * 100)
+    artifact = app.DOWNLOAD_STORE.record(video_id, 'best', 'mp4', path, 'Same title')
+    return {'filename': artifact['filename']}, 200
+
+def test_batch_keeps_at_most_concurrency_items_in_the_pool(batches, monkeypatch):
+    release = threading.Event()
+    running, peak, formats = [0], [0], set()
+    lock = threading.Lock()
+
+    def download(url, format_id):
+        formats.add(format_id)
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        release.wait(5)
+        with lock:
+            running[0] -= 1
+        return {}, 200
+
+    monkeypatch.setattr(app, 'run_download_video', download)
+    batch = batches.create([url(n) for n in range(5)], '720p')
+    time.sleep(0.2)
+    assert [batches.item_state(item) for item in batch['items']].count('pending') == 3
+    release.set()
+    assert wait_done(batches, batch) and peak[0] == 2
+    assert formats == {'bestvideo[height<=720]'}
+
+def test_create_batch_validates_and_deduplicates(batches, monkeypatch):
+    monkeypatch.setattr(app, 'run_download_video', lambda url, format_id: ({}, 200))
+    client = app.app.test_client()
+    assert client.post('/batch', json={'urls': []}).status_code == 400
+    assert client.post('/batch', json={'urls': [url(1)], 'quality': '4k'}).status_code == 400
+    assert client.post('/batch', json={'urls': [url(1), 'https://example.com/x']}).status_code == 400
+    response = client.post('/batch', json={'urls': f'{url(1)}\n{url(2)}\n{url(1)}'})
+    assert response.status_code == 202
+    assert response.get_json()['total'] == 2
+
+def test_zip_streams_finished_files_with_unique_names_and_releases_leases(batches, monkeypatch):
+    monkeypatch.setattr(app, 'run_download_video', fake_download)
+    batch = batches.create([url(10), url(11)], 'best')
+    assert wait_done(batches, batch)
+    client = app.app.test_client()
+
+    response = client.get(f"/batch/{batch['id']}/zip")
+    assert response.status_code == 200 and response.mimetype == 'application/zip'
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    assert sorted(archive.namelist()) == ['Same title (2).mp4', 'Same title.mp4']
+    assert {archive.read(name) for name in archive.namelist()} == {b'batch000010' * 100, b'batch000011' * 100}
+    assert all(info.compress_type == zipfile.ZIP_STORED for info in archive.infolist())
+    response.close()
+
+    # A body that is never iterated (HEAD, client gone early) still gives the files back to the janitor
+    client.head(f"/batch/{batch['id']}/zip").close()
+    assert not any(app.FILE_LEASES.in_use(a['filename']) for a in batches.finished_artifacts(batch))
+
+def test_zip_of_a_running_batch_is_409_unless_partial(batches, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(app, 'run_download_video', lambda url, format_id: release.wait(5) and ({}, 200))
+    batch = batches.create([url(20)], 'best')
+    client = app.app.test_client()
+    assert client.get(f"/batch/{batch['id']}/zip").status_code == 409
+    assert client.get(f"/batch/{batch['id']}/zip?partial=1").status_code == 404  # nothing finished yet
+    release.set()
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+import app
+
+PAYLOAD = bytes(range(256)) * 16
+
+@pytest.fixture
+def stored():
+    filename = app.DownloadStore.filename_for('serve000001', '18', 'mp4')
+    path = os.path.join(app.UPLOAD_FOLDER, filename)
+    with open(path, 'wb') as f:
+        f.write(PAYLOAD)
+    artifact = app.DOWNLOAD_STORE.record('serve000001', '18', 'mp4', path, 'A title', '360p')
+    yield artifact
+    app.DOWNLOAD_STORE.forget(filename)
+    os.remove(path)
+
+def test_range_request_gets_206_with_the_requested_bytes(stored):
+    client = app.app.test_client()
+    response = client.get(f"/download_file/{stored['filename']}", headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.data == PAYLOAD[100:200]
+    assert response.headers['Content-Range'] == f'bytes 100-199/{len(PAYLOAD)}'
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert 'A title_18.mp4' in response.headers['Content-Disposition']
+    response.close()
+    assert not app.FILE_LEASES.in_use(stored['filename'])
+
+def test_strong_etag_from_checksum_answers_revalidation_with_304(stored):
+    client = app.app.test_client()
+    response = client.get(f"/download_file/{stored['filename']}")
+    assert response.headers['ETag'] == f'"{stored["sha256"]}"'
+    assert response.data == PAYLOAD
+    response.close()
+    revalidated = client.get(f"/download_file/{stored['filename']}", headers={'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304 and revalidated.data == b''
+    revalidated.close()
+
+def test_x_accel_offload_hands_the_file_to_the_proxy(stored, monkeypatch):
+    monkeypatch.setattr(app, 'FILE_OFFLOAD', 'x-accel')
+    response = app.app.test_client().get(f"/download_file/{stored['filename']}")
+    assert response.headers['X-Accel-Redirect'].endswith('/' + stored['filename'])
+    assert response.data == b''
+    assert not app.FILE_LEASES.in_use(stored['filename'])
+
+def test_missing_file_is_404():
+    assert app.app.test_client().get('/download_file/nothing.mp4').status_code == 404
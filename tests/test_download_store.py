@@ -0,0 +1,26 @@
+import shutil
+
+import pytest
+
+import app
+
+VIDEO_ID = 'store000001'
+URL = f'https://www.youtube.com/watch?v={VIDEO_ID}'
+
+@pytest.mark.parametrize('format_id', [
+    '18',
+    pytest.param('137', marks=pytest.mark.skipif(not shutil.which('ffmpeg'), reason='merging needs ffmpeg')),
+])
+def test_repeat_download_is_served_from_the_store_without_extracting(youtube, format_id):
+    body, status = app.run_download_video(URL, format_id)
+    assert status == 200, body
+    assert youtube.extractions == [URL]
+
+    # Past the metadata TTL only the download store can answer without going back to YouTube
+    app.METADATA_CACHE.clear()
+    repeat, status = app.run_download_video(URL, format_id)
+    assert status == 200, repeat
+    assert youtube.extractions == [URL]
+    assert repeat['cached'] is True
+    assert repeat['extractor_calls'] == 0
+    assert repeat['filename'] == body['filename']
@@ -0,0 +1,39 @@
+import app
+
+MB = 1024 * 1024
+
+def test_chunk_size_starts_small_and_follows_measured_throughput():
+    tuner = app.DownloadTuner(4, min_chunk=MB, max_chunk=64 * MB, target_seconds=2)
+    assert tuner.chunk_size() == MB
+    tuner.record(10 * MB, 1)  # 10 MB/s: 2 s covers 20 MB
+    assert tuner.chunk_size() == 16 * MB
+    tuner.record(1000 * MB, 1)
+    assert tuner.chunk_size() == 64 * MB  # clamped to max_chunk
+
+def test_throughput_is_a_weighted_average_and_ignores_empty_samples():
+    tuner = app.DownloadTuner(4, MB, 64 * MB, 2)
+    tuner.record(10 * MB, 1)
+    tuner.record(0, 1)
+    tuner.record(MB, 0)
+    assert tuner.samples == 1
+    tuner.record(20 * MB, 1)
+    assert tuner.throughput == 0.7 * 10 * MB + 0.3 * 20 * MB
+
+def test_meter_feeds_finished_streams_to_the_tuner():
+    tuner = app.DownloadTuner(4, MB, 64 * MB, 2)
+    meter = app.ThroughputMeter(tuner, MB)
+    meter.progress_hook({'status': 'downloading', 'downloaded_bytes': MB, 'elapsed': 1})
+    meter.progress_hook({'status': 'finished', 'downloaded_bytes': 5 * MB})  # already on disk
+    assert tuner.samples == 0
+    meter.progress_hook({'status': 'finished', 'downloaded_bytes': 8 * MB, 'elapsed': 2})
+    assert tuner.samples == 1 and meter.stats()['bytes'] == 8 * MB
+
+def test_tune_download_sets_concurrency_and_chunk_size_and_keeps_existing_hooks(monkeypatch):
+    tuner = app.DownloadTuner(3, MB, 64 * MB, 2)
+    monkeypatch.setattr(app, 'DOWNLOAD_TUNER', tuner)
+    hook = object()
+    opts = {'progress_hooks': [hook]}
+    meter = app.tune_download(opts)
+    assert opts['concurrent_fragment_downloads'] == 3
+    assert opts['http_chunk_size'] == MB
+    assert opts['progress_hooks'] == [hook, meter.progress_hook]
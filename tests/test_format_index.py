@@ -0,0 +1,49 @@
+import json
+
+import app
+
+FORMATS = [
+    {'format_id': 'sb0', 'ext': 'mhtml', 'height': 180, 'vcodec': 'images', 'acodec': 'none', 'protocol': 'mhtml'},
+    {'format_id': '18', 'ext': 'mp4', 'height': 360, 'tbr': 500, 'vcodec': 'avc1.42001E', 'acodec': 'mp4a.40.2',
+     'protocol': 'https'},
+    {'format_id': '243', 'ext': 'webm', 'height': 360, 'tbr': 300, 'vcodec': 'vp09.00.21.08', 'acodec': 'none',
+     'protocol': 'https'},
+    {'format_id': '137', 'ext': 'mp4', 'height': 1080, 'tbr': 4000, 'vcodec': 'avc1.640028', 'acodec': 'none',
+     'protocol': 'https'},
+    {'format_id': '140', 'ext': 'm4a', 'abr': 128, 'vcodec': 'none', 'acodec': 'mp4a.40.2', 'protocol': 'https'},
+    {'format_id': '251', 'ext': 'webm', 'abr': 160, 'vcodec': 'none', 'acodec': 'opus', 'protocol': 'https'},
+    {'ext': 'mp4', 'height': 720},  # no format_id: dropped
+]
+
+def ids(rows):
+    return [row['format_id'] for row in rows]
+
+def test_formats_are_ranked_once_and_grouped_by_kind():
+    index = app.FormatIndex.build(FORMATS)
+    assert ids(index.ranked('video')) == ['137', '18', '243', 'sb0']  # by height, then bitrate
+    assert ids(index.ranked('video_only')) == ['137', '243', 'sb0']
+    assert ids(index.ranked('audio_only')) == ['251', '140']  # by audio bitrate
+    assert ids(index.ranked('progressive')) == ['18']
+    assert index.best('muxed')['format_id'] == '18'
+    assert index.get('nope') is None
+
+def test_offered_keeps_the_best_playable_format_per_height():
+    index = app.FormatIndex.build(FORMATS)
+    assert ids(index.ranked('offered')) == ['137', '18']  # 360p: 18 beats 243 on bitrate; storyboards left out
+    assert index.heights() == [1080, 360, 180]
+
+def test_lookups_by_codec_family_height_and_container():
+    index = app.FormatIndex.build(FORMATS)
+    assert ids(index.with_video_codec('h264')) == ['137', '18']
+    assert ids(index.with_video_codec('vp9')) == ['243']
+    assert ids(index.with_audio_codec('opus')) == ['251']
+    assert ids(index.at_height(360)) == ['18', '243']
+    assert index.has_height(1080) and not index.has_height(720)
+    assert set(ids(index.in_container('webm'))) == {'243', '251'}
+
+def test_index_survives_a_json_round_trip_without_rebuilding():
+    built = app.FormatIndex.build(FORMATS)
+    restored = app.FormatIndex(json.loads(json.dumps(built.to_dict())))
+    assert ids(restored.ranked('offered')) == ids(built.ranked('offered'))
+    assert ids(restored.at_height(360)) == ['18', '243']
+    assert restored.get('140') == built.get('140')
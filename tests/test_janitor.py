@@ -0,0 +1,79 @@
+import os
+import time
+import threading
+
+import pytest
+
+import app
+
+@pytest.fixture
+def folder(tmp_path):
+    return str(tmp_path)
+
+def make_janitor(folder, quota=10 ** 9, max_age=3600, grace=300):
+    return app.DownloadJanitor(app.DownloadStore(folder, app.InProcessBackend()), quota, max_age, 60, grace)
+
+def write(folder, name, size=1000, mtime=None):
+    path = os.path.join(folder, name)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+def test_upstream_last_modified_mtime_does_not_expire_a_fresh_file(folder):
+    # yt-dlp's updatetime sets mtime to the server's Last-Modified, often weeks old
+    path = write(folder, 'vid_137.f137.mp4', mtime=time.time() - 30 * 24 * 3600)
+    assert make_janitor(folder).run_once() == 0
+    assert os.path.exists(path)
+
+def test_old_unindexed_files_expire(folder, monkeypatch):
+    path = write(folder, 'stale.mp4')
+    monkeypatch.setattr(time, 'time', lambda real=time.time: real() + 7200)
+    assert make_janitor(folder).run_once() == 1000
+    assert not os.path.exists(path)
+
+def test_over_quota_eviction_spares_files_of_running_jobs(folder, monkeypatch):
+    jobs = app.JobManager(1, 60, 1)
+    monkeypatch.setattr(app, 'JOB_MANAGER', jobs)
+    release = threading.Event()
+    job = jobs.submit('download_video', lambda: release.wait(5) and ({}, 200), files='vid_137.')
+    stream = write(folder, 'vid_137.f137.mp4')
+    other = write(folder, 'other_18.mp4')
+    try:
+        assert make_janitor(folder, quota=0, grace=0).run_once() == 1000
+        assert os.path.exists(stream) and not os.path.exists(other)
+    finally:
+        release.set()
+    jobs.wait_until(lambda: job['finished_at'], 5)
+    assert make_janitor(folder, quota=0, grace=0).run_once() == 1000
+    assert not os.path.exists(stream)
+
+def test_files_being_served_are_protected(folder):
+    path = write(folder, 'served.mp4')
+    app.FILE_LEASES.acquire('served.mp4')
+    try:
+        assert make_janitor(folder, quota=0, grace=0).run_once() == 0
+    finally:
+        app.FILE_LEASES.release('served.mp4')
+    assert os.path.exists(path)
+
+def test_janitor_counters_are_exported_to_metrics(folder, monkeypatch):
+    janitor = make_janitor(folder, quota=1500, grace=0)
+    write(folder, 'a.mp4')
+    write(folder, 'b.mp4')
+    janitor.run_once()
+    monkeypatch.setattr(app, 'DOWNLOAD_JANITOR', janitor)
+    body = app.app.test_client().get('/metrics').get_data(as_text=True)
+    assert 'ytdl_download_janitor{stat="evicted_files"} 1' in body
+    assert 'ytdl_download_janitor{stat="evicted_bytes"} 1000' in body
+    assert 'ytdl_download_janitor{stat="usage_bytes"} 1000' in body
+
+def test_served_file_lease_ends_when_the_server_closes_the_body():
+    write(app.UPLOAD_FOLDER, 'served.mp4')
+    response = app.app.test_client().get('/download_file/served.mp4', buffered=False)
+    assert response.status_code == 200
+    assert app.FILE_LEASES.in_use('served.mp4')
+    response.close()
+    assert not app.FILE_LEASES.in_use('served.mp4')
+    os.remove(os.path.join(app.UPLOAD_FOLDER, 'served.mp4'))
@@ -0,0 +1,48 @@
+import json
+import threading
+
+import app
+
+def read_event(chunks):
+    """Next (event, data) from an SSE body, skipping comments and keep-alives"""
+    for chunk in chunks:
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if chunk.startswith('event: '):
+            event, data = chunk.strip().split('\n')
+            return event[len('event: '):], json.loads(data[len('data: '):])
+    return None
+
+def test_events_stream_progress_then_done(monkeypatch):
+    jobs = app.JobManager(1, 60, 1)
+    monkeypatch.setattr(app, 'JOB_MANAGER', jobs)
+    halfway, finish = threading.Event(), threading.Event()
+
+    def download():
+        hook = app.job_progress_opts()['progress_hooks'][0]
+        halfway.wait(5)
+        hook({'status': 'downloading', 'downloaded_bytes': 50, 'total_bytes': 100, 'info_dict': {'format_id': '18'}})
+        finish.wait(5)
+        hook({'status': 'finished', 'downloaded_bytes': 100, 'total_bytes': 100, 'info_dict': {'format_id': '18'}})
+        return {'filename': 'vid_18.mp4'}, 200
+
+    job = jobs.submit('download_video', download)
+    response = app.app.test_client().get(f"/jobs/{job['id']}/events", buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+
+    halfway.set()
+    event, data = read_event(chunks)
+    assert event == 'progress'
+    assert data['percent'] == 50.0 and data['format_id'] == '18' and data['state'] == 'running'
+
+    finish.set()
+    events = []
+    while not events or events[-1][0] != 'done':
+        events.append(read_event(chunks))
+    assert ('progress', 100.0) in [(event, data.get('percent')) for event, data in events]
+    done = events[-1][1]
+    assert done['state'] == 'finished' and done['result'] == {'filename': 'vid_18.mp4'}
+    response.close()
+
+def test_events_for_unknown_job_are_404():
+    assert app.app.test_client().get('/jobs/nope/events').status_code == 404
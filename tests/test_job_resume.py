@@ -0,0 +1,137 @@
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import app
+
+PAYLOAD = bytes(range(256)) * 4096  # 1 MiB
+HALF = len(PAYLOAD) // 2
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves PAYLOAD as /video.mp4, honouring 'Range: bytes=N-' like a CDN"""
+
+    ranges = []
+
+    def do_HEAD(self):
+        self._respond(head=True)
+
+    def do_GET(self):
+        self._respond()
+
+    def _respond(self, head=False):
+        match = re.match(r'bytes=(\d+)-', self.headers.get('Range', ''))
+        start = int(match.group(1)) if match else 0
+        if not head:
+            RangeHandler.ranges.append(start)
+        body = PAYLOAD[start:]
+        self.send_response(206 if match else 200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(len(body)))
+        if match:
+            self.send_header('Content-Range', f'bytes {start}-{len(PAYLOAD) - 1}/{len(PAYLOAD)}')
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def media_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    RangeHandler.ranges = []
+    yield f'http://127.0.0.1:{server.server_address[1]}/video.mp4'
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def backend(tmp_path):
+    return app.SQLiteBackend(str(tmp_path / 'state.sqlite3'))
+
+class Worker(app.JobManager):
+    """A JobManager standing in for one gunicorn worker; in one test process they need distinct owners"""
+
+    @property
+    def owner(self):
+        return f'worker-{id(self)}'
+
+def make_worker(backend, lease=30):
+    return Worker(2, 60, 1, backend, lease=lease)
+
+hang = threading.Event()
+left_partial = threading.Event()
+
+def fetch_video(url, video_id):
+    """Resumable job body: the first attempt leaves half a .part file behind and hangs like a dead worker"""
+    outtmpl = os.path.join(app.UPLOAD_FOLDER, app.DownloadStore.filename_for(video_id, '18', '%(ext)s'))
+    opts, tracker = app.resumable_download_opts({'outtmpl': outtmpl, 'quiet': True, 'no_warnings': True,
+                                                 **app.job_progress_opts()}, video_id, '18')
+    if tracker is None:
+        with open(outtmpl.replace('%(ext)s', 'mp4') + '.part', 'wb') as f:
+            f.write(PAYLOAD[:HALF])
+        left_partial.set()
+        hang.wait(30)
+        return {'error': 'worker died'}, 500
+    with app.yt_dlp.YoutubeDL(opts) as ydl:
+        info = ydl.extract_info(url)
+    app.report_resume(tracker)
+    return {'filename': os.path.basename(ydl.prepare_filename(info))}, 200
+
+def test_resumes_from_partial_file_left_by_dead_worker(backend, media_url, monkeypatch):
+    hang.clear()
+    left_partial.clear()
+    dead, survivor = make_worker(backend), make_worker(backend)
+    for worker in (dead, survivor):
+        worker.register_resumable(fetch_video)
+    part = os.path.join(app.UPLOAD_FOLDER, app.DownloadStore.filename_for('vid', '18', 'mp4') + '.part')
+
+    monkeypatch.setattr(app, 'JOB_MANAGER', dead)
+    job = dead.submit('download_video', fetch_video, media_url, 'vid', key=('download_video', 'vid', '18'))
+    assert left_partial.wait(10)
+    assert os.path.getsize(part) == HALF
+    spec = backend.get(dead.RESUME_PREFIX + job['id'])
+    assert spec['target'] and spec['ydl_opts']['outtmpl'] == spec['target']
+
+    # The owner exits: its lease is released and another worker may claim the job
+    dead.release_leases()
+    monkeypatch.setattr(app, 'JOB_MANAGER', survivor)
+    assert survivor.resume_orphans() == 1
+    assert survivor.resume_orphans() == 0  # already claimed
+    resumed = survivor.get(job['id'])
+    survivor.wait_until(lambda: resumed['finished_at'], 30)
+    hang.set()
+
+    assert resumed['state'] == 'finished', resumed['result']
+    assert resumed['resume']['attempt'] == 1
+    assert resumed['resume']['partial_bytes'] == HALF
+    assert resumed['resume']['bytes_saved'] == HALF
+    assert RangeHandler.ranges[-1] == HALF  # only the missing half was fetched
+    with open(os.path.join(app.UPLOAD_FOLDER, resumed['result']['filename']), 'rb') as f:
+        assert f.read() == PAYLOAD
+    assert backend.get(survivor.RESUME_PREFIX + job['id']) is None
+
+def test_stalled_worker_cannot_take_back_a_lease_another_worker_claimed(backend, monkeypatch):
+    stalled, other = make_worker(backend, lease=0.05), make_worker(backend)
+    backend.add(stalled.LOCK_PREFIX + 'job1', stalled.owner, ttl=0.05)
+    stalled._leases.add('job1')
+    stalled._jobs['job1'] = {'id': 'job1', 'finished_at': None}
+    threading.Event().wait(0.1)  # the stalled worker misses its renewal
+    assert backend.add(other.LOCK_PREFIX + 'job1', other.owner, ttl=30)
+
+    stalled._renew_leases()
+    assert backend.get(stalled.LOCK_PREFIX + 'job1') == other.owner
+    assert 'job1' not in stalled._leases
+    assert stalled.lease_lost({'id': 'job1'})
+
+def test_lost_lease_cancels_the_stale_download(monkeypatch):
+    worker = app.JobManager(1, 60, 1)
+    monkeypatch.setattr(app, 'JOB_MANAGER', worker)
+    reporter = app.ProgressReporter({'id': 'job1'}, 0)
+    worker._lost.add('job1')
+    with pytest.raises(app.yt_dlp.utils.DownloadCancelled):
+        reporter.progress_hook({'status': 'downloading', 'downloaded_bytes': 1})
@@ -0,0 +1,96 @@
+import os
+import threading
+
+import app
+
+def test_concurrent_identical_submits_share_one_job():
+    jobs = app.JobManager(2, 60, 1)
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return {'ok': True}, 200
+
+    n = 8
+    start = threading.Barrier(n)
+    submitted = []
+
+    def submit():
+        start.wait()
+        submitted.append(jobs.submit('download_video', work, key=('download_video', 'vid', '18')))
+
+    threads = [threading.Thread(target=submit) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    release.set()
+
+    assert len({job['id'] for job in submitted}) == 1
+    assert jobs.coalesced == n - 1
+    jobs.wait_until(lambda: submitted[0]['finished_at'], 5)
+    assert submitted[0]['state'] == 'finished' and len(calls) == 1
+
+def test_finished_job_no_longer_coalesces():
+    jobs = app.JobManager(1, 60, 1)
+    first = jobs.submit('download_video', lambda: ({}, 200), key=('k',))
+    jobs.wait_until(lambda: first['finished_at'], 5)
+    assert jobs.submit('download_video', lambda: ({}, 200), key=('k',))['id'] != first['id']
+
+def test_postprocess_stage_releases_stream_leases_even_when_ffmpeg_fails(tmp_path, monkeypatch):
+    streams = []
+    for name in ('vid_137.f137.mp4', 'vid_137.f140.m4a'):
+        path = tmp_path / name
+        path.write_bytes(b'x')
+        streams.append(str(path))
+        app.FILE_LEASES.acquire(name)  # as run_download_video leaves them before the handoff
+
+    def failing_ffmpeg(streams, output, plan):
+        raise RuntimeError('ffmpeg remux failed')
+
+    monkeypatch.setattr(app, 'run_ffmpeg_postprocess', failing_ffmpeg)
+    monkeypatch.setattr(app, 'current_job', lambda: {'id': 'job'})
+    monkeypatch.setattr(app.JOB_MANAGER, 'publish_progress', lambda job, progress: None)
+    body, status = app.postprocess_download_video('url', '137', 'vid', {}, None, {}, streams,
+                                                  {'mode': 'remux'}, {}, None)
+    assert status == 500 and 'ffmpeg remux failed' in body['error']
+    assert not any(app.FILE_LEASES.in_use(os.path.basename(path)) for path in streams)
+    assert not any(os.path.exists(path) for path in streams)
+
+def test_pool_runs_at_most_max_workers_jobs_at_once():
+    jobs = app.JobManager(2, 60, 1)
+    release = threading.Event()
+    submitted = [jobs.submit('download_video', lambda: release.wait(5) and ({}, 200)) for _ in range(4)]
+    jobs.wait_until(lambda: sum(job['state'] == 'running' for job in submitted) == 2, 5)
+    assert sorted(job['state'] for job in submitted) == ['queued', 'queued', 'running', 'running']
+    release.set()
+    jobs.wait_until(lambda: all(job['finished_at'] for job in submitted), 5)
+    assert {job['state'] for job in submitted} == {'finished'}
+
+def test_download_video_answers_202_and_reports_the_result_on_the_status_url(monkeypatch):
+    jobs = app.JobManager(1, 60, 1)
+    jobs.add_finish_listener(app.ADMISSION.job_finished)
+    monkeypatch.setattr(app, 'JOB_MANAGER', jobs)
+    release = threading.Event()
+
+    def fake_download(url, format_id):
+        release.wait(5)
+        return {'filename': 'vid_18.mp4', 'format_id': format_id}, 200
+
+    monkeypatch.setattr(app, 'run_download_video', fake_download)
+    client = app.app.test_client()
+    response = client.post('/download_video', json={'url': 'https://www.youtube.com/watch?v=jobs0000001',
+                                                    'format_id': '18'})
+    assert response.status_code == 202
+    status_url = response.get_json()['status_url']
+    assert client.get(status_url).get_json()['state'] in ('queued', 'running')
+
+    release.set()
+    job = jobs.get(response.get_json()['job_id'])
+    jobs.wait_until(lambda: job['finished_at'], 5)
+    status = client.get(status_url).get_json()
+    assert status['state'] == 'finished' and status['status_code'] == 200
+    assert status['result'] == {'filename': 'vid_18.mp4', 'format_id': '18'}
+    assert client.get('/jobs/unknown').status_code == 404
@@ -0,0 +1,40 @@
+import time
+
+import app
+
+def test_least_recently_used_entry_is_evicted_past_max_entries():
+    cache = app.MetadataCache(ttl=60, max_entries=2, max_bytes=10 ** 6)
+    cache.set('a', {'title': 'A'})
+    cache.set('b', {'title': 'B'})
+    assert cache.get('a') == {'title': 'A'}  # 'b' is now the least recently used
+    cache.set('c', {'title': 'C'})
+    assert cache.get('b') is None
+    assert cache.get('a') and cache.get('c')
+    assert cache.stats()['evictions'] == 1
+
+def test_byte_bound_evicts_and_oversized_values_are_not_cached():
+    cache = app.MetadataCache(ttl=60, max_entries=10, max_bytes=100)
+    cache.set('a', 'x' * 40)
+    cache.set('b', 'x' * 40)
+    cache.set('c', 'x' * 40)
+    assert cache.get('a') is None
+    assert cache.stats()['bytes'] <= 100
+    cache.set('huge', 'x' * 200)
+    assert cache.get('huge') is None
+    assert cache.get('c') is not None
+
+def test_entries_expire_after_ttl(monkeypatch):
+    cache = app.MetadataCache(ttl=60, max_entries=10, max_bytes=10 ** 6)
+    cache.set('a', {'title': 'A'})
+    monkeypatch.setattr(time, 'time', lambda real=time.time: real() + 61)
+    assert cache.get('a') is None
+    assert cache.stats()['entries'] == 0
+
+def test_shared_backend_serves_another_workers_extraction():
+    backend = app.InProcessBackend()
+    backend.shared = True  # stand-in for SQLite/Redis shared between workers
+    first = app.MetadataCache(60, 10, 10 ** 6, backend)
+    second = app.MetadataCache(60, 10, 10 ** 6, backend)
+    first.set('a', {'title': 'A'})
+    assert second.get('a') == {'title': 'A'}
+    assert second.stats()['shared_hits'] == 1
@@ -0,0 +1,38 @@
+import os
+
+import app
+
+def test_registry_renders_counters_gauges_and_cumulative_histograms():
+    registry = app.MetricsRegistry()
+    requests = registry.register(app.Counter('t_requests_total', 'Requests', ('route',)))
+    latency = registry.register(app.Histogram('t_seconds', 'Latency', ('route',), buckets=(0.1, 1)))
+    registry.register(app.CallbackGauge('t_queue', 'Queue', ('state',), lambda: {('queued',): 3}))
+    requests.inc(route='/a "b"')
+    for value in (0.05, 0.5, 5):
+        latency.observe(value, route='/a')
+    lines = registry.render().splitlines()
+    assert '# TYPE t_requests_total counter' in lines
+    assert 't_requests_total{route="/a \\"b\\""} 1' in lines
+    assert 't_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{route="/a",le="1"} 2' in lines
+    assert 't_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 't_seconds_count{route="/a"} 3' in lines
+    assert 't_queue{state="queued"} 3' in lines
+
+def test_requests_and_served_bytes_show_up_on_metrics():
+    path = os.path.join(app.UPLOAD_FOLDER, 'metrics_18.mp4')
+    with open(path, 'wb') as f:
+        f.write(b'x' * 1234)
+    client = app.app.test_client()
+    before = app.BYTES_SERVED.samples()
+    client.get('/download_file/metrics_18.mp4').close()
+    os.remove(path)
+
+    response = client.get('/metrics')
+    assert response.mimetype == 'text/plain'
+    body = response.get_data(as_text=True)
+    assert 'ytdl_http_request_duration_seconds_count{route="/download_file/<filename>",method="GET",status="200"}' in body
+    served = dict(((name, key), value) for name, key, value in app.BYTES_SERVED.samples())
+    previous = dict(((name, key), value) for name, key, value in before)
+    key = ('ytdl_bytes_served_total', ('download_file',))
+    assert served[key] - previous.get(key, 0) == 1234
@@ -0,0 +1,59 @@
+import pytest
+
+import app
+
+FORMATS = app.FormatIndex.build([
+    {'format_id': '18', 'ext': 'mp4', 'height': 360, 'tbr': 500, 'vcodec': 'avc1.42001E', 'acodec': 'mp4a.40.2',
+     'protocol': 'https'},
+    {'format_id': '137', 'ext': 'mp4', 'height': 1080, 'tbr': 4000, 'vcodec': 'avc1.640028', 'acodec': 'none',
+     'protocol': 'https'},
+    {'format_id': '248', 'ext': 'webm', 'height': 1080, 'tbr': 3000, 'vcodec': 'vp9', 'acodec': 'none',
+     'protocol': 'https'},
+    {'format_id': '140', 'ext': 'm4a', 'abr': 128, 'vcodec': 'none', 'acodec': 'mp4a.40.2', 'protocol': 'https'},
+    {'format_id': '251', 'ext': 'webm', 'abr': 160, 'vcodec': 'none', 'acodec': 'opus', 'protocol': 'https'},
+])
+
+def test_substituted_video_is_stored_under_the_streams_fetched():
+    swapped = app.plan_postprocessing(FORMATS, '248', 'mp4')
+    direct = app.plan_postprocessing(FORMATS, '137', 'mp4')
+    assert swapped['substituted_from'] == '248'
+    assert app.artifact_format(swapped) == app.artifact_format(direct) == '137+140'
+
+def test_single_file_and_auto_plans_keep_their_format_id():
+    assert app.artifact_format(app.plan_postprocessing(FORMATS, '18', 'mp4')) == '18'
+    assert app.artifact_format(app.plan_postprocessing(FORMATS, 'bestvideo[height<=720]', 'mp4')) == 'bestvideo[height<=720]'
+
+def test_audio_mode_rejects_video_formats():
+    for format_id in ('137', '18'):
+        with pytest.raises(ValueError):
+            app.plan_audio(FORMATS, format_id)
+
+def test_audio_plan_keeps_the_requested_audio_format():
+    plan = app.plan_audio(FORMATS, '140')
+    assert (plan['audio_format'], plan['container'], plan['mode']) == ('140', 'm4a', 'none')
+
+def test_audio_selector_fallback_never_takes_a_full_video():
+    plan = app.plan_audio(FORMATS, 'bestaudio[abr>500]')
+    assert plan['mode'] == 'auto'
+    assert plan['ydl_opts']['format'] == 'bestaudio[abr>500]/bestaudio'
+
+def test_download_video_rejects_video_format_in_audio_mode():
+    url = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+    app.METADATA_CACHE.set('dQw4w9WgXcQ', {'info': {'id': 'dQw4w9WgXcQ', 'title': 't'},
+                                           'formats': FORMATS.to_dict(), 'payload': {}})
+    response = app.app.test_client().post('/download_video', json={'url': url, 'mode': 'audio', 'format_id': '137'})
+    assert response.status_code == 400
+    assert response.get_json()['audio_formats'] == ['251', '140']
+
+def test_repeat_request_finds_the_artifact_recorded_under_the_planned_key(tmp_path):
+    store = app.DownloadStore(str(tmp_path), app.InProcessBackend())
+    path = tmp_path / app.DownloadStore.filename_for('abc', '137+140', 'mp4')
+    path.write_bytes(b'x' * 64)
+    plan = app.plan_postprocessing(FORMATS, '248', 'mp4')
+    store.record('abc', app.artifact_format(plan), 'mp4', str(path), 'Title', '1080p',
+                 requested=('248', plan['container']))
+    # The pre-extraction lookup asks for what the request named, before any plan exists
+    assert store.lookup('abc', '248', 'mp4')['filename'] == path.name
+    assert store.lookup('abc', '137+140', 'mp4')['filename'] == path.name
+    store.forget(path.name)
+    assert store.lookup('abc', '248', 'mp4') is None
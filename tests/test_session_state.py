@@ -0,0 +1,50 @@
+import app
+
+class FlakyBackend(app.InProcessBackend):
+    """Fails the first `failures` incr calls, like a locked database"""
+
+    def __init__(self, failures=0):
+        super().__init__()
+        self.failures = failures
+        self.reads = 0
+
+    def items(self, prefix):
+        self.reads += 1
+        return super().items(prefix)
+
+    def incr(self, key, amount=1):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('database is locked')
+        return super().incr(key, amount)
+
+def test_updates_stay_in_memory_until_flushed():
+    backend = FlakyBackend()
+    state = app.SessionState(backend, 60)
+    assert backend.reads == 0  # nothing is read at import
+    state.incr('request_count')
+    state.record_success('https://www.youtube.com/watch?v=abc')
+    assert backend.get(state.COUNTER_PREFIX + 'request_count') is None
+    state.flush()
+    assert backend.get(state.COUNTER_PREFIX + 'request_count') == 1
+    assert backend.get(state.COUNTER_PREFIX + 'successful_requests') == 1
+    assert backend.get(state.FIELD_PREFIX + 'last_request') == 'https://www.youtube.com/watch?v=abc'
+
+def test_workers_sharing_a_backend_keep_each_others_counts(tmp_path):
+    backend = app.SQLiteBackend(str(tmp_path / 'state.sqlite3'))
+    first, second = app.SessionState(backend, 60), app.SessionState(backend, 60)
+    for _ in range(3):
+        first.incr('request_count')
+    second.incr('request_count', 2)
+    first.flush()
+    second.flush()
+    assert app.SessionState(backend, 60).snapshot()['request_count'] == 5
+
+def test_failed_flush_keeps_the_deltas_for_the_next_one():
+    backend = FlakyBackend(failures=1)
+    state = app.SessionState(backend, 60)
+    state.incr('request_count', 4)
+    state.flush()
+    assert backend.get(state.COUNTER_PREFIX + 'request_count') is None
+    state.flush()
+    assert backend.get(state.COUNTER_PREFIX + 'request_count') == 4
@@ -0,0 +1,42 @@
+import os
+import sys
+import json
+import subprocess
+import threading
+
+import app
+from conftest import ROOT
+
+def run_python(code, tmp_path):
+    """Run code in a fresh interpreter with the app importable, from a scratch directory"""
+    env = dict(os.environ, PYTHONPATH=ROOT, STATE_BACKEND='memory')
+    result = subprocess.run([sys.executable, '-c', code], cwd=tmp_path, env=env, capture_output=True, text=True,
+                            timeout=120)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def test_importing_the_app_leaves_yt_dlp_and_state_unloaded(tmp_path):
+    state = run_python(
+        "import sys, json, app\n"
+        "print(json.dumps({'yt_dlp': 'yt_dlp' in sys.modules, 'session': app.SESSION_STATE._loaded}))", tmp_path)
+    assert state == {'yt_dlp': False, 'session': False}
+
+def test_warm_up_loads_everything_and_records_its_timing(tmp_path):
+    state = run_python(
+        "import sys, json, app\n"
+        "app.warm_up()\n"
+        "print(json.dumps({'yt_dlp': 'yt_dlp' in sys.modules, 'session': app.SESSION_STATE._loaded,\n"
+        "                  'timings': app.startup_timings()}))", tmp_path)
+    assert state['yt_dlp'] and state['session']
+    assert {'import_seconds', 'warm_up_seconds', 'yt_dlp_import_seconds'} <= set(state['timings'])
+
+def test_lazy_module_imports_once_under_concurrent_first_use():
+    lazy = app.LazyModule('json')
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(lazy.dumps)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(results)) == 1 and results[0] is json.dumps
+    assert lazy.import_seconds is not None
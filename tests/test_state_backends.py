@@ -0,0 +1,112 @@
+import time
+import threading
+
+import pytest
+
+import app
+from fake_redis import FakeRedis
+
+@pytest.fixture(scope='module')
+def redis_server():
+    server = FakeRedis().start()
+    yield server
+    server.stop()
+
+@pytest.fixture(params=['memory', 'sqlite', 'redis'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return app.InProcessBackend()
+    if request.param == 'sqlite':
+        return app.SQLiteBackend(str(tmp_path / 'state.sqlite3'))
+    # A fresh prefix per test keeps tests sharing the module's server apart
+    return app.RedisBackend(request.getfixturevalue('redis_server').url, prefix=f'test-{time.time_ns()}:')
+
+def test_get_set_delete(backend):
+    assert backend.get('missing') is None
+    backend.set('a', {'title': 'x', 'formats': [1, 2]})
+    assert backend.get('a') == {'title': 'x', 'formats': [1, 2]}
+    backend.set('a', 'replaced')
+    assert backend.get('a') == 'replaced'
+    backend.delete('a', 'missing')
+    assert backend.get('a') is None
+
+def test_values_round_trip_through_json(backend):
+    backend.set('t', ('a', 1))
+    assert backend.get('t') == ['a', 1]
+
+def test_set_with_ttl_expires(backend):
+    backend.set('short', 1, ttl=0.05)
+    assert backend.get('short') == 1
+    time.sleep(0.1)
+    assert backend.get('short') is None
+
+def test_add_is_set_if_absent(backend):
+    assert backend.add('lock', 'one', ttl=10)
+    assert not backend.add('lock', 'two', ttl=10)
+    assert backend.get('lock') == 'one'
+
+def test_add_succeeds_once_ttl_has_lapsed(backend):
+    assert backend.add('lease', 'one', ttl=0.05)
+    time.sleep(0.1)
+    assert backend.add('lease', 'two', ttl=10)
+    assert backend.get('lease') == 'two'
+
+def test_incr(backend):
+    assert backend.incr('n') == 1
+    assert backend.incr('n', 5) == 6
+    assert backend.get('n') == 6
+
+def test_concurrent_incr_loses_no_updates(backend):
+    def work():
+        for _ in range(50):
+            backend.incr('hits')
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert backend.get('hits') == 400
+
+def test_items_scans_by_prefix(backend):
+    backend.set('job:1', {'id': '1'})
+    backend.set('job:2', {'id': '2'})
+    backend.set('jobs', 'not a match')
+    backend.set('job:gone', {'id': 'gone'}, ttl=0.05)
+    time.sleep(0.1)
+    assert backend.items('job:') == {'job:1': {'id': '1'}, 'job:2': {'id': '2'}}
+
+def test_items_treats_glob_characters_literally(backend):
+    backend.set('a*b:1', 1)
+    backend.set('axb:1', 2)
+    assert backend.items('a*b:') == {'a*b:1': 1}
+
+def test_sqlite_opens_nothing_until_first_use(tmp_path):
+    path = tmp_path / 'lazy.sqlite3'
+    backend = app.SQLiteBackend(str(path))
+    assert not path.exists()
+    backend.set('k', 'v')
+    assert path.exists()
+
+def test_make_state_backend_rejects_unknown_kind():
+    with pytest.raises(ValueError):
+        app.make_state_backend('memcached')
+
+def test_renew_extends_only_the_holders_lease(backend):
+    assert backend.add('lease', 'worker-a', ttl=10)
+    assert backend.renew('lease', 'worker-a', ttl=10)
+    assert not backend.renew('lease', 'worker-b', ttl=10)
+    assert backend.get('lease') == 'worker-a'
+
+def test_renew_never_overwrites_a_lease_taken_over_after_expiry(backend):
+    assert backend.add('lease', 'worker-a', ttl=0.05)
+    time.sleep(0.1)
+    assert backend.add('lease', 'worker-b', ttl=10)
+    assert not backend.renew('lease', 'worker-a', ttl=10)
+    assert backend.get('lease') == 'worker-b'
+
+def test_renew_reclaims_a_lapsed_lease_nobody_took(backend):
+    assert backend.add('lease', 'worker-a', ttl=0.05)
+    time.sleep(0.1)
+    assert backend.renew('lease', 'worker-a', ttl=10)
+    assert not backend.add('lease', 'worker-b', ttl=10)
@@ -0,0 +1,40 @@
+import threading
+
+import pytest
+
+import app
+
+def test_hedged_losers_are_told_to_stop():
+    stopped = threading.Event()
+
+    def slow(cancel):
+        # Stands in for an extraction checking cancel before each request
+        while not cancel.wait(0.01):
+            pass
+        stopped.set()
+        raise app.yt_dlp.utils.DownloadCancelled('abandoned')
+
+    runner = app.StrategyRunner('hedged', hedge_delay=0.05, max_workers=2)
+    winner, result, attempts = runner.run([('slow', slow), ('fast', lambda cancel: 'info')])
+
+    assert (winner, result) == ('fast', 'info')
+    assert [a['status'] for a in attempts] == ['success', 'abandoned']
+    assert stopped.wait(1)
+
+def test_sequential_passes_an_unset_event():
+    seen = []
+    runner = app.StrategyRunner('sequential', hedge_delay=0)
+    winner, _, _ = runner.run([('only', lambda cancel: seen.append(cancel.is_set()) or 'info')])
+    assert winner == 'only' and seen == [False]
+
+def test_stop_when_cancelled_rejects_requests_after_cancel():
+    cancel = threading.Event()
+    with app.yt_dlp.YoutubeDL({'quiet': True}) as ydl:
+        calls = []
+        ydl.urlopen = calls.append
+        app.stop_when_cancelled(ydl, cancel)
+        ydl.urlopen('first')
+        cancel.set()
+        with pytest.raises(app.yt_dlp.utils.DownloadCancelled):
+            ydl.urlopen('second')
+    assert calls == ['first']
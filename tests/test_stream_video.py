@@ -0,0 +1,41 @@
+import os
+import time
+import threading
+
+import app
+
+URL = 'https://www.youtube.com/watch?v=stream00001'
+
+def test_single_file_format_is_piped_through_and_frees_its_slot_on_close(youtube):
+    gate = app.ADMISSION.gates['stream_video']
+    response = app.app.test_client().get('/stream_video', query_string={'url': URL, 'format_id': '18'},
+                                         buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'video/mp4'
+    assert response.headers['Cache-Control'] == 'no-store'
+    assert gate.active == 1  # the pipe is still open
+    body = b''.join(response.response)
+    response.close()
+    with open(os.path.join(youtube.media_dir, 'progressive.mp4'), 'rb') as f:
+        assert body == f.read()
+    assert gate.active == 0
+    assert youtube.extractions == [URL]
+
+def test_format_that_needs_a_merge_is_queued_as_a_download_job(youtube, monkeypatch):
+    jobs = app.JobManager(1, 60, 1)
+    jobs.add_finish_listener(app.ADMISSION.job_finished)
+    monkeypatch.setattr(app, 'JOB_MANAGER', jobs)
+    release = threading.Event()
+    monkeypatch.setattr(app, 'run_download_video', lambda url, format_id: release.wait(5) and ({}, 200))
+    gate = app.ADMISSION.gates['stream_video']
+
+    response = app.app.test_client().get('/stream_video', query_string={'url': URL, 'format_id': '137'})
+    assert response.status_code == 202
+    job = jobs.get(response.get_json()['job_id'])
+    assert job['kind'] == 'download_video'
+    assert gate.active == 1  # held by the job, not the request
+    release.set()
+    deadline = time.time() + 5
+    while gate.active and time.time() < deadline:  # finish listeners run just after finished_at is set
+        time.sleep(0.01)
+    assert gate.active == 0
@@ -0,0 +1,64 @@
+import os
+import threading
+
+import pytest
+
+import app
+
+def write(folder, name, size):
+    with open(os.path.join(folder, name), 'wb') as f:
+        f.write(b'x' * size)
+
+@pytest.fixture
+def folder(tmp_path):
+    # Relative, like the default THUMB_FOLDER
+    return os.path.relpath(tmp_path)
+
+def test_least_recently_served_files_are_evicted_past_max_bytes(folder):
+    write(folder, 'aaaaaaaaaaa_320.jpg', 400)
+    write(folder, 'bbbbbbbbbbb_320.jpg', 400)
+    cache = app.ThumbnailCache(folder, max_bytes=1000)
+    assert cache.get('aaaaaaaaaaa', 320, 'jpg', None)[0].endswith('aaaaaaaaaaa_320.jpg')  # now most recent
+    write(folder, 'ccccccccccc_320.jpg', 400)
+    cache._add('ccccccccccc_320.jpg')
+    assert not os.path.exists(os.path.join(folder, 'bbbbbbbbbbb_320.jpg'))
+    assert sorted(os.listdir(folder)) == ['aaaaaaaaaaa_320.jpg', 'ccccccccccc_320.jpg']
+    assert cache.stats() == {'files': 2, 'bytes': 800, 'max_bytes': 1000, 'hits': 1, 'misses': 0, 'evictions': 1}
+
+def test_concurrent_misses_render_once(folder, monkeypatch):
+    cache = app.ThumbnailCache(folder, max_bytes=10 ** 6)
+    renders = []
+    start = threading.Barrier(4)
+
+    def render(video_id, width, fmt, source_url, name):
+        renders.append(name)
+        write(folder, name, 100)
+        cache._add(name)
+
+    monkeypatch.setattr(cache, '_render', render)
+
+    def get():
+        start.wait()
+        cache.get('ddddddddddd', 480, 'jpg', 'http://example.invalid/x.jpg')
+
+    threads = [threading.Thread(target=get) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(renders) == 1
+
+def test_thumb_route_serves_cached_variants_with_etag_and_long_max_age(folder, monkeypatch):
+    write(folder, 'eeeeeeeeeee_480.jpg', 500)
+    monkeypatch.setattr(app, 'THUMBNAILS', app.ThumbnailCache(folder, 10 ** 6))
+    client = app.app.test_client()
+    response = client.get('/thumb/eeeeeeeeeee?w=500&format=jpg')  # snaps to 480
+    assert response.status_code == 200, response.data
+    assert response.mimetype == 'image/jpeg' and len(response.data) == 500
+    assert response.cache_control.max_age == app.THUMB_MAX_AGE and response.cache_control.public
+    etag = response.headers['ETag']
+    response.close()
+    revalidated = client.get('/thumb/eeeeeeeeeee?w=500&format=jpg', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    revalidated.close()
+    assert client.get('/thumb/not-an-id').status_code == 404